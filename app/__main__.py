@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+命令行入口：python -m app
+"""
+
+import sys
+
+from app.cli import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
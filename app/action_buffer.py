@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+动作存储模块
+
+ActionBuffer 按列保存动作：类型编码、标志、字符串编号、坐标、滚动量和时间戳
+分别存放在紧凑的 array 中，按键名和鼠标按钮名只在字符串表中保存一份。
+每个动作约占 30 字节，而等价的字典要占用数百字节。
+
+鼠标滚轮（mouse_scroll）的 dx/dy 为滚动格数。触控板和高精度滚轮的滚动量可能带小数，
+此时设置 FLAG_FINE_SCROLL，dx/dy 以 1/SCROLL_SCALE 格为单位保存（小数点后保留三位）。
+图像锚点（anchor）复用坐标列：x/y 为录制时的点击位置，dx/dy 为点击点在模板中的位置，
+模板图像以 base64 文本保存在字符串表中。
+等待步骤（wait）的 x/y/dx/dy 为采样区域，标志位为条件编码，其余参数以 JSON 文本保存在字符串表中。
+文字输入步骤（type_text）的文本保存在字符串表中，dx 为字符间隔（微秒）。
+
+为了兼容旧代码，ActionBuffer 可以像动作字典列表一样使用：
+支持 len()、下标、切片和迭代，取出的元素是按需生成的动作字典。
+"""
+
+import json
+from array import array
+
+
+# 动作类型及其编码
+ACTION_TYPES = (
+    'mouse_move', 'mouse_click', 'mouse_scroll', 'key_press', 'key_release', 'anchor', 'wait',
+    'type_text'
+)
+TYPE_CODES = {name: code for code, name in enumerate(ACTION_TYPES)}
+
+TYPE_MOUSE_MOVE = TYPE_CODES['mouse_move']
+TYPE_MOUSE_CLICK = TYPE_CODES['mouse_click']
+TYPE_MOUSE_SCROLL = TYPE_CODES['mouse_scroll']
+TYPE_KEY_PRESS = TYPE_CODES['key_press']
+TYPE_KEY_RELEASE = TYPE_CODES['key_release']
+TYPE_ANCHOR = TYPE_CODES['anchor']
+TYPE_WAIT = TYPE_CODES['wait']
+TYPE_TEXT = TYPE_CODES['type_text']
+
+# 等待条件，编码保存在等待步骤的标志位中
+WAIT_CONDITIONS = ('region_changed', 'pixel_color', 'template_appears')
+
+# 等待步骤字典中不属于条件参数的键
+_WAIT_FIELDS = frozenset(('type', 'condition', 'x', 'y', 'width', 'height', 'timestamp'))
+
+# 标志位
+FLAG_PRESSED = 0x01
+FLAG_FINE_SCROLL = 0x02  # 滚轮的 dx/dy 为定点数
+
+# 带小数的滚动量的定点比例
+SCROLL_SCALE = 1000
+
+# 不引用字符串表时使用的编号
+NO_STRING = 0xFFFFFFFF
+
+
+class ActionBuffer:
+    """
+    按列存储动作的缓冲区
+    """
+    
+    def __init__(self, strings=None):
+        """
+        初始化缓冲区
+        
+        strings 为 (字符串列表, 字符串到编号的字典)，用于切片时共享字符串表
+        """
+        self.types = array('B')
+        self.flags = array('B')
+        self.string_ids = array('I')
+        self.x = array('i')
+        self.y = array('i')
+        self.dx = array('i')
+        self.dy = array('i')
+        self.timestamps = array('d')
+        
+        if strings is None:
+            self.strings = []
+            self.string_index = {}
+        else:
+            self.strings, self.string_index = strings
+    
+    @classmethod
+    def from_actions(cls, actions):
+        """
+        从动作字典序列创建缓冲区
+        """
+        if isinstance(actions, cls):
+            return actions
+        if hasattr(actions, 'read_all'):
+            # 内存映射的宏文件等按块读取的来源
+            return actions.read_all()
+        
+        buffer = cls()
+        buffer.extend(actions)
+        return buffer
+    
+    def __len__(self):
+        return len(self.types)
+    
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self._to_dict(i)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._slice(index)
+        
+        if index < 0:
+            index += len(self.types)
+        if not 0 <= index < len(self.types):
+            raise IndexError("动作下标超出范围")
+        return self._to_dict(index)
+    
+    def __repr__(self):
+        return f"ActionBuffer({len(self)} actions)"
+    
+    def intern(self, text):
+        """
+        获取字符串在字符串表中的编号，不存在时追加
+        """
+        if text is None:
+            return NO_STRING
+        
+        string_id = self.string_index.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self.string_index[text] = string_id
+        return string_id
+    
+    def get_string(self, string_id):
+        """
+        根据编号获取字符串
+        """
+        if string_id == NO_STRING:
+            return None
+        return self.strings[string_id]
+    
+    def append_record(self, type_code, flags, string_id, x, y, dx, dy, timestamp):
+        """
+        追加一条原始记录
+        """
+        self.types.append(type_code)
+        self.flags.append(flags)
+        self.string_ids.append(string_id)
+        self.x.append(x)
+        self.y.append(y)
+        self.dx.append(dx)
+        self.dy.append(dy)
+        self.timestamps.append(timestamp)
+    
+    def append_move(self, x, y, timestamp):
+        """
+        追加鼠标移动
+        """
+        self.append_record(TYPE_MOUSE_MOVE, 0, NO_STRING, round(x), round(y), 0, 0, timestamp)
+    
+    def append_click(self, x, y, button, pressed, timestamp):
+        """
+        追加鼠标点击
+        """
+        self.append_record(
+            TYPE_MOUSE_CLICK,
+            FLAG_PRESSED if pressed else 0,
+            self.intern(button),
+            round(x), round(y), 0, 0,
+            timestamp
+        )
+    
+    def append_scroll(self, x, y, dx, dy, timestamp):
+        """
+        追加鼠标滚轮
+        
+        整数格数原样保存；带小数时按 SCROLL_SCALE 转换为定点数并设置 FLAG_FINE_SCROLL
+        """
+        if dx == int(dx) and dy == int(dy):
+            self.append_record(
+                TYPE_MOUSE_SCROLL, 0, NO_STRING, round(x), round(y), int(dx), int(dy), timestamp
+            )
+        else:
+            self.append_record(
+                TYPE_MOUSE_SCROLL, FLAG_FINE_SCROLL, NO_STRING, round(x), round(y),
+                round(dx * SCROLL_SCALE), round(dy * SCROLL_SCALE), timestamp
+            )
+    
+    def scroll_amount(self, i):
+        """
+        获取第 i 个动作（鼠标滚轮）的 (dx, dy) 格数，带小数的滚动量返回浮点数
+        """
+        if self.flags[i] & FLAG_FINE_SCROLL:
+            return self.dx[i] / SCROLL_SCALE, self.dy[i] / SCROLL_SCALE
+        return self.dx[i], self.dy[i]
+    
+    def append_key(self, type_code, key, timestamp):
+        """
+        追加键盘按下或释放
+        """
+        self.append_record(type_code, 0, self.intern(key), 0, 0, 0, 0, timestamp)
+    
+    def append_anchor(self, x, y, template, template_x, template_y, timestamp):
+        """
+        追加图像锚点
+        """
+        self.append_record(
+            TYPE_ANCHOR, 0, self.intern(template),
+            round(x), round(y), int(template_x), int(template_y),
+            timestamp
+        )
+    
+    def append_wait(self, condition, x, y, width, height, params, timestamp):
+        """
+        追加等待步骤，params 为条件参数字典（超时、颜色、模板等）
+        """
+        if condition not in WAIT_CONDITIONS:
+            raise ValueError(f"未知的等待条件: {condition}")
+        self.append_record(
+            TYPE_WAIT, WAIT_CONDITIONS.index(condition),
+            self.intern(json.dumps(params, sort_keys=True) if params else None),
+            round(x), round(y), int(width), int(height),
+            timestamp
+        )
+    
+    def append_text(self, text, interval, timestamp):
+        """
+        追加文字输入步骤，interval 为字符间隔（秒），0 表示尽快输入
+        """
+        self.append_record(TYPE_TEXT, 0, self.intern(text), 0, 0, round(interval * 1e6), 0, timestamp)
+    
+    def append(self, action):
+        """
+        追加一个动作字典
+        """
+        action_type = action['type']
+        timestamp = float(action['timestamp'])
+        
+        if action_type == 'mouse_move':
+            self.append_move(action['x'], action['y'], timestamp)
+        elif action_type == 'mouse_click':
+            self.append_click(
+                action['x'], action['y'],
+                action['button'], action['pressed'], timestamp
+            )
+        elif action_type == 'mouse_scroll':
+            self.append_scroll(
+                action['x'], action['y'],
+                action['dx'], action['dy'], timestamp
+            )
+        elif action_type in ('key_press', 'key_release'):
+            self.append_key(TYPE_CODES[action_type], action['key'], timestamp)
+        elif action_type == 'anchor':
+            self.append_anchor(
+                action['x'], action['y'], action['template'],
+                action['template_x'], action['template_y'], timestamp
+            )
+        elif action_type == 'wait':
+            params = {key: value for key, value in action.items() if key not in _WAIT_FIELDS}
+            self.append_wait(
+                action['condition'], action['x'], action['y'],
+                action.get('width', 1), action.get('height', 1),
+                params, timestamp
+            )
+        elif action_type == 'type_text':
+            self.append_text(action['text'], action.get('interval', 0.0), timestamp)
+        else:
+            raise ValueError(f"未知的动作类型: {action_type}")
+    
+    def extend(self, actions):
+        """
+        追加多个动作
+        """
+        if isinstance(actions, ActionBuffer):
+            self._extend_buffer(actions)
+            return
+        
+        for action in actions:
+            self.append(action)
+    
+    def clear(self):
+        """
+        清空所有动作，保留字符串表
+        """
+        for column in self.columns():
+            del column[:]
+    
+    def to_list(self):
+        """
+        转换为动作字典列表
+        """
+        return list(self)
+    
+    def duration(self):
+        """
+        获取动作总时长（秒）
+        """
+        if not self.timestamps:
+            return 0.0
+        return self.timestamps[-1]
+    
+    def nbytes(self):
+        """
+        获取各列占用的字节数
+        """
+        return sum(column.itemsize * len(column) for column in self.columns())
+    
+    def columns(self):
+        """
+        按固定顺序获取所有列
+        """
+        return (
+            self.types, self.flags, self.string_ids,
+            self.x, self.y, self.dx, self.dy, self.timestamps
+        )
+    
+    def _slice(self, index):
+        """
+        按切片创建新的缓冲区，与原缓冲区共享字符串表
+        """
+        buffer = ActionBuffer((self.strings, self.string_index))
+        for target, source in zip(buffer.columns(), self.columns()):
+            target.extend(source[index])
+        return buffer
+    
+    def _extend_buffer(self, other):
+        """
+        追加另一个缓冲区的全部动作
+        """
+        if other.strings is self.strings:
+            string_ids = other.string_ids
+        else:
+            mapping = [self.intern(text) for text in other.strings]
+            string_ids = array('I', (
+                NO_STRING if string_id == NO_STRING else mapping[string_id]
+                for string_id in other.string_ids
+            ))
+        
+        self.types.extend(other.types)
+        self.flags.extend(other.flags)
+        self.string_ids.extend(string_ids)
+        self.x.extend(other.x)
+        self.y.extend(other.y)
+        self.dx.extend(other.dx)
+        self.dy.extend(other.dy)
+        self.timestamps.extend(other.timestamps)
+    
+    def _to_dict(self, i):
+        """
+        生成第 i 个动作的字典视图
+        """
+        type_code = self.types[i]
+        action_type = ACTION_TYPES[type_code]
+        timestamp = self.timestamps[i]
+        
+        if type_code == TYPE_MOUSE_MOVE:
+            return {'type': action_type, 'x': self.x[i], 'y': self.y[i], 'timestamp': timestamp}
+        if type_code == TYPE_MOUSE_CLICK:
+            return {
+                'type': action_type,
+                'x': self.x[i],
+                'y': self.y[i],
+                'button': self.get_string(self.string_ids[i]),
+                'pressed': bool(self.flags[i] & FLAG_PRESSED),
+                'timestamp': timestamp
+            }
+        if type_code == TYPE_MOUSE_SCROLL:
+            dx, dy = self.scroll_amount(i)
+            return {
+                'type': action_type,
+                'x': self.x[i],
+                'y': self.y[i],
+                'dx': dx,
+                'dy': dy,
+                'timestamp': timestamp
+            }
+        if type_code == TYPE_ANCHOR:
+            return {
+                'type': action_type,
+                'x': self.x[i],
+                'y': self.y[i],
+                'template': self.get_string(self.string_ids[i]),
+                'template_x': self.dx[i],
+                'template_y': self.dy[i],
+                'timestamp': timestamp
+            }
+        if type_code == TYPE_WAIT:
+            action = {
+                'type': action_type,
+                'condition': WAIT_CONDITIONS[self.flags[i]],
+                'x': self.x[i],
+                'y': self.y[i],
+                'width': self.dx[i],
+                'height': self.dy[i]
+            }
+            params = self.get_string(self.string_ids[i])
+            if params is not None:
+                action.update(json.loads(params))
+            action['timestamp'] = timestamp
+            return action
+        if type_code == TYPE_TEXT:
+            return {
+                'type': action_type,
+                'text': self.get_string(self.string_ids[i]),
+                'interval': self.dx[i] / 1e6,
+                'timestamp': timestamp
+            }
+        return {
+            'type': action_type,
+            'key': self.get_string(self.string_ids[i]),
+            'timestamp': timestamp
+        }
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+动作统计模块
+
+统计宏的事件数、时长、各类型事件数量和鼠标坐标范围，并检查常见的数据问题。
+按块处理，内存映射的大文件也不需要整体载入。
+"""
+
+import math
+from collections import Counter
+
+from app.action_buffer import (
+    ActionBuffer, ACTION_TYPES, FLAG_PRESSED, TYPE_MOUSE_MOVE, TYPE_MOUSE_CLICK,
+    TYPE_MOUSE_SCROLL, TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+)
+
+
+# 带坐标的鼠标事件类型
+_MOUSE_TYPES = frozenset((TYPE_MOUSE_MOVE, TYPE_MOUSE_CLICK, TYPE_MOUSE_SCROLL))
+
+
+def iter_action_buffers(actions):
+    """
+    把各种形式的动作统一为 ActionBuffer 块的迭代
+    """
+    if isinstance(actions, ActionBuffer):
+        yield actions
+    elif hasattr(actions, 'iter_buffers'):
+        for _, buffer in actions.iter_buffers():
+            yield buffer
+    else:
+        yield ActionBuffer.from_actions(actions)
+
+
+def summarize_actions(actions):
+    """
+    统计动作，返回字典
+    """
+    count = 0
+    duration = 0.0
+    type_counts = Counter()
+    bounds = None
+    
+    for buffer in iter_action_buffers(actions):
+        if not len(buffer):
+            continue
+        count += len(buffer)
+        duration = max(duration, buffer.duration())
+        type_counts.update(buffer.types)
+        
+        # 只统计带坐标的鼠标事件
+        xs = [x for x, type_code in zip(buffer.x, buffer.types) if type_code in _MOUSE_TYPES]
+        if xs:
+            ys = [y for y, type_code in zip(buffer.y, buffer.types) if type_code in _MOUSE_TYPES]
+            chunk_bounds = (min(xs), min(ys), max(xs), max(ys))
+            if bounds is None:
+                bounds = chunk_bounds
+            else:
+                bounds = (
+                    min(bounds[0], chunk_bounds[0]),
+                    min(bounds[1], chunk_bounds[1]),
+                    max(bounds[2], chunk_bounds[2]),
+                    max(bounds[3], chunk_bounds[3])
+                )
+    
+    return {
+        'count': count,
+        'duration': duration,
+        'types': {ACTION_TYPES[code]: n for code, n in sorted(type_counts.items())},
+        'bounds': bounds
+    }
+
+
+def validate_actions(actions):
+    """
+    检查动作数据，返回问题描述列表，没有问题时返回空列表
+    
+    检查时间戳是否有效且不递减，以及结束时是否还有未释放的鼠标按钮或按键
+    """
+    issues = []
+    count = 0
+    previous = 0.0
+    backwards = 0
+    first_backwards = None
+    invalid = 0
+    buttons = Counter()
+    keys = Counter()
+    
+    for buffer in iter_action_buffers(actions):
+        get_string = buffer.get_string
+        for i, timestamp in enumerate(buffer.timestamps):
+            if not math.isfinite(timestamp) or timestamp < 0:
+                invalid += 1
+            elif timestamp < previous:
+                backwards += 1
+                if first_backwards is None:
+                    first_backwards = count + i
+            else:
+                previous = timestamp
+            
+            type_code = buffer.types[i]
+            if type_code == TYPE_MOUSE_CLICK:
+                name = get_string(buffer.string_ids[i])
+                buttons[name] += 1 if buffer.flags[i] & FLAG_PRESSED else -1
+            elif type_code == TYPE_KEY_PRESS:
+                keys[get_string(buffer.string_ids[i])] = 1
+            elif type_code == TYPE_KEY_RELEASE:
+                keys[get_string(buffer.string_ids[i])] = 0
+        count += len(buffer)
+    
+    if not count:
+        issues.append("没有动作")
+    if invalid:
+        issues.append(f"{invalid} 个动作的时间戳无效（负数或非数字）")
+    if backwards:
+        issues.append(f"{backwards} 个动作的时间戳早于前一个动作，第一个位于下标 {first_backwards}")
+    held_buttons = sorted(name for name, depth in buttons.items() if depth > 0)
+    if held_buttons:
+        issues.append("结束时仍有按下的鼠标按钮: " + ", ".join(held_buttons))
+    held_keys = sorted(name for name, pressed in keys.items() if pressed)
+    if held_keys:
+        issues.append("结束时仍有按下的按键: " + ", ".join(held_keys))
+    return issues
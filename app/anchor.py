@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+图像锚点模块
+
+录制时在每次鼠标按下的位置截取一小块灰度图作为模板，以锚点动作保存在点击之前。
+回放到锚点时在预期位置附近的区域中查找模板，得到窗口的偏移量，
+之后的鼠标移动和点击都加上该偏移，窗口被移动后回放仍然能点中目标。
+
+查找只在预期位置周围 search_radius 像素的范围内进行：
+先在缩小一半的图像上粗略匹配，再在原分辨率下只对匹配点附近的小窗口精确匹配，
+一次查找通常只需几毫秒。粗略匹配失败时退回到原分辨率的完整匹配。
+
+录制时截图由 TemplateGrabber 的后台线程完成，鼠标钩子回调中只从预先截好的区域复制模板。
+截图通过 capture.ScreenCapture 进行（source 参数），测试时可以用 FakeFramebuffer 后端提供合成截图。
+依赖 opencv-python 和 numpy，未安装时锚点动作在回放时被忽略。
+"""
+
+import base64
+import queue
+import threading
+import time
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+    np = None
+
+
+# 模板边长（像素）
+DEFAULT_TEMPLATE_SIZE = 48
+
+# 回放时在预期位置周围查找的范围（像素）
+DEFAULT_SEARCH_RADIUS = 160
+
+# 归一化相关系数低于该值时认为没有找到
+DEFAULT_THRESHOLD = 0.8
+
+# 灰度标准差低于该值的模板没有足够的纹理，容易误匹配，不记录
+MIN_TEMPLATE_STDDEV = 8.0
+
+# 模板边长不小于该值时才使用缩小一半的粗略匹配
+MIN_PYRAMID_SIZE = 24
+
+# 粗略匹配后原分辨率下细化的范围（像素）
+REFINE_MARGIN = 3
+
+# 录制时后台线程预截的光标周围区域边长（像素）和刷新间隔（秒）
+PREFETCH_SIZE = 160
+PREFETCH_INTERVAL = 0.05
+
+# 鼠标按下时预截区域不超过该时长（秒）才直接使用，否则交给后台线程重新截图
+PREFETCH_MAX_AGE = 0.1
+
+# 消费线程等待后台线程截取模板的最长时间（秒）
+GRAB_TIMEOUT = 1.0
+
+
+def is_available():
+    """
+    检查 OpenCV 和 NumPy 是否可用
+    """
+    return cv2 is not None
+
+
+def encode_template(template):
+    """
+    把灰度模板编码为 PNG 的 base64 文本，保存在宏文件的字符串表中
+    """
+    ok, data = cv2.imencode('.png', template)
+    if not ok:
+        raise ValueError("模板编码失败")
+    return base64.b64encode(data.tobytes()).decode('ascii')
+
+
+def decode_template(text):
+    """
+    把 base64 文本解码为灰度模板
+    """
+    data = np.frombuffer(base64.b64decode(text), dtype=np.uint8)
+    template = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+    if template is None:
+        raise ValueError("无法解码锚点模板")
+    return template
+
+
+def grab_template(source, x, y, size=DEFAULT_TEMPLATE_SIZE):
+    """
+    截取以 (x, y) 为中心的灰度模板，不编码
+    
+    返回 (模板图像的副本, 点击点在模板中的 x, 点击点在模板中的 y)，
+    点击点超出屏幕或模板纹理不足时返回 None
+    """
+    rect = _template_rect(source.bounds, x, y, size)
+    if rect is None:
+        return None
+    
+    left, top, right, bottom = rect
+    template = source.grab(left, top, right - left, bottom - top)
+    if not _has_texture(template):
+        return None
+    return template.copy(), x - left, y - top
+
+
+def capture_template(source, x, y, size=DEFAULT_TEMPLATE_SIZE):
+    """
+    截取以 (x, y) 为中心的模板
+    
+    返回 (模板文本, 点击点在模板中的 x, 点击点在模板中的 y)，
+    点击点超出屏幕或模板纹理不足时返回 None
+    """
+    grabbed = grab_template(source, x, y, size)
+    if grabbed is None:
+        return None
+    template, template_x, template_y = grabbed
+    return encode_template(template), template_x, template_y
+
+
+def _template_rect(bounds, x, y, size):
+    """
+    获取以 (x, y) 为中心、裁剪到屏幕范围内的模板区域，裁剪后太小时返回 None
+    """
+    half = size // 2
+    left, top, right, bottom = _clip(bounds, x - half, y - half, x - half + size, y - half + size)
+    if right - left < size // 2 or bottom - top < size // 2:
+        return None
+    return left, top, right, bottom
+
+
+def _has_texture(template):
+    """
+    检查模板是否有足够的纹理
+    """
+    return float(template.std()) >= MIN_TEMPLATE_STDDEV
+
+
+def _clip(bounds, left, top, right, bottom):
+    """
+    把矩形裁剪到屏幕范围内
+    """
+    screen_left, screen_top, screen_right, screen_bottom = bounds
+    return (
+        max(left, screen_left),
+        max(top, screen_top),
+        min(right, screen_right),
+        min(bottom, screen_bottom)
+    )
+
+
+class PendingTemplate:
+    """
+    一次模板截取请求的结果，由鼠标回调或后台线程填入，消费线程取出
+    """
+    
+    __slots__ = ('event', 'result')
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+    
+    def set(self, result):
+        """
+        填入 (模板图像, 点击点在模板中的 x, 点击点在模板中的 y) 或 None
+        """
+        self.result = result
+        self.event.set()
+    
+    def wait(self, timeout=GRAB_TIMEOUT):
+        """
+        等待结果，超时、截图失败或纹理不足时返回 None
+        """
+        if not self.event.wait(timeout):
+            return None
+        result = self.result
+        if result is None or not _has_texture(result[0]):
+            return None
+        return result
+
+
+class TemplateGrabber:
+    """
+    录制锚点时的模板截取
+    
+    截图可能耗时数毫秒，而鼠标钩子回调返回之前用户的点击不会送达应用，所以回调中不截图：
+    - 后台线程每隔 interval 截取光标周围 prefetch_size 见方的灰度区域，整体替换 snapshot
+    - 鼠标按下时 request() 在回调中读取 snapshot，足够新且包含模板区域时只复制模板像素，
+      截到的是点击之前最多 max_age 秒的画面
+    - 否则把请求交给后台线程立即截图，回调不等待；此时截图与点击送达应用同时进行，
+      应用在截图完成前就重绘时模板可能已不是点击时的画面
+    """
+    
+    def __init__(self, source, size=DEFAULT_TEMPLATE_SIZE, prefetch_size=PREFETCH_SIZE,
+                 interval=PREFETCH_INTERVAL, max_age=PREFETCH_MAX_AGE):
+        """
+        初始化
+        """
+        self.source = source
+        self.size = size
+        self.prefetch_size = max(prefetch_size, size)
+        self.interval = interval
+        self.max_age = max_age
+        self.bounds = source.bounds
+        self.cursor = None  # 最近的光标位置，由鼠标移动回调更新
+        self.snapshot = None  # (截图时间, left, top, 灰度图)，只整体替换，回调中不加锁读取
+        self.requests = queue.SimpleQueue()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        
+        # 统计：直接从预截区域复制的次数和交给后台线程截图的次数
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+    
+    def start(self):
+        """
+        启动后台线程
+        """
+        self.snapshot = None
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """
+        停止后台线程，尚未处理的请求在退出前完成
+        """
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+    
+    def move(self, x, y):
+        """
+        记录光标位置，在鼠标移动回调中调用
+        """
+        self.cursor = (x, y)
+    
+    def request(self, x, y):
+        """
+        请求截取以 (x, y) 为中心的模板，在鼠标按下的回调中调用，返回 PendingTemplate
+        """
+        self.cursor = (x, y)
+        pending = PendingTemplate()
+        template = self._copy_from_snapshot(x, y)
+        if template is not None:
+            self.prefetch_hits += 1
+            pending.set(template)
+        else:
+            self.prefetch_misses += 1
+            self.requests.put((pending, x, y))
+            self.wake.set()
+        return pending
+    
+    def _copy_from_snapshot(self, x, y):
+        """
+        从预截区域复制模板，预截区域过旧或不包含模板区域时返回 None
+        """
+        snapshot = self.snapshot
+        if snapshot is None or time.perf_counter() - snapshot[0] > self.max_age:
+            return None
+        rect = _template_rect(self.bounds, x, y, self.size)
+        if rect is None:
+            return None
+        
+        _, snapshot_left, snapshot_top, image = snapshot
+        left, top, right, bottom = rect
+        height, width = image.shape
+        if (left < snapshot_left or top < snapshot_top
+                or right > snapshot_left + width or bottom > snapshot_top + height):
+            return None
+        template = image[top - snapshot_top:bottom - snapshot_top, left - snapshot_left:right - snapshot_left]
+        return template.copy(), x - left, y - top
+    
+    def _run(self):
+        """
+        后台线程：优先处理截图请求，空闲时刷新光标周围的预截区域
+        """
+        while True:
+            self._serve_requests()
+            if self.stop_event.is_set():
+                self._serve_requests()
+                return
+            if self.cursor is not None:
+                self._prefetch(*self.cursor)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+    
+    def _serve_requests(self):
+        """
+        截取所有等待中的模板请求
+        """
+        while True:
+            try:
+                pending, x, y = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                pending.set(grab_template(self.source, x, y, self.size))
+            except Exception:
+                pending.set(None)
+    
+    def _prefetch(self, x, y):
+        """
+        截取光标周围的区域，截图失败时丢弃旧的预截区域
+        """
+        half = self.prefetch_size // 2
+        left, top, right, bottom = _clip(
+            self.bounds, round(x) - half, round(y) - half,
+            round(x) - half + self.prefetch_size, round(y) - half + self.prefetch_size
+        )
+        if right <= left or bottom <= top:
+            return
+        now = time.perf_counter()
+        try:
+            image = self.source.grab(left, top, right - left, bottom - top).copy()
+        except Exception:
+            self.snapshot = None
+            return
+        self.snapshot = (now, left, top, image)
+
+
+class TemplateMatcher:
+    """
+    单个模板的匹配器，解码后的模板和缩小的模板只生成一次
+    """
+    
+    def __init__(self, template):
+        """
+        初始化匹配器
+        """
+        self.template = template
+        self.height, self.width = template.shape
+        if min(self.height, self.width) >= MIN_PYRAMID_SIZE:
+            self.coarse = cv2.pyrDown(template)
+        else:
+            self.coarse = None
+    
+    def locate(self, frame, threshold=DEFAULT_THRESHOLD):
+        """
+        在 frame 中查找模板
+        
+        返回 (模板左上角 x, 模板左上角 y, 相似度)，没有找到时返回 None
+        """
+        frame_height, frame_width = frame.shape
+        if frame_height < self.height or frame_width < self.width:
+            return None
+        
+        if self.coarse is not None and frame_height >= 2 * self.height and frame_width >= 2 * self.width:
+            # 缩小一半粗略定位，再在原分辨率下细化
+            result = cv2.matchTemplate(cv2.pyrDown(frame), self.coarse, cv2.TM_CCOEFF_NORMED)
+            _, _, _, (coarse_x, coarse_y) = cv2.minMaxLoc(result)
+            left = max(0, coarse_x * 2 - REFINE_MARGIN)
+            top = max(0, coarse_y * 2 - REFINE_MARGIN)
+            right = min(frame_width, coarse_x * 2 + self.width + REFINE_MARGIN)
+            bottom = min(frame_height, coarse_y * 2 + self.height + REFINE_MARGIN)
+            match = self._match(frame[top:bottom, left:right])
+            if match is not None and match[2] >= threshold:
+                return match[0] + left, match[1] + top, match[2]
+        
+        # 粗略匹配失败或区域太小，在原分辨率下完整匹配
+        match = self._match(frame)
+        if match is not None and match[2] >= threshold:
+            return match
+        return None
+    
+    def _match(self, frame):
+        """
+        在原分辨率下匹配，返回最佳位置和相似度
+        """
+        if frame.shape[0] < self.height or frame.shape[1] < self.width:
+            return None
+        result = cv2.matchTemplate(frame, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        return x, y, score
+
+
+class AnchorTracker:
+    """
+    回放时的锚点跟踪器
+    
+    保存当前的偏移量，每遇到一个锚点就在预期位置附近重新查找模板并更新偏移；
+    没有找到时保持之前的偏移。
+    """
+    
+    def __init__(self, source, search_radius=DEFAULT_SEARCH_RADIUS, threshold=DEFAULT_THRESHOLD):
+        """
+        初始化跟踪器
+        """
+        self.source = source
+        self.search_radius = search_radius
+        self.threshold = threshold
+        self.matchers = {}  # 模板文本到匹配器的缓存
+        self.offset = (0, 0)
+        self.found = 0
+        self.missed = 0
+    
+    def reset(self):
+        """
+        清除偏移和统计
+        """
+        self.offset = (0, 0)
+        self.found = 0
+        self.missed = 0
+    
+    def get_matcher(self, text):
+        """
+        获取模板的匹配器，无法解码时返回 None
+        """
+        matcher = self.matchers.get(text)
+        if matcher is None and text not in self.matchers:
+            try:
+                matcher = TemplateMatcher(decode_template(text))
+            except Exception:
+                matcher = None
+            self.matchers[text] = matcher
+        return matcher
+    
+    def resolve(self, matcher, x, y, template_x, template_y):
+        """
+        查找锚点并更新偏移，返回新的偏移量
+        
+        (x, y) 为录制时的点击位置，(template_x, template_y) 为点击点在模板中的位置
+        """
+        offset_x, offset_y = self.offset
+        radius = self.search_radius
+        expected_left = x - template_x + offset_x
+        expected_top = y - template_y + offset_y
+        left, top, right, bottom = _clip(
+            self.source.bounds,
+            expected_left - radius,
+            expected_top - radius,
+            expected_left + matcher.width + radius,
+            expected_top + matcher.height + radius
+        )
+        if right <= left or bottom <= top:
+            self.missed += 1
+            return self.offset
+        
+        frame = self.source.grab(left, top, right - left, bottom - top)
+        match = matcher.locate(frame, self.threshold)
+        if match is None:
+            self.missed += 1
+            return self.offset
+        
+        match_x, match_y, _ = match
+        self.offset = (left + match_x + template_x - x, top + match_y + template_y - y)
+        self.found += 1
+        return self.offset
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+批量处理模块
+
+用进程池并行处理一个目录下的宏文件：
+- validate：检查文件能否读取以及时间戳、按键状态等数据问题
+- stats：统计事件数、时长、各类型数量和坐标范围
+- convert：转换为指定格式写入输出目录（可同时简化轨迹），保持相对路径
+
+每个文件的结果在完成时立即产生，并追加写入清单文件（JSON 行）。
+中断后使用同一个清单重新运行时，大小和修改时间都没有变化且已成功处理的文件会被跳过。
+"""
+
+import fnmatch
+import json
+import os
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from app.analysis import summarize_actions, validate_actions
+from app.macro_format import BINARY_EXTENSION, JSON_EXTENSION, load_macro, save_macro
+
+
+# 支持的批量操作
+BATCH_OPERATIONS = ('validate', 'stats', 'convert')
+
+# 默认处理的文件
+DEFAULT_PATTERNS = ('*' + JSON_EXTENSION, '*' + BINARY_EXTENSION)
+
+# 每个工作进程同时排队的任务数
+TASKS_PER_WORKER = 4
+
+# convert 操作默认的清单文件名（位于输出目录中）
+MANIFEST_NAME = 'batch_manifest.jsonl'
+
+
+# 单个文件的处理任务，需要能在进程间传递
+BatchTask = namedtuple('BatchTask', (
+    'root', 'file', 'operation', 'output_dir', 'file_format', 'simplify', 'epsilon'
+))
+
+
+def find_macro_files(root, patterns=DEFAULT_PATTERNS, recursive=True):
+    """
+    按名称顺序查找目录下的宏文件，返回相对路径
+    """
+    stack = ['']
+    while stack:
+        relative = stack.pop()
+        directory = os.path.join(root, relative)
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        
+        subdirectories = []
+        for entry in entries:
+            path = os.path.join(relative, entry.name)
+            if entry.is_dir():
+                if recursive:
+                    subdirectories.append(path)
+            elif any(fnmatch.fnmatch(entry.name, pattern) for pattern in patterns):
+                yield path
+        stack.extend(reversed(subdirectories))
+
+
+def is_nested(path, root):
+    """
+    判断 path 是否就是 root 或位于其中（解析符号链接后比较）
+    
+    convert 的输出目录位于输入目录中时，输出的文件会在查找中被当作输入处理
+    """
+    path = os.path.realpath(path)
+    root = os.path.realpath(root)
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        # Windows 上位于不同驱动器
+        return False
+
+
+def file_fingerprint(path):
+    """
+    获取文件的 (大小, 修改时间)，用于判断续跑时文件是否变化
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def output_path(task):
+    """
+    计算 convert 操作的输出文件路径
+    """
+    extension = BINARY_EXTENSION if task.file_format == 'amc' else JSON_EXTENSION
+    base = os.path.splitext(task.file)[0]
+    return os.path.join(task.output_dir, base + extension)
+
+
+def process_file(task):
+    """
+    处理单个文件，返回结果字典；在工作进程中运行，异常都记录在结果中
+    """
+    path = os.path.join(task.root, task.file)
+    started = time.perf_counter()
+    result = {'file': task.file, 'ok': False}
+    try:
+        size, mtime_ns = file_fingerprint(path)
+        result['size'] = size
+        result['mtime_ns'] = mtime_ns
+        
+        actions = load_macro(path)
+        result['count'] = len(actions)
+        
+        if task.operation == 'validate':
+            issues = validate_actions(actions)
+            result['issues'] = issues
+            result['ok'] = not issues
+        elif task.operation == 'stats':
+            result.update(summarize_actions(actions))
+            result['ok'] = True
+        elif task.operation == 'convert':
+            if task.simplify:
+                from app.simplify import simplify_actions
+                actions = simplify_actions(actions, epsilon=task.epsilon)
+            target = output_path(task)
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            save_macro(target, actions, task.file_format)
+            result['output'] = target
+            result['output_count'] = len(actions)
+            result['output_size'] = os.path.getsize(target)
+            result['ok'] = True
+        else:
+            raise ValueError(f"未知的批量操作: {task.operation}")
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+
+def load_manifest(path):
+    """
+    读取清单文件，返回文件名到最后一条结果的映射；文件不存在时返回空字典
+    
+    被中断时最后一行可能不完整，忽略无法解析的行
+    """
+    entries = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry['file']] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def open_manifest(path, resume=False):
+    """
+    打开清单文件用于写入，resume 为 True 时追加
+    
+    上次被中断时最后一行可能不完整，追加前先补上换行，新的第一条记录不会与它连成一行
+    """
+    if not resume:
+        return open(path, 'w', encoding='utf-8')
+    torn = False
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+    except FileNotFoundError:
+        pass
+    manifest_file = open(path, 'a', encoding='utf-8')
+    if torn:
+        manifest_file.write('\n')
+    return manifest_file
+
+
+def is_done(entry, root):
+    """
+    判断清单中的记录是否可以跳过：已成功且文件没有变化
+    """
+    if entry is None or not entry.get('ok'):
+        return False
+    try:
+        size, mtime_ns = file_fingerprint(os.path.join(root, entry['file']))
+    except OSError:
+        return False
+    return entry.get('size') == size and entry.get('mtime_ns') == mtime_ns
+
+
+def run_tasks(tasks, jobs=None):
+    """
+    并行处理任务，按完成顺序产生结果
+    
+    同时提交的任务数限制为 jobs * TASKS_PER_WORKER，任务很多时不会一次创建全部 Future。
+    jobs 为 1 时在当前进程中依次处理
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        for task in tasks:
+            yield process_file(task)
+        return
+    
+    tasks = iter(tasks)
+    limit = jobs * TASKS_PER_WORKER
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < limit:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(process_file, task))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+class BatchSummary:
+    """
+    汇总批量处理结果和吞吐量
+    """
+    
+    def __init__(self):
+        """
+        初始化汇总
+        """
+        self.started = time.perf_counter()
+        self.files = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.events = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.duration = 0.0
+        self.types = Counter()
+        self.bounds = None
+    
+    def add(self, result):
+        """
+        累加一个文件的结果
+        """
+        self.files += 1
+        if result['ok']:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.events += result.get('count', 0)
+        self.bytes_in += result.get('size', 0)
+        self.bytes_out += result.get('output_size', 0)
+        self.duration += result.get('duration', 0.0)
+        self.types.update(result.get('types', {}))
+        
+        bounds = result.get('bounds')
+        if bounds:
+            if self.bounds is None:
+                self.bounds = tuple(bounds)
+            else:
+                self.bounds = (
+                    min(self.bounds[0], bounds[0]),
+                    min(self.bounds[1], bounds[1]),
+                    max(self.bounds[2], bounds[2]),
+                    max(self.bounds[3], bounds[3])
+                )
+    
+    def to_dict(self):
+        """
+        生成汇总字典
+        """
+        elapsed = time.perf_counter() - self.started
+        rate = 1.0 / elapsed if elapsed > 0 else 0.0
+        summary = {
+            'files': self.files,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'events': self.events,
+            'bytes_in': self.bytes_in,
+            'elapsed': elapsed,
+            'files_per_second': self.files * rate,
+            'events_per_second': self.events * rate,
+            'mb_per_second': self.bytes_in * rate / 1e6
+        }
+        if self.bytes_out:
+            summary['bytes_out'] = self.bytes_out
+        if self.types:
+            summary['duration'] = self.duration
+            summary['types'] = dict(sorted(self.types.items()))
+            summary['bounds'] = self.bounds
+        return summary
+
+
+def run_batch(root, operation, output_dir=None, file_format='amc', simplify=False,
+              epsilon=1.5, jobs=None, manifest=None, resume=False,
+              patterns=DEFAULT_PATTERNS, recursive=True, summary=None):
+    """
+    批量处理目录，按完成顺序产生每个文件的结果
+    
+    结果同时累加到 summary（BatchSummary）中；manifest 为清单文件路径，convert 操作默认写在输出目录中；resume 为 True 时跳过清单中已完成的文件
+    """
+    if operation not in BATCH_OPERATIONS:
+        raise ValueError(f"未知的批量操作: {operation}")
+    if operation == 'convert':
+        if not output_dir:
+            raise ValueError("convert 操作需要指定输出目录")
+        if is_nested(output_dir, root):
+            raise ValueError("输出目录不能是输入目录或其中的子目录")
+        os.makedirs(output_dir, exist_ok=True)
+        if manifest is None:
+            manifest = os.path.join(output_dir, MANIFEST_NAME)
+    if resume and manifest is None:
+        raise ValueError("续跑需要指定清单文件")
+    
+    done = load_manifest(manifest) if resume else {}
+    if summary is None:
+        summary = BatchSummary()
+    
+    def tasks():
+        for relative in find_macro_files(root, patterns, recursive):
+            if is_done(done.get(relative), root):
+                summary.skipped += 1
+                continue
+            yield BatchTask(root, relative, operation, output_dir, file_format, simplify, epsilon)
+    
+    manifest_file = None
+    if manifest is not None:
+        manifest_file = open_manifest(manifest, resume)
+    try:
+        for result in run_tasks(tasks(), jobs):
+            summary.add(result)
+            if manifest_file is not None:
+                manifest_file.write(json.dumps(result, ensure_ascii=False) + '\n')
+                manifest_file.flush()
+            yield result
+    finally:
+        if manifest_file is not None:
+            manifest_file.close()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+性能基准模块
+
+使用内存输入后端（input_backend.FakeBackend）测量录制和回放的热点路径，
+不需要图形界面，可以在无显示器的 Linux 上运行：
+- record_move：Recorder.on_mouse_move 回调的吞吐量，以及消费线程处理完全部事件的端到端吞吐量
+- execute_action：Player._execute_action 逐个执行动作字典
+  （execute_action、plan_dispatch、playback_loop 可以用 --backend 换成其他输入后端比较开销）
+- plan_dispatch：执行预先编译的回放计划
+- playback_loop：所有动作都已到期时回放循环的吞吐量（调度器和计划分发的开销）
+- roundtrip_*：JSON 和 .amc 格式的保存、加载和内存映射读取
+- scheduler_timing：按 1 毫秒间隔回放时的实际延迟分布
+
+结果写成 JSON，用 --compare 与其他提交的结果比较：
+    python -m app bench -o bench.json
+    python -m app bench --quick --compare bench.json
+"""
+
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+
+from app.action_buffer import (
+    ActionBuffer, TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+)
+from app.input_backend import FakeBackend, create_backend
+from app.macro_format import load_macro, open_macro, save_macro
+
+
+# 结果文件格式版本
+RESULT_VERSION = 1
+
+# 大宏文件的默认事件数，--quick 时使用较小的数量
+LARGE_EVENTS = 1_000_000
+QUICK_LARGE_EVENTS = 100_000
+
+# 与录制文件规模相同的小宏文件，没有 act.json 时用同样数量的合成事件代替
+SAMPLE_FILE = 'act.json'
+SAMPLE_EVENTS = 616
+
+# 测量调度精度时的事件数和事件间隔（秒）
+TIMING_EVENTS = 2000
+QUICK_TIMING_EVENTS = 500
+TIMING_INTERVAL = 0.001
+
+# 吞吐量测量的重复次数，取最快的一次
+DEFAULT_REPEAT = 3
+
+# 比较结果时认为是退化的相对变化
+DEFAULT_THRESHOLD = 0.10
+
+
+def synthetic_actions(count, interval=0.008, seed=0):
+    """
+    生成合成的宏，构成与实际录制接近：大部分是鼠标移动，夹杂点击、滚轮和按键
+    
+    interval 为相邻事件的时间间隔（秒）
+    """
+    rng = random.Random(seed)
+    buffer = ActionBuffer()
+    x, y = 960, 540
+    i = 0
+    while i < count:
+        timestamp = i * interval
+        roll = rng.random()
+        if roll < 0.02 and i + 1 < count:
+            buffer.append_click(x, y, 'Button.left', True, timestamp)
+            buffer.append_click(x, y, 'Button.left', False, timestamp + interval)
+            i += 2
+            continue
+        if roll < 0.03 and i + 1 < count:
+            key = rng.choice('abcdefghijklmnopqrstuvwxyz')
+            buffer.append_key(TYPE_KEY_PRESS, key, timestamp)
+            buffer.append_key(TYPE_KEY_RELEASE, key, timestamp + interval)
+            i += 2
+            continue
+        if roll < 0.05:
+            buffer.append_scroll(x, y, 0, rng.choice((-1, 1)), timestamp)
+        else:
+            x = min(1919, max(0, x + rng.randint(-8, 8)))
+            y = min(1079, max(0, y + rng.randint(-8, 8)))
+            buffer.append_move(x, y, timestamp)
+        i += 1
+    return buffer
+
+
+def _throughput(events, seconds, **extra):
+    """
+    生成吞吐量结果
+    """
+    return {
+        'events': events,
+        'seconds': seconds,
+        'events_per_second': events / seconds if seconds > 0 else 0.0,
+        **extra
+    }
+
+
+def _best_of(repeat, function):
+    """
+    重复运行 function()，返回最短用时（秒）和最后一次的返回值
+    """
+    best = None
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = function()
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, value
+
+
+def bench_record_move(count, repeat=DEFAULT_REPEAT):
+    """
+    测量 Recorder.on_mouse_move 的吞吐量
+    
+    callback 只计回调本身（放入队列），end_to_end 计到消费线程处理完全部事件为止
+    """
+    from app.recorder import Recorder
+    
+    best_callback = None
+    best_total = None
+    stored = dropped = 0
+    for _ in range(repeat):
+        recorder = Recorder(queue_capacity=count + 1, backend=FakeBackend())
+        recorder.start_recording()
+        on_mouse_move = recorder.on_mouse_move
+        started = time.perf_counter()
+        for i in range(count):
+            on_mouse_move(i % 1920, i % 1080)
+        callback = time.perf_counter() - started
+        recorder.stop_recording()
+        total = time.perf_counter() - started
+        stored = len(recorder.get_actions())
+        dropped = recorder.dropped_events
+        if best_callback is None or callback < best_callback:
+            best_callback = callback
+        if best_total is None or total < best_total:
+            best_total = total
+    
+    return {
+        'callback': _throughput(count, best_callback),
+        'end_to_end': _throughput(count, best_total, stored=stored, dropped=dropped)
+    }
+
+
+def bench_execute_action(actions, repeat=DEFAULT_REPEAT, backend=None):
+    """
+    测量 Player._execute_action 逐个执行动作字典的吞吐量
+    """
+    from app.player import Player
+    
+    player = Player(backend=backend or FakeBackend(record=False))
+    dicts = actions.to_list()
+    execute = player._execute_action
+    
+    def run():
+        for action in dicts:
+            execute(action)
+    
+    seconds, _ = _best_of(repeat, run)
+    return _throughput(len(dicts), seconds)
+
+
+def bench_plan_dispatch(actions, repeat=DEFAULT_REPEAT, backend=None):
+    """
+    测量编译回放计划以及执行已编译计划的吞吐量
+    """
+    from app.player import Player
+    
+    player = Player(backend=backend or FakeBackend(record=False))
+    compile_seconds, plan = _best_of(repeat, lambda: player._compile_plan(actions))
+    
+    def run():
+        for handler, args in plan:
+            handler(*args)
+        player.backend.flush()
+    
+    seconds, _ = _best_of(repeat, run)
+    return {
+        'compile': _throughput(len(plan), compile_seconds),
+        'dispatch': _throughput(len(plan), seconds)
+    }
+
+
+def bench_playback_loop(actions, repeat=DEFAULT_REPEAT, backend=None):
+    """
+    测量回放循环本身的吞吐量：时间戳全部为 0，所有动作一开始就已到期
+    """
+    from app.player import Player
+    
+    immediate = actions[:]
+    immediate.timestamps = array('d', bytes(8 * len(immediate)))
+    
+    player = Player(backend=backend or FakeBackend(record=False))
+    player.set_actions(immediate)
+    seconds, _ = _best_of(repeat, player.start_playing)
+    return _throughput(len(immediate), seconds)
+
+
+def bench_roundtrip(actions, directory, name, repeat=DEFAULT_REPEAT):
+    """
+    测量两种格式的保存、加载以及内存映射读取的吞吐量和文件大小
+    """
+    count = len(actions)
+    results = {}
+    for file_format, extension in (('json', '.json'), ('amc', '.amc')):
+        filename = os.path.join(directory, name + extension)
+        save_seconds, _ = _best_of(repeat, lambda: save_macro(filename, actions, file_format))
+        load_seconds, loaded = _best_of(repeat, lambda: load_macro(filename))
+        if len(loaded) != count:
+            raise RuntimeError(f"{filename} 读回的事件数不一致: {len(loaded)} != {count}")
+        
+        result = {
+            'bytes': os.path.getsize(filename),
+            'save': _throughput(count, save_seconds),
+            'load': _throughput(count, load_seconds)
+        }
+        if file_format == 'amc':
+            def scan():
+                with open_macro(filename) as macro:
+                    return sum(len(buffer) for _, buffer in macro.iter_buffers())
+            scan_seconds, scanned = _best_of(repeat, scan)
+            result['open_scan'] = _throughput(scanned, scan_seconds)
+        results[file_format] = result
+        os.remove(filename)
+    return results
+
+
+def bench_scheduler_timing(count, interval=TIMING_INTERVAL):
+    """
+    按固定间隔回放鼠标移动，测量调度精度
+    
+    lateness 为回放器记录的每个事件相对计划时间的延迟；
+    inter_event 为内存后端记录的相邻注入事件的实际间隔与计划间隔之差（毫秒）
+    """
+    from app.player import Player
+    from app.scheduler import LatenessStats
+    
+    buffer = ActionBuffer()
+    for i in range(count):
+        buffer.append_move(i % 1920, i % 1080, i * interval)
+    
+    backend = FakeBackend()
+    player = Player(backend=backend)
+    player.set_actions(buffer)
+    player.start_playing()
+    
+    errors = LatenessStats()
+    expected_ns = interval * 1e9
+    times = [event[0] for event in backend.events]
+    for previous, current in zip(times, times[1:]):
+        errors.record(round(abs(current - previous - expected_ns)))
+    
+    inter_event = errors.summary()
+    inter_event.pop('drift_ms')
+    return {
+        'events': count,
+        'interval_ms': interval * 1000,
+        'injected': len(backend.events),
+        'lateness': player.get_timing_stats(),
+        'inter_event': inter_event
+    }
+
+
+def load_sample(path=SAMPLE_FILE):
+    """
+    加载与录制文件规模相同的小宏，文件不存在时生成同样数量的合成事件
+    """
+    if path and os.path.exists(path):
+        return load_macro(path), path
+    return synthetic_actions(SAMPLE_EVENTS), f'synthetic:{SAMPLE_EVENTS}'
+
+
+def environment():
+    """
+    收集运行环境信息，便于比较不同机器和提交上的结果
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+# 基准名称，按运行顺序排列
+BENCHMARKS = (
+    'record_move', 'execute_action', 'plan_dispatch', 'playback_loop',
+    'roundtrip_sample', 'roundtrip_large', 'scheduler_timing'
+)
+
+
+def run_benchmarks(names=BENCHMARKS, quick=False, large_events=None, sample=SAMPLE_FILE,
+                   repeat=DEFAULT_REPEAT, backend='memory', progress=None):
+    """
+    运行基准，返回结果字典
+    
+    backend 为回放分发基准使用的输入后端名称；progress(名称) 在每个基准开始前调用
+    """
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"未知的基准: {', '.join(sorted(unknown))}")
+    if large_events is None:
+        large_events = QUICK_LARGE_EVENTS if quick else LARGE_EVENTS
+    
+    input_backend = None if backend == 'memory' else create_backend(backend)
+    sample_actions, sample_name = load_sample(sample)
+    large_actions = None
+    results = {}
+    
+    def large():
+        nonlocal large_actions
+        if large_actions is None:
+            large_actions = synthetic_actions(large_events)
+        return large_actions
+    
+    with tempfile.TemporaryDirectory(prefix='amc_bench_') as directory:
+        for name in BENCHMARKS:
+            if name not in names:
+                continue
+            if progress is not None:
+                progress(name)
+            if name == 'record_move':
+                results[name] = bench_record_move(large_events, repeat)
+            elif name == 'execute_action':
+                results[name] = bench_execute_action(sample_actions, repeat, input_backend)
+            elif name == 'plan_dispatch':
+                results[name] = bench_plan_dispatch(large(), repeat, input_backend)
+            elif name == 'playback_loop':
+                results[name] = bench_playback_loop(large(), repeat, input_backend)
+            elif name == 'roundtrip_sample':
+                results[name] = bench_roundtrip(sample_actions, directory, 'sample', repeat)
+            elif name == 'roundtrip_large':
+                results[name] = bench_roundtrip(large(), directory, 'large', repeat)
+            elif name == 'scheduler_timing':
+                results[name] = bench_scheduler_timing(
+                    QUICK_TIMING_EVENTS if quick else TIMING_EVENTS
+                )
+    
+    return {
+        'version': RESULT_VERSION,
+        'environment': environment(),
+        'parameters': {
+            'quick': quick,
+            'repeat': repeat,
+            'large_events': large_events,
+            'backend': backend,
+            'sample': sample_name,
+            'sample_events': len(sample_actions)
+        },
+        'results': results
+    }
+
+
+def _flatten(results, prefix=''):
+    """
+    把嵌套的结果展开为 {'a.b.c': 数值}
+    """
+    flat = {}
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare_results(old, new, threshold=DEFAULT_THRESHOLD):
+    """
+    比较两次基准结果
+    
+    只比较吞吐量（events_per_second，越大越好）和延迟（*_ms，越小越好）。
+    返回 (名称, 旧值, 新值, 相对变化, 是否退化) 的列表，相对变化为正表示变好
+    """
+    old_flat = _flatten(old.get('results', {}))
+    new_flat = _flatten(new.get('results', {}))
+    rows = []
+    for path, new_value in new_flat.items():
+        old_value = old_flat.get(path)
+        if old_value is None:
+            continue
+        if path.endswith('events_per_second'):
+            higher_is_better = True
+        elif path.endswith('_ms') and not path.endswith('interval_ms'):
+            higher_is_better = False
+        else:
+            continue
+        if old_value == 0:
+            continue
+        change = (new_value - old_value) / abs(old_value)
+        if not higher_is_better:
+            change = -change
+        rows.append((path, old_value, new_value, change, change < -threshold))
+    return rows
+
+
+def format_results(report):
+    """
+    把结果格式化为便于阅读的文本行
+    """
+    lines = []
+    environment_info = report['environment']
+    lines.append(
+        f"提交 {environment_info['commit'] or '未知'}，Python {environment_info['python']}，"
+        f"{environment_info['platform']}"
+    )
+    for path, value in _flatten(report['results']).items():
+        if path.endswith('events_per_second'):
+            lines.append(f"  {path}: {value:,.0f} 事件/秒")
+        elif path.endswith('_ms'):
+            lines.append(f"  {path}: {value:.3f} 毫秒")
+        elif path.endswith('bytes'):
+            lines.append(f"  {path}: {value:,} 字节")
+    return lines
+
+
+def format_comparison(rows):
+    """
+    把比较结果格式化为文本行
+    """
+    lines = []
+    for path, old_value, new_value, change, regressed in rows:
+        mark = '退化' if regressed else ''
+        lines.append(f"  {path}: {old_value:.4g} -> {new_value:.4g} ({change:+.1%}) {mark}".rstrip())
+    return lines
+
+
+def main(argv=None):
+    """
+    单独运行基准：python -m app.bench
+    """
+    from app.cli import main as cli_main
+    return cli_main(['bench'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+屏幕截取模块
+
+图像锚点和等待条件在回放过程中会反复截屏，这里统一处理：
+- 只截取需要的区域（ROI），不截整个屏幕
+- 按区域尺寸复用 NumPy 缓冲区，截图和灰度转换都直接写入已有的缓冲区，不逐帧分配内存
+- 缓存最后一帧，在有效期（ttl）内落在该帧范围内的查询直接取视图，同一时刻的多次检查只截一次屏
+- 截图后端可替换：mss（推荐）、Pillow，以及用于测试的内存帧缓冲 FakeFramebuffer
+
+后端只需提供 bounds（屏幕范围 left, top, right, bottom）和
+grab_into(left, top, out)（把区域的 BGR 图像写入 out）。
+
+返回的图像是缓冲区的视图，下一次截图后内容可能被覆盖，需要保留时请复制。
+依赖 numpy 和 opencv-python。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+    np = None
+
+
+# 默认的帧缓存有效期（秒），约为 60Hz 的一帧
+DEFAULT_TTL = 1 / 60
+
+# 最多保留的缓冲区尺寸数
+DEFAULT_MAX_BUFFERS = 8
+
+# 自动选择后端时的尝试顺序
+BACKEND_ORDER = ('mss', 'pillow')
+
+
+class CaptureError(Exception):
+    """
+    截图失败或没有可用的截图后端
+    """
+
+
+def is_available():
+    """
+    检查 OpenCV 和 NumPy 是否可用
+    """
+    return cv2 is not None
+
+
+class FakeFramebuffer:
+    """
+    内存中的帧缓冲，用于测试和离线验证
+    
+    可以通过 draw() 修改画面，模拟目标程序的界面变化
+    """
+    
+    def __init__(self, image, origin=(0, 0)):
+        """
+        初始化，image 为灰度或 BGR 图像，origin 为图像左上角对应的屏幕坐标
+        """
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        self.image = np.ascontiguousarray(image[:, :, :3])
+        self.origin = origin
+        height, width = self.image.shape[:2]
+        self.bounds = (origin[0], origin[1], origin[0] + width, origin[1] + height)
+        self.grab_count = 0
+    
+    def draw(self, left, top, patch):
+        """
+        把 patch 画到屏幕坐标 (left, top) 处
+        """
+        if patch.ndim == 2:
+            patch = cv2.cvtColor(patch, cv2.COLOR_GRAY2BGR)
+        x = left - self.origin[0]
+        y = top - self.origin[1]
+        height, width = patch.shape[:2]
+        self.image[y:y + height, x:x + width] = patch
+    
+    def grab_into(self, left, top, out):
+        """
+        把区域复制到 out
+        """
+        self.grab_count += 1
+        x = left - self.origin[0]
+        y = top - self.origin[1]
+        height, width = out.shape[:2]
+        np.copyto(out, self.image[y:y + height, x:x + width])
+
+
+class MssBackend:
+    """
+    使用 mss 截图，支持多显示器组成的虚拟屏幕
+    
+    mss 对象不能跨线程使用，每个线程各自创建一个
+    """
+    
+    def __init__(self):
+        """
+        初始化并获取虚拟屏幕范围
+        """
+        import mss
+        self.mss = mss
+        self.local = threading.local()
+        monitor = self._session().monitors[0]
+        self.bounds = (
+            monitor['left'],
+            monitor['top'],
+            monitor['left'] + monitor['width'],
+            monitor['top'] + monitor['height']
+        )
+    
+    def _session(self):
+        """
+        获取当前线程的 mss 对象
+        """
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.mss.mss()
+        return session
+    
+    def grab_into(self, left, top, out):
+        """
+        截取区域并转换为 BGR 写入 out
+        """
+        height, width = out.shape[:2]
+        shot = self._session().grab({'left': left, 'top': top, 'width': width, 'height': height})
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(height, width, 4)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+
+
+class PillowBackend:
+    """
+    使用 Pillow 的 ImageGrab 截取主屏幕
+    """
+    
+    def __init__(self):
+        """
+        初始化并获取屏幕尺寸
+        """
+        from PIL import ImageGrab
+        self.image_grab = ImageGrab
+        width, height = ImageGrab.grab().size
+        self.bounds = (0, 0, width, height)
+    
+    def grab_into(self, left, top, out):
+        """
+        截取区域并转换为 BGR 写入 out
+        """
+        height, width = out.shape[:2]
+        image = self.image_grab.grab(bbox=(left, top, left + width, top + height))
+        cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR, dst=out)
+
+
+# 后端名称到工厂函数的映射
+BACKENDS = {
+    'mss': MssBackend,
+    'pillow': PillowBackend,
+}
+
+
+def register_backend(name, factory):
+    """
+    注册截图后端，factory 无参数调用后返回后端对象
+    """
+    BACKENDS[name] = factory
+
+
+def create_backend(name=None):
+    """
+    创建截图后端
+    
+    name 为 None 时按 BACKEND_ORDER 依次尝试，全部不可用时抛出 CaptureError
+    """
+    if not is_available():
+        raise CaptureError("截图需要 opencv-python 和 numpy")
+    
+    if name is not None:
+        if name not in BACKENDS:
+            raise CaptureError(f"未知的截图后端: {name}")
+        names = (name,)
+    else:
+        names = BACKEND_ORDER
+    
+    errors = []
+    for backend_name in names:
+        try:
+            return BACKENDS[backend_name]()
+        except Exception as e:
+            errors.append(f"{backend_name}: {e}")
+    raise CaptureError("没有可用的截图后端（" + "; ".join(errors) + "）")
+
+
+def default_capture():
+    """
+    使用默认后端创建 ScreenCapture，不可用时返回 None
+    """
+    try:
+        return ScreenCapture(create_backend())
+    except CaptureError:
+        return None
+
+
+class _Frame:
+    """
+    一块可复用的帧缓冲区及其当前内容对应的屏幕区域
+    """
+    
+    __slots__ = ('color', 'gray', 'gray_valid', 'left', 'top', 'width', 'height', 'time')
+    
+    def __init__(self, width, height):
+        self.color = np.empty((height, width, 3), dtype=np.uint8)
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self.gray_valid = False
+        self.left = 0
+        self.top = 0
+        self.width = width
+        self.height = height
+        self.time = 0.0
+    
+    def contains(self, left, top, width, height):
+        return (left >= self.left and top >= self.top
+                and left + width <= self.left + self.width
+                and top + height <= self.top + self.height)
+
+
+class ScreenCapture:
+    """
+    带帧缓存的区域截图
+    
+    grab() 返回灰度图，grab_color() 返回 BGR 图，pixel() 返回 RGB 颜色。
+    线程安全：所有截图在同一把锁下进行
+    """
+    
+    def __init__(self, backend, ttl=DEFAULT_TTL, max_buffers=DEFAULT_MAX_BUFFERS):
+        """
+        初始化
+        
+        ttl 为帧缓存有效期（秒），0 表示每次查询都重新截图
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.max_buffers = max_buffers
+        self.buffers = OrderedDict()  # (高, 宽) 到 _Frame 的映射，按最近使用排序
+        self.last_frame = None
+        self.lock = threading.Lock()
+        
+        # 统计
+        self.grabs = 0
+        self.cache_hits = 0
+        self.grab_ns = 0
+    
+    @property
+    def bounds(self):
+        """
+        屏幕范围 (left, top, right, bottom)
+        """
+        return self.backend.bounds
+    
+    def grab(self, left, top, width, height):
+        """
+        获取区域的灰度图
+        """
+        with self.lock:
+            frame, x, y = self._frame(left, top, width, height)
+            if not frame.gray_valid:
+                cv2.cvtColor(frame.color, cv2.COLOR_BGR2GRAY, dst=frame.gray)
+                frame.gray_valid = True
+            return frame.gray[y:y + height, x:x + width]
+    
+    def grab_color(self, left, top, width, height):
+        """
+        获取区域的 BGR 图
+        """
+        with self.lock:
+            frame, x, y = self._frame(left, top, width, height)
+            return frame.color[y:y + height, x:x + width]
+    
+    def pixel(self, x, y):
+        """
+        获取一个像素的 (r, g, b) 颜色
+        """
+        with self.lock:
+            frame, fx, fy = self._frame(x, y, 1, 1)
+            b, g, r = frame.color[fy, fx]
+            return int(r), int(g), int(b)
+    
+    def prefetch(self, left, top, width, height):
+        """
+        截取一块较大的区域放入缓存，随后落在其中的多次查询共享这一次截图
+        """
+        with self.lock:
+            self._frame(left, top, width, height)
+    
+    def invalidate(self):
+        """
+        丢弃缓存的帧，下一次查询重新截图
+        """
+        with self.lock:
+            self.last_frame = None
+    
+    def get_stats(self):
+        """
+        获取截图统计
+        """
+        return {
+            'grabs': self.grabs,
+            'cache_hits': self.cache_hits,
+            'grab_ms': self.grab_ns / 1e6,
+            'mean_grab_ms': self.grab_ns / self.grabs / 1e6 if self.grabs else 0.0
+        }
+    
+    def _frame(self, left, top, width, height):
+        """
+        获取包含该区域的帧，返回 (帧, 区域在帧中的 x, 区域在帧中的 y)
+        """
+        if width <= 0 or height <= 0:
+            raise ValueError("截图区域为空")
+        screen_left, screen_top, screen_right, screen_bottom = self.backend.bounds
+        if (left < screen_left or top < screen_top
+                or left + width > screen_right or top + height > screen_bottom):
+            raise ValueError(f"截图区域超出屏幕: ({left}, {top}, {width}, {height})")
+        
+        now = time.perf_counter()
+        frame = self.last_frame
+        if (frame is not None and now - frame.time <= self.ttl
+                and frame.contains(left, top, width, height)):
+            self.cache_hits += 1
+            return frame, left - frame.left, top - frame.top
+        
+        frame = self._get_buffer(width, height)
+        start = time.perf_counter_ns()
+        try:
+            self.backend.grab_into(left, top, frame.color)
+        except Exception as e:
+            self.last_frame = None
+            raise CaptureError(f"截图失败: {e}") from e
+        self.grab_ns += time.perf_counter_ns() - start
+        self.grabs += 1
+        
+        frame.left = left
+        frame.top = top
+        frame.time = now
+        frame.gray_valid = False
+        self.last_frame = frame
+        return frame, 0, 0
+    
+    def _get_buffer(self, width, height):
+        """
+        获取指定尺寸的缓冲区，没有时创建，超出数量时淘汰最久未用的
+        """
+        key = (height, width)
+        frame = self.buffers.get(key)
+        if frame is not None:
+            self.buffers.move_to_end(key)
+            return frame
+        
+        frame = _Frame(width, height)
+        self.buffers[key] = frame
+        while len(self.buffers) > self.max_buffers:
+            self.buffers.popitem(last=False)
+        return frame
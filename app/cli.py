@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+"""
+命令行模块
+
+不依赖 PySide6，用于无人值守的机器上批量录制、回放、转换和查看宏文件：
+    python -m app record out.amc --duration 60
+    python -m app play macro.amc --speed 2 --repeat 10
+    python -m app play workflow.amx --param name=Alice
+    python -m app convert macro.json macro.amc --simplify
+    python -m app convert form.amc form_fast.amc --fast-text 50
+    python -m app info macro.amc
+    python -m app bench -o bench.json
+    python -m app verify macro.amc --speed 1 --speed 4
+    python -m app jobs add macro.amc --at 02:30 --priority 5
+    python -m app jobs run
+
+录制和回放需要 pynput，只在执行这两个命令时才导入。
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from app.macro_format import (
+    FILE_FORMATS, BINARY_EXTENSION, load_macro, open_macro, save_macro, is_binary_filename
+)
+from app.timeline import TimelineTransform
+from app.text import collapse_text, rate_to_interval
+from app.input_backend import BACKENDS, DEFAULT_BACKEND, create_backend
+from app.jobs import DEFAULT_QUEUE_FILE, JobQueue, JobRunner, JobError
+from app.batch import BATCH_OPERATIONS, BatchSummary, run_batch
+
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def cmd_record(args):
+    """
+    录制动作，直到按下 Ctrl+C 或达到指定时长
+    """
+    from app.recorder import Recorder
+    from app.simplify import MoveFilter
+    
+    recorder = Recorder(backend=create_backend(args.backend))
+    if args.simplify:
+        recorder.set_move_filter(MoveFilter())
+    if args.anchors:
+        from app.capture import default_capture
+        source = default_capture()
+        if source is None:
+            print("图像锚点需要 opencv-python、numpy 以及 mss 或 Pillow", file=sys.stderr)
+            return EXIT_FAILURE
+        recorder.set_anchor_source(source)
+    
+    if args.journal:
+        if not is_binary_filename(args.output):
+            print(f"日志模式只支持 {BINARY_EXTENSION} 文件", file=sys.stderr)
+            return EXIT_USAGE
+        recorder.start_recording(args.output)
+    else:
+        recorder.start_recording()
+    
+    print("正在录制，按 Ctrl+C 停止...", file=sys.stderr)
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop_recording()
+    
+    if not args.journal:
+        save_macro(args.output, recorder.get_actions(), args.format)
+    
+    print(f"已录制 {len(recorder.get_actions())} 个事件到 {args.output}", file=sys.stderr)
+    if recorder.dropped_events:
+        print(f"警告：事件队列已满，丢弃了 {recorder.dropped_events} 个事件", file=sys.stderr)
+    return EXIT_OK
+
+
+def _report_progress(player, interval, done):
+    """
+    每隔 interval 秒把回放指标输出到标准错误，直到 done 被设置
+    """
+    from app.metrics import PlaybackMetrics, format_metrics
+    
+    metrics = PlaybackMetrics(player)
+    while not done.wait(interval):
+        print("；".join(format_metrics(metrics.sample())), file=sys.stderr)
+
+
+def _close_macro(actions):
+    """
+    关闭 open_macro() 打开的宏文件或组合文档；JSON 文件已整体读入内存，没有需要关闭的资源
+    """
+    close = getattr(actions, 'close', None)
+    if close is not None:
+        close()
+
+
+def cmd_play(args):
+    """
+    回放宏文件，回放结束后关闭文件映射
+    """
+    source = open_macro(args.input, dict(args.param))
+    try:
+        return _play_macro(args, source)
+    finally:
+        _close_macro(source)
+
+
+def _play_macro(args, actions):
+    """
+    按命令行参数设置播放器并回放打开的宏
+    """
+    from app.player import Player
+    
+    if not len(actions):
+        print("宏文件中没有动作", file=sys.stderr)
+        return EXIT_FAILURE
+    
+    if args.fast_text is not None:
+        actions = collapse_text(actions, rate_to_interval(args.fast_text))
+    
+    player = Player(backend=create_backend(args.backend))
+    player.set_actions(actions)
+    player.set_speed(args.speed)
+    player.set_repeat_count(args.repeat)
+    player.anchors_enabled = not args.no_anchors
+    player.set_timeline(TimelineTransform(
+        max_gap=args.max_gap,
+        fast_moves=args.fast_moves,
+        move_interval=args.move_interval,
+        rates=args.rate
+    ))
+    if args.start_index is not None:
+        player.seek(args.start_index)
+    elif args.start_at:
+        player.seek_time(args.start_at)
+    if args.verbose:
+        print(f"预计单次回放时长 {player.get_projected_duration():.3f} 秒", file=sys.stderr)
+        if player.start_index:
+            print(f"从第 {player.start_index} 个动作（{player.get_position():.3f} 秒）开始",
+                  file=sys.stderr)
+    if args.verbose:
+        player.repeat_started.connect(
+            lambda repeat: print(f"重复第 {repeat} 次", file=sys.stderr)
+        )
+    
+    if args.delay:
+        time.sleep(args.delay)
+    
+    done = threading.Event()
+    if args.progress:
+        threading.Thread(target=_report_progress, args=(player, args.progress, done), daemon=True).start()
+    try:
+        player.start_playing()
+    except KeyboardInterrupt:
+        player.stop_playing()
+        print("回放已中断", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    finally:
+        done.set()
+        player.backend.close()
+    
+    if args.stats:
+        for repeat, stats in enumerate(player.timing_history, 1):
+            print(json.dumps({'repeat': repeat, **stats}, ensure_ascii=False))
+        tracker = player.anchor_tracker
+        if tracker is not None and (tracker.found or tracker.missed):
+            print(json.dumps({'anchors_found': tracker.found, 'anchors_missed': tracker.missed}))
+    
+    if player.last_error is not None:
+        print(f"回放失败: {player.last_error}", file=sys.stderr)
+        return EXIT_FAILURE
+    return EXIT_OK
+
+
+def cmd_convert(args):
+    """
+    转换宏文件格式，可选简化鼠标轨迹、合并文字输入
+    """
+    actions = load_macro(args.input)
+    before = len(actions)
+    
+    if args.simplify:
+        from app.simplify import simplify_actions
+        actions = simplify_actions(actions, epsilon=args.epsilon)
+    if args.fast_text is not None:
+        actions = collapse_text(actions, rate_to_interval(args.fast_text))
+    
+    save_macro(args.output, actions, args.format)
+    print(f"{args.input} -> {args.output}: {before} -> {len(actions)} 个事件", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_info(args):
+    """
+    显示宏文件的统计信息
+    """
+    from app.analysis import summarize_actions
+    
+    status = EXIT_OK
+    for filename in args.inputs:
+        try:
+            actions = open_macro(filename)
+            try:
+                summary = summarize_actions(actions)
+            finally:
+                _close_macro(actions)
+        except Exception as e:
+            print(f"{filename}: 读取失败: {e}", file=sys.stderr)
+            status = EXIT_FAILURE
+            continue
+        
+        if args.json:
+            print(json.dumps({'file': filename, **summary}, ensure_ascii=False))
+            continue
+        
+        print(f"{filename}")
+        print(f"  事件数: {summary['count']}")
+        print(f"  时长: {summary['duration']:.3f} 秒")
+        for name, count in summary['types'].items():
+            print(f"  {name}: {count}")
+        if summary['bounds'] is not None:
+            print("  坐标范围: ({}, {}) - ({}, {})".format(*summary['bounds']))
+    return status
+
+
+def cmd_batch(args):
+    """
+    并行批量处理目录下的宏文件
+    """
+    summary = BatchSummary()
+    options = {}
+    if args.pattern:
+        options['patterns'] = args.pattern
+    results = run_batch(
+        args.directory, args.operation,
+        output_dir=args.output_dir,
+        file_format=args.format,
+        simplify=args.simplify,
+        epsilon=args.epsilon,
+        jobs=args.jobs,
+        manifest=args.manifest,
+        resume=args.resume,
+        recursive=not args.no_recursive,
+        summary=summary,
+        **options
+    )
+    
+    for result in results:
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+        elif not result['ok']:
+            reason = result.get('error') or '; '.join(result.get('issues', []))
+            print(f"失败 {result['file']}: {reason}", flush=True)
+        elif args.verbose:
+            print(f"完成 {result['file']}（{result.get('count', 0)} 个事件）", flush=True)
+    
+    totals = summary.to_dict()
+    if args.json:
+        print(json.dumps({'summary': totals}, ensure_ascii=False))
+    else:
+        print(
+            f"{totals['files']} 个文件，成功 {totals['succeeded']}，失败 {totals['failed']}，"
+            f"跳过 {totals['skipped']}，用时 {totals['elapsed']:.2f} 秒",
+            file=sys.stderr
+        )
+        print(
+            f"吞吐量：{totals['files_per_second']:.1f} 文件/秒，"
+            f"{totals['events_per_second']:.0f} 事件/秒，{totals['mb_per_second']:.2f} MB/秒",
+            file=sys.stderr
+        )
+        if 'types' in totals:
+            print(f"总时长 {totals['duration']:.1f} 秒，事件类型 {totals['types']}，"
+                  f"坐标范围 {totals['bounds']}", file=sys.stderr)
+    return EXIT_FAILURE if summary.failed else EXIT_OK
+
+
+def cmd_bench(args):
+    """
+    运行性能基准，结果以 JSON 写入文件或标准输出，可与之前的结果比较
+    """
+    from app.bench import (
+        BENCHMARKS, run_benchmarks, compare_results, format_results, format_comparison
+    )
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    
+    report = run_benchmarks(
+        names=args.only or BENCHMARKS,
+        quick=args.quick,
+        large_events=args.events,
+        sample=args.sample,
+        repeat=args.repeat,
+        backend=args.backend,
+        progress=lambda name: print(f"运行 {name}...", file=sys.stderr, flush=True)
+    )
+    
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        for line in format_results(report):
+            print(line, file=sys.stderr)
+    else:
+        print(text)
+    
+    if baseline is None:
+        return EXIT_OK
+    rows = compare_results(baseline, report, args.threshold)
+    print(f"与 {args.compare}（提交 {baseline.get('environment', {}).get('commit') or '未知'}）比较:",
+          file=sys.stderr)
+    for line in format_comparison(rows):
+        print(line, file=sys.stderr)
+    regressions = sum(1 for row in rows if row[4])
+    if regressions:
+        print(f"{regressions} 项指标退化超过 {args.threshold:.0%}", file=sys.stderr)
+        return EXIT_FAILURE
+    return EXIT_OK
+
+
+def cmd_verify(args):
+    """
+    回放并核对实际注入的事件，按速度输出时间误差、缺失/多余事件和位置误差
+    """
+    from app.verify import VERIFY_MODES, verify_playback, is_faithful
+    
+    actions = load_macro(args.input)
+    if not len(actions):
+        print("宏文件中没有动作", file=sys.stderr)
+        return EXIT_FAILURE
+    
+    status = EXIT_OK
+    for speed in args.speed or [1.0]:
+        if args.delay:
+            time.sleep(args.delay)
+        report = verify_playback(
+            actions, speed,
+            mode=args.mode,
+            backend=args.backend,
+            position_tolerance=args.tolerance
+        )
+        if not is_faithful(report):
+            status = EXIT_FAILURE
+        
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False), flush=True)
+            continue
+        
+        timing = report['timing_ms']
+        interval = report['interval_ms']
+        position = report['position_px']
+        print(f"速度 {report['speed']}x（{report['mode']}，{report['backend']}）："
+              f"用时 {report['duration']:.3f} 秒，{report['events_per_second']:.0f} 事件/秒")
+        print(f"  事件：期望 {report['expected']}，实际 {report['observed']}，对齐 {report['matched']}，"
+              f"缺失 {report['missing']}，多余 {report['extra']}")
+        for name in ('missing', 'extra'):
+            for example in report[f'{name}_examples']:
+                print(f"    {'缺失' if name == 'missing' else '多余'} {example}")
+        print(f"  时间误差（毫秒）：p50 {timing['p50']:.3f}，p99 {timing['p99']:.3f}，"
+              f"最大 {timing['max']:.3f}，平均 {timing['mean']:+.3f}")
+        print(f"  间隔误差（毫秒）：p50 {interval['p50']:.3f}，p99 {interval['p99']:.3f}，"
+              f"最大 {interval['max']:.3f}")
+        print(f"  位置误差（像素）：p99 {position['p99']:.1f}，最大 {position['max']:.1f}，"
+              f"超出容差 {position['exceeded']}")
+        if report['injection_errors']:
+            print(f"  注入失败 {report['injection_errors']} 次")
+        if report['error']:
+            print(f"  回放失败: {report['error']}")
+    return status
+
+
+def parse_rate(text):
+    """
+    解析变速区间参数 START:END:RATE
+    """
+    try:
+        start, end, rate = (float(part) for part in text.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"变速区间格式应为 START:END:RATE: {text}")
+    return start, end, rate
+
+
+def parse_param(text):
+    """
+    解析组合文档参数 NAME=VALUE
+    """
+    name, sep, value = text.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"参数格式应为 NAME=VALUE: {text}")
+    return name, value
+
+
+def cmd_jobs(args):
+    """
+    管理和运行任务队列
+    """
+    try:
+        queue = JobQueue(args.queue)
+        if args.jobs_command == 'add':
+            for filename in args.inputs:
+                _close_macro(open_macro(filename))  # 先检查文件能否打开
+                job = queue.add(filename, speed=args.speed, repeat=args.repeat,
+                                priority=args.priority, trigger=args.at)
+                print(f"已加入任务 {job.id}: {job.path}", file=sys.stderr)
+            return EXIT_OK
+    except (JobError, OSError, ValueError) as e:
+        print(f"任务队列错误: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+    
+    if args.jobs_command == 'list':
+        for job in queue.list():
+            if args.json:
+                print(json.dumps(job.to_dict(), ensure_ascii=False))
+                continue
+            when = '到期即运行'
+            if job.next_run is not None:
+                when = time.strftime('%Y-%m-%d %H:%M', time.localtime(job.next_run))
+            trigger = f" [{job.trigger}]" if job.trigger else ''
+            line = (f"{job.id:>4} {job.state:<8} 优先级 {job.priority:<3} {when}{trigger} "
+                    f"{job.path}（{job.speed}x × {job.repeat}，已运行 {job.runs} 次）")
+            if job.last_error:
+                line += f" 上次错误: {job.last_error}"
+            print(line)
+        return EXIT_OK
+    
+    if args.jobs_command == 'remove':
+        missing = [job_id for job_id in args.ids if not queue.remove(job_id)]
+        for job_id in missing:
+            print(f"任务 {job_id} 不存在", file=sys.stderr)
+        return EXIT_FAILURE if missing else EXIT_OK
+    
+    if args.jobs_command == 'clear':
+        print(f"已删除 {queue.clear_finished()} 个已结束的任务", file=sys.stderr)
+        return EXIT_OK
+    
+    # run
+    runner = JobRunner(queue, backend=create_backend(args.backend))
+    failed = []
+    if args.verbose:
+        runner.job_started.connect(
+            lambda job, player: print(
+                f"开始任务 {job.id}: {job.path}（预计 {player.get_projected_duration() * job.repeat:.1f} 秒）",
+                file=sys.stderr
+            )
+        )
+    
+    def on_finished(job):
+        if job.last_error:
+            failed.append(job)
+            print(f"任务 {job.id} 失败: {job.last_error}", file=sys.stderr)
+        elif args.verbose:
+            print(f"任务 {job.id} 结束", file=sys.stderr)
+    
+    runner.job_finished.connect(on_finished)
+    try:
+        runner.run(until_idle=args.until_idle)
+    except KeyboardInterrupt:
+        runner.stop()
+        print("任务队列已停止", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    finally:
+        runner.close()
+    return EXIT_FAILURE if failed else EXIT_OK
+
+
+def build_parser():
+    """
+    创建命令行参数解析器
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m app',
+        description='自动化工具命令行：录制、回放、转换和查看宏文件'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    record_parser = subparsers.add_parser('record', help='录制动作')
+    record_parser.add_argument('output', help='输出文件（.amc 或 .json）')
+    record_parser.add_argument('--duration', type=float, default=0, help='录制时长（秒），默认直到 Ctrl+C')
+    record_parser.add_argument('--simplify', action='store_true', help='录制时简化鼠标轨迹')
+    record_parser.add_argument('--journal', action='store_true', help='边录制边写入输出文件（仅 .amc）')
+    record_parser.add_argument('--format', choices=FILE_FORMATS, help='输出格式，默认按扩展名')
+    record_parser.add_argument('--anchors', action='store_true', help='点击时记录图像锚点')
+    record_parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND, help='输入后端')
+    record_parser.set_defaults(func=cmd_record)
+    
+    play_parser = subparsers.add_parser('play', help='回放宏文件')
+    play_parser.add_argument('input', help='宏文件（.amc、.json 或组合文档 .amx）')
+    play_parser.add_argument('--speed', type=float, default=1.0, help='播放速度（0.25 - 4.0）')
+    play_parser.add_argument('--repeat', type=int, default=1, help='重复次数')
+    play_parser.add_argument('--delay', type=float, default=0, help='开始前等待的秒数')
+    play_parser.add_argument('--max-gap', type=float, help='相邻动作间隔的上限（秒）')
+    play_parser.add_argument('--fast-moves', action='store_true', help='纯鼠标移动不再等待')
+    play_parser.add_argument('--move-interval', type=float, default=0.0, help='--fast-moves 时鼠标移动的间隔（秒）')
+    play_parser.add_argument('--rate', type=parse_rate, action='append', default=[],
+                             metavar='START:END:RATE', help='录制时间 START 到 END 秒之间按 RATE 倍速回放，可重复')
+    play_parser.add_argument('--start-at', type=float, default=0.0,
+                             help='第一次重复从该回放时间（秒，按 --speed 计算）开始')
+    play_parser.add_argument('--start-index', type=int, help='第一次重复从该动作下标开始')
+    play_parser.add_argument('--fast-text', type=float, nargs='?', const=0.0, metavar='CPS',
+                             help='连续输入的字符按每秒 CPS 个字符快速输入，不指定时尽快输入')
+    play_parser.add_argument('--param', type=parse_param, action='append', default=[], metavar='NAME=VALUE',
+                             help='组合文档（.amx）的参数，可重复')
+    play_parser.add_argument('--no-anchors', action='store_true', help='忽略图像锚点，按录制的坐标回放')
+    play_parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                             help='输入后端，xtest 在 Linux X11 下批量注入事件')
+    play_parser.add_argument('--progress', type=float, nargs='?', const=1.0, metavar='SECONDS',
+                             help='回放中每隔 SECONDS 秒（默认 1 秒）输出进度、吞吐量和延迟')
+    play_parser.add_argument('--stats', action='store_true', help='以 JSON 行输出每次重复的时间统计')
+    play_parser.add_argument('-v', '--verbose', action='store_true', help='显示重复进度')
+    play_parser.set_defaults(func=cmd_play)
+    
+    convert_parser = subparsers.add_parser('convert', help='转换宏文件格式')
+    convert_parser.add_argument('input', help='输入文件')
+    convert_parser.add_argument('output', help='输出文件')
+    convert_parser.add_argument('--format', choices=FILE_FORMATS, help='输出格式，默认按扩展名')
+    convert_parser.add_argument('--simplify', action='store_true', help='同时简化鼠标轨迹')
+    convert_parser.add_argument('--epsilon', type=float, default=1.5, help='轨迹简化容差（像素）')
+    convert_parser.add_argument('--fast-text', type=float, nargs='?', const=0.0, metavar='CPS',
+                                help='把连续输入的字符合并为文字输入步骤，按每秒 CPS 个字符输入，不指定时尽快输入')
+    convert_parser.set_defaults(func=cmd_convert)
+    
+    info_parser = subparsers.add_parser('info', help='显示宏文件统计信息')
+    info_parser.add_argument('inputs', nargs='+', help='宏文件')
+    info_parser.add_argument('--json', action='store_true', help='以 JSON 行输出')
+    info_parser.set_defaults(func=cmd_info)
+    
+    batch_parser = subparsers.add_parser('batch', help='并行批量处理目录下的宏文件')
+    batch_parser.add_argument('operation', choices=BATCH_OPERATIONS, help='validate 检查，stats 统计，convert 转换')
+    batch_parser.add_argument('directory', help='输入目录')
+    batch_parser.add_argument('-o', '--output-dir', help='convert 的输出目录')
+    batch_parser.add_argument('--format', choices=FILE_FORMATS, default='amc', help='convert 的输出格式')
+    batch_parser.add_argument('--simplify', action='store_true', help='convert 时简化鼠标轨迹')
+    batch_parser.add_argument('--epsilon', type=float, default=1.5, help='轨迹简化容差（像素）')
+    batch_parser.add_argument('-j', '--jobs', type=int, help='工作进程数，默认等于 CPU 核数')
+    batch_parser.add_argument('--manifest', help='清单文件，convert 默认写在输出目录中')
+    batch_parser.add_argument('--resume', action='store_true', help='跳过清单中已成功且未修改的文件')
+    batch_parser.add_argument('--pattern', action='append', help='文件名匹配模式，可重复，默认 *.json 和 *.amc')
+    batch_parser.add_argument('--no-recursive', action='store_true', help='不处理子目录')
+    batch_parser.add_argument('--json', action='store_true', help='以 JSON 行输出每个文件的结果')
+    batch_parser.add_argument('-v', '--verbose', action='store_true', help='显示成功的文件')
+    batch_parser.set_defaults(func=cmd_batch)
+    
+    bench_parser = subparsers.add_parser('bench', help='运行录制和回放的性能基准')
+    bench_parser.add_argument('-o', '--output', help='结果 JSON 文件，默认输出到标准输出')
+    bench_parser.add_argument('--quick', action='store_true', help='使用较少的事件数快速运行')
+    bench_parser.add_argument('--events', type=int, help='大宏文件的事件数，默认 1000000')
+    bench_parser.add_argument('--sample', default='act.json', help='与录制文件规模相同的样本宏文件')
+    bench_parser.add_argument('--repeat', type=int, default=3, help='每项吞吐量测量的重复次数，取最快的一次')
+    bench_parser.add_argument('--backend', choices=sorted(BACKENDS), default='memory',
+                              help='回放分发基准使用的输入后端，非 memory 时会真实移动鼠标')
+    bench_parser.add_argument('--only', action='append', help='只运行指定的基准，可重复')
+    bench_parser.add_argument('--compare', help='与之前的结果 JSON 比较，有指标退化时返回非零退出码')
+    bench_parser.add_argument('--threshold', type=float, default=0.10, help='认为是退化的相对变化')
+    bench_parser.set_defaults(func=cmd_bench)
+    
+    jobs_parser = subparsers.add_parser('jobs', help='任务队列：按优先级和定时触发依次回放多个宏')
+    jobs_parser.add_argument('--queue', default=DEFAULT_QUEUE_FILE, help='队列文件')
+    jobs_subparsers = jobs_parser.add_subparsers(dest='jobs_command', required=True)
+    jobs_add_parser = jobs_subparsers.add_parser('add', help='加入任务')
+    jobs_add_parser.add_argument('inputs', nargs='+', help='宏文件，多个文件按顺序加入')
+    jobs_add_parser.add_argument('--speed', type=float, default=1.0, help='播放速度（0.25 - 4.0）')
+    jobs_add_parser.add_argument('--repeat', type=int, default=1, help='重复次数（不限于界面的 999 次）')
+    jobs_add_parser.add_argument('--priority', type=int, default=0, help='优先级，同时到期时大的先执行')
+    jobs_add_parser.add_argument('--at', metavar='TRIGGER',
+                                 help='触发时间：HH:MM（每天）、cron 表达式 "分 时 日 月 星期" 或 @daily 等；不指定时尽快执行一次')
+    jobs_list_parser = jobs_subparsers.add_parser('list', help='列出任务')
+    jobs_list_parser.add_argument('--json', action='store_true', help='以 JSON 行输出')
+    jobs_remove_parser = jobs_subparsers.add_parser('remove', help='删除任务')
+    jobs_remove_parser.add_argument('ids', type=int, nargs='+', help='任务编号')
+    jobs_subparsers.add_parser('clear', help='删除已完成和失败的任务')
+    jobs_run_parser = jobs_subparsers.add_parser('run', help='依次运行到期的任务，等待之后的定时任务')
+    jobs_run_parser.add_argument('--until-idle', action='store_true', help='没有到期的任务时退出，不等待定时任务')
+    jobs_run_parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                                 help='输入后端')
+    jobs_run_parser.add_argument('-v', '--verbose', action='store_true', help='显示任务开始和结束')
+    jobs_parser.set_defaults(func=cmd_jobs)
+    
+    verify_parser = subparsers.add_parser('verify', help='回放并核对实际注入的事件')
+    verify_parser.add_argument('input', help='宏文件')
+    verify_parser.add_argument('--speed', type=float, action='append', help='播放速度，可重复，每个速度回放一次')
+    verify_parser.add_argument('--mode', choices=('memory', 'listener'), default='memory',
+                               help='memory 读取内存后端记录的事件，listener 用录制监听器记录')
+    verify_parser.add_argument('--backend', choices=sorted(BACKENDS),
+                               help='listener 方式使用的输入后端，默认 pynput')
+    verify_parser.add_argument('--tolerance', type=float, default=0, help='允许的位置误差（像素）')
+    verify_parser.add_argument('--delay', type=float, default=0, help='每次回放前等待的秒数')
+    verify_parser.add_argument('--json', action='store_true', help='以 JSON 行输出每个速度的报告')
+    verify_parser.set_defaults(func=cmd_verify)
+    
+    return parser
+
+
+def main(argv=None):
+    """
+    命令行入口，返回退出码
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return EXIT_FAILURE
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+宏组合模块
+
+组合文档（.amx）是一个 JSON 对象，用步骤描述一次回放，而不复制事件数据：
+    
+    {
+        "version": 1,
+        "params": {"name": "world"},
+        "steps": [
+            {"macro": "library/login.amc", "params": {"user": "{name}"}},
+            {"loop": 3, "steps": [
+                {"type_text": "Hello {name}\\n", "interval": 0.05},
+                {"delay": 0.5}
+            ]},
+            {"macro": "library/logout.amx"}
+        ]
+    }
+
+步骤类型：
+- macro：调用另一个宏文件（.amc、.json 或 .amx），路径相对于当前文档，
+  params 为传给被调用文档的参数
+- loop：把 steps 重复指定次数
+- type_text：按 interval（秒）的间隔逐个输入字符，interval 为 0 时尽快输入，
+  文本中的 {参数名} 在打开文档时替换，生成一个文字输入步骤（见 app/text.py）
+- delay：等待指定的秒数，位于文档或循环末尾时推迟之后的步骤
+
+文档的 params 是参数的默认值，调用方传入的参数覆盖默认值；
+参数值、循环次数和文本都可以引用当前文档的参数。
+
+组合在打开时只解析文档，不展开循环，也不读入被引用的二进制宏文件：
+- 二进制宏文件（.amc）打开时只读取块索引得到动作数和时长，回放到该处时才映射文件、逐块解码；
+  JSON 宏文件只能整体解析，打开时读入内存
+- 同一个宏文件无论被引用多少次、在多少层嵌套中出现，都只映射或保存一份
+- 回放时 iter_buffers() 按步骤逐块生成动作，只复制当前块用到的动作并平移时间戳；
+  块的起始下标固定为 KEYFRAME_INTERVAL 的整数倍，从中间开始时整段跳过之前的步骤和循环
+"""
+
+import json
+import os
+from array import array
+
+from app.action_buffer import ActionBuffer, NO_STRING
+from app.keyframes import KEYFRAME_INTERVAL
+from app.macro_format import MacroFormatError, MappedMacro, is_binary_filename, load_macro
+from app.text import text_duration, text_keys
+
+
+# 组合文档的扩展名
+COMPOSITION_EXTENSION = '.amx'
+
+# 组合文档格式版本
+COMPOSITION_VERSION = 1
+
+# 宏调用的最大嵌套层数
+MAX_DEPTH = 32
+
+# type_text 步骤默认的字符间隔（秒）
+DEFAULT_TYPE_INTERVAL = 0.05
+
+
+class CompositionError(MacroFormatError):
+    """
+    组合文档错误
+    """
+
+
+def is_composition_filename(filename):
+    """
+    根据扩展名判断是否为组合文档
+    """
+    return os.path.splitext(filename)[1].lower() == COMPOSITION_EXTENSION
+
+
+class _MappedSource:
+    """
+    被引用的二进制宏文件
+    
+    打开文档时只读取块索引得到动作数和时长，随即关闭；回放第一次用到时才重新映射
+    """
+    
+    __slots__ = ('path', 'count', 'last_time', 'macro')
+    
+    def __init__(self, path):
+        self.path = path
+        with MappedMacro(path) as macro:
+            self.count = len(macro)
+            self.last_time = macro.duration()
+        self.macro = None
+    
+    def __len__(self):
+        return self.count
+    
+    def duration(self):
+        return self.last_time
+    
+    def iter_ranges(self, begin, end):
+        """
+        产生覆盖第 begin 到 end 个动作的 (解码后的块, 块内起始下标, 块内结束下标)
+        """
+        if self.macro is None:
+            macro = MappedMacro(self.path)
+            if len(macro) != self.count:
+                macro.close()
+                raise CompositionError(f"宏文件在打开组合文档后被修改: {self.path}")
+            self.macro = macro
+        for base, buffer in self.macro.iter_buffers(begin):
+            if base >= end:
+                return
+            yield buffer, max(0, begin - base), min(len(buffer), end - base)
+    
+    def close(self):
+        if self.macro is not None:
+            self.macro.close()
+            self.macro = None
+
+
+class _Segment:
+    """
+    引用一段共享动作的步骤，来源为内存中的 ActionBuffer 或 _MappedSource，
+    时长默认为最后一个动作的时间
+    """
+    
+    __slots__ = ('source', 'count', 'duration')
+    
+    def __init__(self, source, duration=None):
+        self.source = source
+        self.count = len(source)
+        self.duration = source.duration() if duration is None else duration
+    
+    def iter_ranges(self, begin, end):
+        """
+        产生覆盖第 begin 到 end 个动作的 (ActionBuffer, 起始下标, 结束下标)
+        """
+        if isinstance(self.source, ActionBuffer):
+            yield self.source, begin, end
+        else:
+            yield from self.source.iter_ranges(begin, end)
+
+
+class _Delay:
+    """
+    只占用时间、不产生动作的步骤
+    """
+    
+    __slots__ = ('count', 'duration')
+    
+    def __init__(self, seconds):
+        self.count = 0
+        self.duration = seconds
+
+
+class _Sequence:
+    """
+    依次执行的步骤，每个步骤在前一个步骤结束后开始；
+    步骤的时长为宏的最后一个动作的时间、文字输入的 text_duration() 或等待的秒数
+    """
+    
+    __slots__ = ('steps', 'count', 'duration')
+    
+    def __init__(self, steps):
+        self.steps = steps
+        self.count = sum(step.count for step in steps)
+        self.duration = sum(step.duration for step in steps)
+
+
+class _Loop:
+    """
+    重复执行 times 次的步骤
+    """
+    
+    __slots__ = ('body', 'times', 'count', 'duration')
+    
+    def __init__(self, body, times):
+        self.body = body
+        self.times = times
+        self.count = body.count * times
+        self.duration = body.duration * times
+
+
+def _walk(node, start, offset):
+    """
+    从节点的第 start 个动作开始，产生 (_Segment, 起始下标, 结束下标, 时间偏移)
+    
+    start 之前的步骤和完整的循环按动作数整体跳过，不逐个展开
+    """
+    if isinstance(node, _Segment):
+        if start < node.count:
+            yield node, start, node.count, offset
+    elif isinstance(node, _Sequence):
+        for step in node.steps:
+            if start < step.count:
+                yield from _walk(step, start, offset)
+                start = 0
+            else:
+                start -= step.count
+            offset += step.duration
+    elif isinstance(node, _Loop):
+        body = node.body
+        if not body.count:
+            return
+        skipped, start = divmod(start, body.count)
+        offset += skipped * body.duration
+        for _ in range(skipped, node.times):
+            yield from _walk(body, start, offset)
+            start = 0
+            offset += body.duration
+
+
+def _append_range(chunk, buffer, begin, end, offset):
+    """
+    把 buffer[begin:end] 追加到 chunk，时间戳加上 offset
+    
+    两个缓冲区共享同一个字符串表时字符串编号直接复制，否则按字符串转换编号
+    """
+    if buffer.strings is chunk.strings:
+        chunk.string_ids.extend(buffer.string_ids[begin:end])
+    else:
+        mapping = [chunk.intern(text) for text in buffer.strings]
+        chunk.string_ids.extend(array('I', (
+            NO_STRING if string_id == NO_STRING else mapping[string_id]
+            for string_id in buffer.string_ids[begin:end]
+        )))
+    for column in ('types', 'flags', 'x', 'y', 'dx', 'dy'):
+        getattr(chunk, column).extend(getattr(buffer, column)[begin:end])
+    if offset:
+        chunk.timestamps.extend(array('d', (t + offset for t in buffer.timestamps[begin:end])))
+    else:
+        chunk.timestamps.extend(buffer.timestamps[begin:end])
+
+
+class Composition:
+    """
+    打开的组合文档
+    
+    与 MappedMacro 一样按块提供动作（iter_buffers），可以直接交给 Player 回放
+    """
+    
+    def __init__(self, filename, params=None):
+        """
+        解析文档，读取被引用的宏文件的动作数和时长
+        
+        params 覆盖文档中参数的默认值
+        """
+        self.filename = filename
+        self.strings = []
+        self.string_index = {}
+        self.segments = {}  # 宏文件的真实路径 -> 共享的 ActionBuffer 或 _MappedSource
+        self.documents = {}  # 组合文档的真实路径 -> 解析后的 JSON
+        self.texts = {}  # (文本, 间隔) -> 共享的 ActionBuffer
+        self.root = self._load_document(filename, params or {}, [])
+    
+    def __len__(self):
+        return self.root.count
+    
+    def __iter__(self):
+        for _, buffer in self.iter_buffers():
+            yield from buffer
+    
+    def __repr__(self):
+        return (f"Composition({self.filename!r}, {self.root.count} actions, "
+                f"{len(self.segments)} macros)")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        """
+        关闭回放中映射的宏文件，之后再次回放时重新映射
+        """
+        for source in self.segments.values():
+            if isinstance(source, _MappedSource):
+                source.close()
+    
+    def duration(self):
+        """
+        获取总时长（秒），包括文档末尾的等待
+        
+        与循环和宏调用中每个步骤占用的时长一致：末尾的 delay 同样推迟下一次循环或调用方的下一个步骤
+        """
+        return self.root.duration
+    
+    def iter_buffers(self, start_index=0):
+        """
+        从包含 start_index 的块开始逐块生成动作，块的起始下标为 KEYFRAME_INTERVAL 的整数倍
+        
+        产生 (块起始动作下标, ActionBuffer)，各块与组合共享字符串表
+        """
+        base = max(0, start_index) // KEYFRAME_INTERVAL * KEYFRAME_INTERVAL
+        strings = (self.strings, self.string_index)
+        chunk = ActionBuffer(strings)
+        for segment, first, last, offset in _walk(self.root, base, 0.0):
+            for buffer, begin, end in segment.iter_ranges(first, last):
+                while begin < end:
+                    take = min(end - begin, KEYFRAME_INTERVAL - len(chunk))
+                    _append_range(chunk, buffer, begin, begin + take, offset)
+                    begin += take
+                    if len(chunk) == KEYFRAME_INTERVAL:
+                        yield base, chunk
+                        base += KEYFRAME_INTERVAL
+                        chunk = ActionBuffer(strings)
+        if len(chunk):
+            yield base, chunk
+    
+    def read_all(self):
+        """
+        展开全部步骤，合并为一个 ActionBuffer
+        """
+        result = ActionBuffer((self.strings, self.string_index))
+        for _, buffer in self.iter_buffers():
+            result.extend(buffer)
+        return result
+    
+    def _share(self, actions):
+        """
+        把动作复制为使用组合字符串表的 ActionBuffer
+        """
+        buffer = ActionBuffer((self.strings, self.string_index))
+        buffer.extend(actions)
+        return buffer
+    
+    def _load_document(self, filename, params, stack):
+        """
+        解析组合文档为步骤树，stack 为正在展开的文档路径，用于发现循环引用
+        """
+        path = os.path.realpath(filename)
+        if path in stack:
+            raise CompositionError(f"组合文档循环引用: {filename}")
+        if len(stack) >= MAX_DEPTH:
+            raise CompositionError(f"宏调用嵌套超过 {MAX_DEPTH} 层: {filename}")
+        
+        document = self.documents.get(path)
+        if document is None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    document = json.load(f)
+            except ValueError as e:
+                raise CompositionError(f"{filename}: 不是有效的 JSON: {e}") from e
+            if not isinstance(document, dict) or not isinstance(document.get('steps'), list):
+                raise CompositionError(f"{filename}: 组合文档必须是包含 steps 列表的对象")
+            version = document.get('version', COMPOSITION_VERSION)
+            if version != COMPOSITION_VERSION:
+                raise CompositionError(f"{filename}: 不支持的组合文档版本: {version}")
+            self.documents[path] = document
+        
+        values = {**document.get('params', {}), **params}
+        directory = os.path.dirname(path)
+        stack = stack + [path]
+        return self._build_steps(document['steps'], values, directory, stack, filename)
+    
+    def _build_steps(self, steps, params, directory, stack, filename):
+        """
+        把步骤列表转换为 _Sequence
+        """
+        nodes = []
+        for step in steps:
+            if not isinstance(step, dict):
+                raise CompositionError(f"{filename}: 步骤必须是对象: {step!r}")
+            if 'macro' in step:
+                nodes.append(self._build_call(step, params, directory, stack, filename))
+            elif 'loop' in step:
+                times = self._format_count(step['loop'], params, filename)
+                body = self._build_steps(step.get('steps', []), params, directory, stack, filename)
+                nodes.append(_Loop(body, times))
+            elif 'type_text' in step:
+                text = self._format(step['type_text'], params, filename)
+                interval = float(step.get('interval', DEFAULT_TYPE_INTERVAL))
+                if interval < 0:
+                    raise CompositionError(f"{filename}: 输入间隔不能为负数: {interval}")
+                try:
+                    text_keys(text)
+                except ValueError as e:
+                    raise CompositionError(f"{filename}: {e}") from e
+                buffer = self.texts.get((text, interval))
+                if buffer is None:
+                    buffer = self.texts[text, interval] = ActionBuffer((self.strings, self.string_index))
+                    buffer.append_text(text, interval, 0.0)
+                nodes.append(_Segment(buffer, text_duration(len(text), interval)))
+            elif 'delay' in step:
+                seconds = float(step['delay'])
+                if seconds < 0:
+                    raise CompositionError(f"{filename}: 等待时间不能为负数: {seconds}")
+                nodes.append(_Delay(seconds))
+            else:
+                raise CompositionError(f"{filename}: 未知的步骤: {step!r}")
+        return _Sequence(nodes)
+    
+    def _build_call(self, step, params, directory, stack, filename):
+        """
+        解析宏调用步骤：组合文档递归展开，其他宏文件只打开一次并共享
+        """
+        target = os.path.join(directory, self._format(step['macro'], params, filename))
+        if is_composition_filename(target):
+            call_params = {
+                name: self._format(value, params, filename) if isinstance(value, str) else value
+                for name, value in step.get('params', {}).items()
+            }
+            return self._load_document(target, call_params, stack)
+        
+        path = os.path.realpath(target)
+        source = self.segments.get(path)
+        if source is None:
+            try:
+                if is_binary_filename(path):
+                    source = _MappedSource(path)
+                else:
+                    source = self._share(load_macro(path))
+            except OSError as e:
+                raise CompositionError(f"{filename}: 无法加载 {step['macro']}: {e}") from e
+            self.segments[path] = source
+        return _Segment(source)
+    
+    @staticmethod
+    def _format(text, params, filename):
+        """
+        替换文本中的 {参数名}
+        """
+        try:
+            return str(text).format_map(params)
+        except KeyError as e:
+            raise CompositionError(f"{filename}: 缺少参数 {e.args[0]}") from e
+        except (ValueError, IndexError) as e:
+            raise CompositionError(f"{filename}: 无效的参数引用 {text!r}: {e}") from e
+    
+    @classmethod
+    def _format_count(cls, value, params, filename):
+        """
+        解析循环次数，可以是整数或引用参数的字符串
+        """
+        if isinstance(value, str):
+            value = cls._format(value, params, filename)
+        try:
+            times = int(value)
+        except (TypeError, ValueError) as e:
+            raise CompositionError(f"{filename}: 无效的循环次数: {value!r}") from e
+        if times < 0:
+            raise CompositionError(f"{filename}: 循环次数不能为负数: {times}")
+        return times
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+输入后端模块
+
+Player 和 Recorder 不直接调用 pynput，而是通过输入后端注入和监听鼠标键盘事件：
+- pynput（PynputBackend）：默认后端，使用 pynput 的 Controller 和 Listener
+- xtest（XTestBackend）：Linux X11 下直接通过 XTEST 扩展注入事件，依赖 python-xlib。
+  请求先缓存在客户端，回放器在每批到期的动作执行完、进入等待前调用一次 flush() 统一发送，
+  不像 pynput 那样每个事件都与 X 服务器同步往返一次，回放密集的鼠标轨迹时开销小得多。
+  录制仍使用 pynput 的监听器
+- memory（FakeBackend）：内存后端，不接触真实设备，记录所有注入的事件，
+  并可以通过 emit_* 方法模拟用户输入，用于测试、基准测试和无图形界面的 Linux
+
+后端需要提供的接口见 InputBackend，用 create_backend(名称) 在运行时选择后端，
+register_backend() 可以注册其他后端。
+"""
+
+import time
+from abc import ABC, abstractmethod
+
+try:
+    from Xlib import X, XK
+    from Xlib.display import Display
+    from Xlib.ext import xtest
+except ImportError:
+    X = None
+    XK = None
+    Display = None
+    xtest = None
+
+
+# 默认的输入后端
+DEFAULT_BACKEND = 'pynput'
+
+
+class InputBackendError(Exception):
+    """
+    输入后端不可用
+    """
+
+
+class InputBackend(ABC):
+    """
+    输入后端接口
+    
+    按键和鼠标按钮以录制时的字符串保存（如 'a'、'Key.esc'、'Button.left'），
+    回放前由 resolve_key/resolve_button 解析为后端使用的对象，无法解析时返回 None。
+    flush() 和 close() 默认什么都不做，其他方法子类必须实现。
+    """
+    
+    name = None
+    
+    @abstractmethod
+    def resolve_key(self, key_str):
+        """
+        把录制的按键字符串解析为按键对象
+        """
+    
+    @abstractmethod
+    def resolve_button(self, button_str):
+        """
+        把录制的鼠标按钮字符串解析为按钮对象
+        """
+    
+    @abstractmethod
+    def move(self, x, y):
+        """
+        移动鼠标到 (x, y)
+        """
+    
+    @abstractmethod
+    def press_button(self, button):
+        """
+        按下鼠标按钮
+        """
+    
+    @abstractmethod
+    def release_button(self, button):
+        """
+        释放鼠标按钮
+        """
+    
+    @abstractmethod
+    def scroll(self, dx, dy):
+        """
+        滚动鼠标滚轮
+        """
+    
+    @abstractmethod
+    def press_key(self, key):
+        """
+        按下按键
+        """
+    
+    @abstractmethod
+    def release_key(self, key):
+        """
+        释放按键
+        """
+    
+    def flush(self):
+        """
+        发送缓存的事件；逐个立即注入的后端不需要实现
+        """
+    
+    def close(self):
+        """
+        释放后端占用的资源
+        """
+    
+    @abstractmethod
+    def create_listeners(self, on_move, on_click, on_scroll, on_press, on_release):
+        """
+        创建监听器，返回具有 start()/stop() 的监听器列表
+        
+        回调参数与 pynput 相同：on_move(x, y)、on_click(x, y, button, pressed)、
+        on_scroll(x, y, dx, dy)、on_press(key)、on_release(key)
+        """
+
+
+class HeldInput:
+    """
+    记录通过后端按下、尚未释放的按键和鼠标按钮（解析后的对象，按按下的顺序）
+    
+    回放被停止、暂停、跳转或因异常中断时用 release_all() 全部释放，
+    避免按键或按钮在系统中一直处于按下状态
+    """
+    
+    __slots__ = ('keys', 'buttons')
+    
+    def __init__(self):
+        """
+        初始化为没有按住任何输入
+        """
+        self.keys = {}
+        self.buttons = {}
+    
+    def __bool__(self):
+        return bool(self.keys or self.buttons)
+    
+    def __repr__(self):
+        return f"HeldInput(keys={list(self.keys)}, buttons={list(self.buttons)})"
+    
+    def snapshot(self):
+        """
+        返回当前按住的 (按键列表, 按钮列表)
+        """
+        return list(self.keys), list(self.buttons)
+    
+    def release_all(self, backend):
+        """
+        按与按下相反的顺序释放所有按住的按键和按钮并发送，返回释放失败的次数
+        
+        释放失败的输入同样不再记录，避免之后反复尝试
+        """
+        errors = 0
+        for key in reversed(list(self.keys)):
+            try:
+                backend.release_key(key)
+            except Exception:
+                errors += 1
+        for button in reversed(list(self.buttons)):
+            try:
+                backend.release_button(button)
+            except Exception:
+                errors += 1
+        self.keys.clear()
+        self.buttons.clear()
+        backend.flush()
+        return errors
+
+
+def create_pynput_listeners(on_move, on_click, on_scroll, on_press, on_release):
+    """
+    创建 pynput 的鼠标和键盘监听器
+    """
+    from pynput import mouse, keyboard
+    return [
+        mouse.Listener(on_move=on_move, on_click=on_click, on_scroll=on_scroll),
+        keyboard.Listener(on_press=on_press, on_release=on_release)
+    ]
+
+
+class PynputBackend(InputBackend):
+    """
+    使用 pynput 的输入后端
+    """
+    
+    name = 'pynput'
+    
+    def __init__(self):
+        """
+        初始化控制器和按键映射
+        """
+        from pynput import mouse, keyboard
+        self.mouse_controller = mouse.Controller()
+        self.keyboard_controller = keyboard.Controller()
+        
+        # 录制的特殊按键字符串（如 'Key.esc'）到按键对象的映射，包含平台别名
+        self.special_keys = {f'Key.{name}': key for name, key in keyboard.Key.__members__.items()}
+        # 录制的鼠标按钮字符串（如 'Button.left'）到按钮对象的映射
+        self.buttons = {f'Button.{name}': button for name, button in mouse.Button.__members__.items()}
+    
+    def resolve_key(self, key_str):
+        if key_str is None:
+            return None
+        # 可打印字符直接回放
+        if len(key_str) == 1 and key_str.isprintable():
+            return key_str
+        return self.special_keys.get(key_str)
+    
+    def resolve_button(self, button_str):
+        if button_str is None:
+            return None
+        return self.buttons.get(button_str)
+    
+    def move(self, x, y):
+        self.mouse_controller.position = (x, y)
+    
+    def press_button(self, button):
+        self.mouse_controller.press(button)
+    
+    def release_button(self, button):
+        self.mouse_controller.release(button)
+    
+    def scroll(self, dx, dy):
+        self.mouse_controller.scroll(dx, dy)
+    
+    def press_key(self, key):
+        self.keyboard_controller.press(key)
+    
+    def release_key(self, key):
+        self.keyboard_controller.release(key)
+    
+    def create_listeners(self, on_move, on_click, on_scroll, on_press, on_release):
+        return create_pynput_listeners(on_move, on_click, on_scroll, on_press, on_release)
+
+
+# 录制的鼠标按钮字符串到 X 按钮编号的映射，x1/x2 为 Windows 上录制的侧键
+X_BUTTONS = {
+    'Button.left': 1,
+    'Button.middle': 2,
+    'Button.right': 3,
+    'Button.scroll_up': 4,
+    'Button.scroll_down': 5,
+    'Button.scroll_left': 6,
+    'Button.scroll_right': 7,
+    'Button.x1': 8,
+    'Button.x2': 9,
+}
+X_BUTTONS.update({f'Button.button{number}': number for number in range(8, 31)})
+
+# 录制的特殊按键名（pynput 的 Key 成员名）到 X keysym 名称的映射
+X_KEYSYM_NAMES = {
+    'alt': 'Alt_L',
+    'alt_l': 'Alt_L',
+    'alt_r': 'Alt_R',
+    'alt_gr': 'ISO_Level3_Shift',
+    'backspace': 'BackSpace',
+    'caps_lock': 'Caps_Lock',
+    'cmd': 'Super_L',
+    'cmd_l': 'Super_L',
+    'cmd_r': 'Super_R',
+    'ctrl': 'Control_L',
+    'ctrl_l': 'Control_L',
+    'ctrl_r': 'Control_R',
+    'delete': 'Delete',
+    'down': 'Down',
+    'end': 'End',
+    'enter': 'Return',
+    'esc': 'Escape',
+    'home': 'Home',
+    'insert': 'Insert',
+    'left': 'Left',
+    'menu': 'Menu',
+    'num_lock': 'Num_Lock',
+    'page_down': 'Page_Down',
+    'page_up': 'Page_Up',
+    'pause': 'Pause',
+    'print_screen': 'Print',
+    'right': 'Right',
+    'scroll_lock': 'Scroll_Lock',
+    'shift': 'Shift_L',
+    'shift_l': 'Shift_L',
+    'shift_r': 'Shift_R',
+    'space': 'space',
+    'tab': 'Tab',
+    'up': 'Up',
+    'media_play_pause': 'XF86_AudioPlay',
+    'media_volume_mute': 'XF86_AudioMute',
+    'media_volume_down': 'XF86_AudioLowerVolume',
+    'media_volume_up': 'XF86_AudioRaiseVolume',
+    'media_previous': 'XF86_AudioPrev',
+    'media_next': 'XF86_AudioNext',
+}
+X_KEYSYM_NAMES.update({f'f{number}': f'F{number}' for number in range(1, 25)})
+
+
+class XTestBackend(InputBackend):
+    """
+    通过 X11 的 XTEST 扩展注入事件
+    
+    注入的请求缓存在 Xlib 的发送缓冲区中，flush() 时一次写出。
+    按键解析为 (keycode, 是否需要 Shift)，需要 Shift 的字符（如大写字母）在按下时临时按住 Shift。
+    临时的 Shift 按引用计数管理：宏自己按住 Shift 时不再注入，多个需要 Shift 的按键重叠时
+    最后一个释放后才松开，宏按住的 Shift 不会被临时的 Shift 提前松开。
+    X11 的滚轮只能按整格滚动，带小数的滚动量累积到满一格时才注入
+    """
+    
+    name = 'xtest'
+    
+    def __init__(self, display_name=None):
+        """
+        连接 X 服务器，display_name 为 None 时使用 DISPLAY 环境变量
+        """
+        if Display is None:
+            raise InputBackendError("xtest 后端需要 python-xlib")
+        try:
+            self.display = Display(display_name)
+        except Exception as e:
+            raise InputBackendError(f"无法连接 X 服务器: {e}") from e
+        if not self.display.has_extension('XTEST'):
+            self.display.close()
+            raise InputBackendError("X 服务器不支持 XTEST 扩展")
+        # AltGr（ISO_Level3_Shift）和多媒体键的 keysym 不在默认加载的分组中
+        XK.load_keysym_group('xkb')
+        XK.load_keysym_group('xf86')
+        self.shift_keycode = self.display.keysym_to_keycode(XK.XK_Shift_L)
+        self.shift_keycodes = {self.shift_keycode, self.display.keysym_to_keycode(XK.XK_Shift_R)} - {0}
+        self.held_shifts = set()  # 宏按住的 Shift 键
+        self.shift_users = 0  # 按住中、需要 Shift 的按键数
+        self.shift_injected = False  # 是否为这些按键注入了 Shift_L 的按下
+        self.scroll_remainder = [0.0, 0.0]  # 尚未满一格的 (dx, dy) 滚动量
+    
+    def _keysym(self, key_str):
+        """
+        获取按键字符串对应的 keysym，未知时返回 0
+        """
+        if len(key_str) == 1:
+            code = ord(key_str)
+            # Latin-1 字符的 keysym 与码位相同，其他 Unicode 字符为 0x01000000 加码位
+            return code if 0x20 <= code <= 0xff else 0x01000000 | code
+        if key_str.startswith('Key.'):
+            name = X_KEYSYM_NAMES.get(key_str[4:])
+            if name is not None:
+                return XK.string_to_keysym(name)
+        return 0
+    
+    def resolve_key(self, key_str):
+        if key_str is None or (len(key_str) == 1 and not key_str.isprintable()):
+            return None
+        keysym = self._keysym(key_str)
+        if not keysym:
+            return None
+        # 优先使用不需要 Shift 的键位
+        shifted = None
+        for keycode, index in self.display.keysym_to_keycodes(keysym):
+            if index == 0:
+                return keycode, False
+            if index == 1 and shifted is None:
+                shifted = keycode, True
+        return shifted
+    
+    def resolve_button(self, button_str):
+        if button_str is None:
+            return None
+        return X_BUTTONS.get(button_str)
+    
+    def move(self, x, y):
+        xtest.fake_input(self.display, X.MotionNotify, x=int(x), y=int(y))
+    
+    def press_button(self, button):
+        xtest.fake_input(self.display, X.ButtonPress, button)
+    
+    def release_button(self, button):
+        xtest.fake_input(self.display, X.ButtonRelease, button)
+    
+    def scroll(self, dx, dy):
+        # X11 的滚轮是按钮 4-7，每一格为一次按下和释放
+        remainder = self.scroll_remainder
+        remainder[0] += dx
+        remainder[1] += dy
+        dx, dy = int(remainder[0]), int(remainder[1])
+        remainder[0] -= dx
+        remainder[1] -= dy
+        for button, steps in ((4 if dy > 0 else 5, abs(dy)), (7 if dx > 0 else 6, abs(dx))):
+            for _ in range(steps):
+                xtest.fake_input(self.display, X.ButtonPress, button)
+                xtest.fake_input(self.display, X.ButtonRelease, button)
+    
+    def press_key(self, key):
+        keycode, shift = key
+        if keycode in self.shift_keycodes:
+            already_down = keycode in self.held_shifts or (keycode == self.shift_keycode and self.shift_injected)
+            self.held_shifts.add(keycode)
+            if not already_down:
+                xtest.fake_input(self.display, X.KeyPress, keycode)
+            return
+        if shift:
+            if not self.shift_users and not self.held_shifts:
+                xtest.fake_input(self.display, X.KeyPress, self.shift_keycode)
+                self.shift_injected = True
+            self.shift_users += 1
+        xtest.fake_input(self.display, X.KeyPress, keycode)
+    
+    def release_key(self, key):
+        keycode, shift = key
+        if keycode in self.shift_keycodes:
+            self.held_shifts.discard(keycode)
+            if not (keycode == self.shift_keycode and self.shift_injected):
+                xtest.fake_input(self.display, X.KeyRelease, keycode)
+            return
+        xtest.fake_input(self.display, X.KeyRelease, keycode)
+        if shift and self.shift_users:
+            self.shift_users -= 1
+            if not self.shift_users and self.shift_injected:
+                self.shift_injected = False
+                if self.shift_keycode not in self.held_shifts:
+                    xtest.fake_input(self.display, X.KeyRelease, self.shift_keycode)
+    
+    def flush(self):
+        self.display.flush()
+    
+    def close(self):
+        self.display.close()
+    
+    def create_listeners(self, on_move, on_click, on_scroll, on_press, on_release):
+        return create_pynput_listeners(on_move, on_click, on_scroll, on_press, on_release)
+
+
+class FakeListener:
+    """
+    FakeBackend 的监听器，start() 之后 emit_* 产生的事件才会回调
+    """
+    
+    def __init__(self, backend, callbacks):
+        self.backend = backend
+        self.callbacks = callbacks
+    
+    def start(self):
+        self.backend.listeners.append(self)
+    
+    def stop(self):
+        if self in self.backend.listeners:
+            self.backend.listeners.remove(self)
+
+
+class FakeBackend(InputBackend):
+    """
+    内存输入后端
+    
+    record 为 True 时把每个注入的事件以 (perf_counter_ns, 类型, 参数...) 追加到 events，
+    为 False 时只更新鼠标位置，用于测量不含设备开销的回放性能。
+    loopback 为 True 时注入的事件同时回调给已启动的监听器，与真实系统中钩子能看到注入的输入一样。
+    按键和按钮原样使用录制的字符串。
+    """
+    
+    name = 'memory'
+    
+    def __init__(self, record=True, loopback=False):
+        """
+        初始化
+        """
+        self.record = record
+        self.loopback = loopback
+        self.events = []
+        self.position = (0, 0)
+        self.listeners = []
+    
+    def clear(self):
+        """
+        清空记录的事件
+        """
+        self.events = []
+    
+    def resolve_key(self, key_str):
+        if key_str is None:
+            return None
+        if len(key_str) == 1 and key_str.isprintable():
+            return key_str
+        return key_str if key_str.startswith('Key.') else None
+    
+    def resolve_button(self, button_str):
+        if button_str is None or not button_str.startswith('Button.'):
+            return None
+        return button_str
+    
+    def move(self, x, y):
+        self.position = (x, y)
+        if self.record:
+            self.events.append((time.perf_counter_ns(), 'move', x, y))
+        if self.loopback:
+            self.emit_move(x, y)
+    
+    def press_button(self, button):
+        if self.record:
+            self.events.append((time.perf_counter_ns(), 'press_button', button))
+        if self.loopback:
+            self.emit_click(*self.position, button, True)
+    
+    def release_button(self, button):
+        if self.record:
+            self.events.append((time.perf_counter_ns(), 'release_button', button))
+        if self.loopback:
+            self.emit_click(*self.position, button, False)
+    
+    def scroll(self, dx, dy):
+        if self.record:
+            self.events.append((time.perf_counter_ns(), 'scroll', dx, dy))
+        if self.loopback:
+            self.emit_scroll(*self.position, dx, dy)
+    
+    def press_key(self, key):
+        if self.record:
+            self.events.append((time.perf_counter_ns(), 'press_key', key))
+        if self.loopback:
+            self.emit_press(key)
+    
+    def release_key(self, key):
+        if self.record:
+            self.events.append((time.perf_counter_ns(), 'release_key', key))
+        if self.loopback:
+            self.emit_release(key)
+    
+    def create_listeners(self, on_move, on_click, on_scroll, on_press, on_release):
+        return [FakeListener(self, {
+            'move': on_move,
+            'click': on_click,
+            'scroll': on_scroll,
+            'press': on_press,
+            'release': on_release
+        })]
+    
+    def _emit(self, kind, *args):
+        for listener in list(self.listeners):
+            callback = listener.callbacks.get(kind)
+            if callback is not None:
+                callback(*args)
+    
+    def emit_move(self, x, y):
+        """
+        模拟用户移动鼠标
+        """
+        self._emit('move', x, y)
+    
+    def emit_click(self, x, y, button, pressed):
+        """
+        模拟用户点击鼠标
+        """
+        self._emit('click', x, y, button, pressed)
+    
+    def emit_scroll(self, x, y, dx, dy):
+        """
+        模拟用户滚动滚轮
+        """
+        self._emit('scroll', x, y, dx, dy)
+    
+    def emit_press(self, key):
+        """
+        模拟用户按下按键
+        """
+        self._emit('press', key)
+    
+    def emit_release(self, key):
+        """
+        模拟用户释放按键
+        """
+        self._emit('release', key)
+
+
+# 后端名称到工厂函数的映射
+BACKENDS = {
+    'pynput': PynputBackend,
+    'xtest': XTestBackend,
+    'memory': FakeBackend,
+}
+
+
+def register_backend(name, factory):
+    """
+    注册输入后端，factory 无参数调用后返回后端对象
+    """
+    BACKENDS[name] = factory
+
+
+def create_backend(name=None):
+    """
+    按名称创建输入后端，name 为 None 时使用 DEFAULT_BACKEND，不可用时抛出 InputBackendError
+    """
+    if name is None:
+        name = DEFAULT_BACKEND
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise InputBackendError(f"未知的输入后端: {name}（可用: {', '.join(BACKENDS)}）")
+    try:
+        return factory()
+    except InputBackendError:
+        raise
+    except Exception as e:
+        raise InputBackendError(f"输入后端 {name} 不可用: {e}") from e
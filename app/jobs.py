@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+任务队列模块
+
+把多个宏排成队列依次回放，每个任务有自己的播放速度、重复次数、优先级和触发时间：
+- 没有触发条件的任务加入后尽快执行一次
+- 有触发条件的任务按 cron 表达式（分 时 日 月 星期）或 HH:MM（每天）反复执行
+- 同时到期的任务按优先级从高到低、到期时间从早到晚、加入顺序执行
+
+当前任务回放时，后台线程提前打开并编译下一个任务的宏，
+上一个任务结束后下一个任务立即开始，中间不再有加载时间。
+队列保存在 JSON 文件中，每次状态变化都先写临时文件再替换，重启后继续；
+程序退出时正在运行的任务在下次启动时重新排队。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.input_backend import create_backend
+from app.macro_format import open_macro
+from app.signals import Signal
+
+
+# 默认的队列文件
+DEFAULT_QUEUE_FILE = 'jobs.json'
+
+# 队列文件格式版本
+QUEUE_VERSION = 1
+
+# 任务状态
+JOB_STATES = ('pending', 'running', 'done', 'failed')
+
+# 空闲时检查队列文件是否被其他进程修改的间隔（秒）
+POLL_INTERVAL = 5.0
+
+# 查找下一次触发时间时最多向后查找的天数（覆盖闰年的 2 月 29 日）
+MAX_TRIGGER_DAYS = 366 * 8
+
+# cron 表达式的简写
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+# cron 各字段的取值范围：分、时、日、月、星期（0 为星期日，7 也表示星期日）
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+class JobError(Exception):
+    """
+    任务或触发条件无效
+    """
+
+
+def _parse_cron_field(text, low, high):
+    """
+    解析 cron 表达式的一个字段，支持 *、数字、a-b 范围、逗号列表和 /步长
+    """
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            if not step_text.isdigit() or int(step_text) < 1:
+                raise JobError(f"无效的步长: {step_text}")
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise JobError(f"无效的范围: {part}")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            start = int(part)
+            end = high if step > 1 else start
+        else:
+            raise JobError(f"无效的字段: {part}")
+        if not low <= start <= end <= high:
+            raise JobError(f"取值超出范围 {low}-{high}: {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronTrigger:
+    """
+    cron 风格的触发条件，按本地时间计算，精确到分钟
+    
+    日和星期都不是 * 时，满足其一即可（与 cron 相同）
+    """
+    
+    def __init__(self, expression):
+        """
+        解析触发条件：5 个字段的 cron 表达式、@daily 等简写，或 HH:MM（每天该时刻）
+        """
+        self.expression = expression
+        text = CRON_ALIASES.get(expression.strip(), expression.strip())
+        match = re.fullmatch(r'(\d{1,2}):(\d{2})', text)
+        if match:
+            text = f"{int(match.group(2))} {int(match.group(1))} * * *"
+        
+        fields = text.split()
+        if len(fields) != 5:
+            raise JobError(f"触发条件需要 5 个字段（分 时 日 月 星期）或 HH:MM: {expression}")
+        minutes, hours, days, months, weekdays = (
+            _parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        if 7 in weekdays:
+            weekdays.discard(7)
+            weekdays.add(0)
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.days = days
+        self.months = months
+        self.weekdays = weekdays
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+    
+    def __repr__(self):
+        return f"CronTrigger({self.expression!r})"
+    
+    def _day_matches(self, date):
+        """
+        判断某一天是否满足月、日和星期字段
+        """
+        if date.month not in self.months:
+            return False
+        day_ok = date.day in self.days
+        weekday_ok = (date.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+    
+    def next_after(self, timestamp):
+        """
+        获取晚于 timestamp 的下一次触发时间（时间戳）
+        """
+        start = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        date = start.date()
+        for _ in range(MAX_TRIGGER_DAYS):
+            if self._day_matches(date):
+                for hour in self.hours:
+                    if date == start.date() and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        if date == start.date() and hour == start.hour and minute < start.minute:
+                            continue
+                        return datetime(date.year, date.month, date.day, hour, minute).timestamp()
+            date += timedelta(days=1)
+        raise JobError(f"触发条件永远不会满足: {self.expression}")
+
+
+class Job:
+    """
+    队列中的一个任务
+    """
+    
+    # 保存到队列文件的字段
+    FIELDS = (
+        'id', 'path', 'speed', 'repeat', 'priority', 'trigger',
+        'state', 'next_run', 'runs', 'last_run', 'last_error'
+    )
+    
+    def __init__(self, id, path, speed=1.0, repeat=1, priority=0, trigger=None,
+                 state='pending', next_run=None, runs=0, last_run=None, last_error=None):
+        """
+        初始化任务，next_run 为下一次到期的时间戳，没有触发条件的任务为 None（立即到期）
+        """
+        self.id = id
+        self.path = path
+        self.speed = speed
+        self.repeat = repeat
+        self.priority = priority
+        self.trigger = trigger
+        self.state = state
+        self.next_run = next_run
+        self.runs = runs
+        self.last_run = last_run
+        self.last_error = last_error
+    
+    def __repr__(self):
+        return f"Job({self.id}, {self.path!r}, state={self.state!r})"
+    
+    def to_dict(self):
+        """
+        转换为字典
+        """
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    @classmethod
+    def from_dict(cls, data):
+        """
+        从字典创建任务，忽略未知的字段
+        """
+        return cls(**{field: data[field] for field in cls.FIELDS if field in data})
+    
+    def order_key(self):
+        """
+        到期任务的执行顺序：优先级高的在前，其次到期早的、加入早的在前
+        """
+        return (-self.priority, self.next_run or 0.0, self.id)
+    
+    def is_due(self, now):
+        """
+        判断任务在 now 时是否可以执行
+        """
+        return self.state == 'pending' and (self.next_run is None or self.next_run <= now)
+
+
+class JobQueue:
+    """
+    持久化的任务队列
+    
+    所有方法都持有同一把锁，可以在回放线程和界面线程中同时使用；
+    队列内容变化时通知 changed 条件变量，等待中的 JobRunner 会被唤醒
+    """
+    
+    def __init__(self, path=None):
+        """
+        初始化队列，path 为队列文件路径，文件存在时读取；为 None 时只保存在内存中
+        """
+        self.path = path
+        self.jobs = {}
+        self.next_id = 1
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.file_mtime = None  # 最近一次读取或写入时队列文件的修改时间
+        if path is not None and os.path.exists(path):
+            self.load()
+    
+    def __len__(self):
+        return len(self.jobs)
+    
+    def load(self):
+        """
+        读取队列文件；上次退出时正在运行的任务重新排队
+        """
+        with self.lock:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version', QUEUE_VERSION) > QUEUE_VERSION:
+                raise JobError(f"不支持的队列文件版本: {data.get('version')}")
+            self.jobs = {}
+            for item in data.get('jobs', []):
+                job = Job.from_dict(item)
+                if job.state == 'running':
+                    job.state = 'pending'
+                self.jobs[job.id] = job
+            self.next_id = max(data.get('next_id', 1), max(self.jobs, default=0) + 1)
+            self.file_mtime = os.stat(self.path).st_mtime_ns
+            self.changed.notify_all()
+    
+    def save(self):
+        """
+        写入队列文件：先写临时文件再替换，写入中断不会破坏原文件
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            data = {
+                'version': QUEUE_VERSION,
+                'next_id': self.next_id,
+                'jobs': [job.to_dict() for job in sorted(self.jobs.values(), key=lambda job: job.id)]
+            }
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            self.file_mtime = os.stat(self.path).st_mtime_ns
+    
+    def refresh(self):
+        """
+        队列文件被其他进程（如命令行 jobs add）修改时重新读取，返回是否重新读取
+        """
+        if self.path is None:
+            return False
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self.file_mtime:
+                return False
+            self.load()
+            return True
+    
+    def _current(self, job):
+        """
+        修改任务状态前重新读取被其他进程修改过的队列文件，返回队列中对应的任务对象；
+        任务已被删除时返回原对象，之后的修改不再保存
+        """
+        self.refresh()
+        return self.jobs.get(job.id, job)
+    
+    def add(self, path, speed=1.0, repeat=1, priority=0, trigger=None, now=None):
+        """
+        加入任务，返回 Job；trigger 为 cron 表达式或 HH:MM，无效时抛出 JobError
+        """
+        now = time.time() if now is None else now
+        next_run = CronTrigger(trigger).next_after(now) if trigger else None
+        if speed <= 0:
+            raise JobError(f"播放速度必须大于 0: {speed}")
+        if repeat < 1:
+            raise JobError(f"重复次数至少为 1: {repeat}")
+        with self.lock:
+            self.refresh()
+            job = Job(self.next_id, os.path.abspath(path), speed, repeat, priority, trigger,
+                      next_run=next_run)
+            self.jobs[job.id] = job
+            self.next_id += 1
+            self.save()
+            self.changed.notify_all()
+        return job
+    
+    def remove(self, job_id):
+        """
+        删除任务，返回是否存在；正在运行的任务不会被打断，结束后不再记录
+        """
+        with self.lock:
+            self.refresh()
+            job = self.jobs.pop(job_id, None)
+            if job is not None:
+                self.save()
+                self.changed.notify_all()
+            return job is not None
+    
+    def get(self, job_id):
+        """
+        按编号获取任务
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def list(self):
+        """
+        按执行顺序列出所有任务
+        """
+        with self.lock:
+            return sorted(self.jobs.values(), key=Job.order_key)
+    
+    def next_due(self, now, exclude=None):
+        """
+        获取 now 时应执行的任务（不含编号为 exclude 的任务），没有时返回 None
+        """
+        with self.lock:
+            due = [job for job in self.jobs.values() if job.is_due(now) and job.id != exclude]
+            return min(due, key=Job.order_key, default=None)
+    
+    def next_pending(self, exclude=None):
+        """
+        获取下一个将要到期的任务（不含编号为 exclude 的任务），没有时返回 None
+        """
+        with self.lock:
+            pending = [job for job in self.jobs.values()
+                       if job.state == 'pending' and job.id != exclude]
+            return min(pending, key=lambda job: (job.next_run or 0.0,) + job.order_key(), default=None)
+    
+    def start(self, job):
+        """
+        标记任务开始运行，返回队列中对应的任务对象
+        """
+        with self.lock:
+            job = self._current(job)
+            job.state = 'running'
+            if job.id in self.jobs:
+                self.save()
+            return job
+    
+    def finish(self, job, error=None, now=None):
+        """
+        记录任务结束：有触发条件的任务计算下一次到期时间，否则标记为完成或失败；返回队列中对应的任务对象
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            job = self._current(job)
+            job.runs += 1
+            job.last_run = now
+            job.last_error = error
+            if job.trigger:
+                job.state = 'pending'
+                job.next_run = CronTrigger(job.trigger).next_after(now)
+            else:
+                job.state = 'failed' if error else 'done'
+            if job.id in self.jobs:
+                self.save()
+            self.changed.notify_all()
+            return job
+    
+    def requeue(self, job):
+        """
+        被中断的任务重新排队，下次仍按原来的到期时间执行
+        """
+        with self.lock:
+            job = self._current(job)
+            job.state = 'pending'
+            if job.id in self.jobs:
+                self.save()
+            self.changed.notify_all()
+    
+    def clear_finished(self):
+        """
+        删除已完成和失败的任务，返回删除的数量
+        """
+        with self.lock:
+            self.refresh()
+            finished = [job_id for job_id, job in self.jobs.items() if job.state in ('done', 'failed')]
+            for job_id in finished:
+                del self.jobs[job_id]
+            if finished:
+                self.save()
+            return len(finished)
+
+
+class JobRunner:
+    """
+    按队列依次回放任务
+    
+    所有任务共用一个输入后端。当前任务开始回放后，后台线程预先打开并编译接下来的任务，
+    内存映射的宏文件同时建立关键帧索引（读取整个文件），开始回放时不再有加载时间。
+    任务回放结束、预加载结果被丢弃或运行器关闭时，关闭播放器打开的宏文件
+    """
+    
+    def __init__(self, queue, backend=None):
+        """
+        初始化，backend 为输入后端，不指定时使用默认后端
+        """
+        self.queue = queue
+        self.backend = backend if backend is not None else create_backend()
+        self.job_started = Signal()  # 任务开始信号，参数为 Job 和 Player，在运行线程中触发
+        self.job_finished = Signal()  # 任务执行完（成功或失败）信号，参数为 Job，被停止的任务不触发
+        self.player = None  # 正在回放的播放器
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.preloaded = None  # (预加载的键, Future)
+        self.load_seconds = []  # 每个任务开始前等待加载的时间（秒）
+    
+    def prepare(self, job):
+        """
+        打开任务的宏文件并创建设置好的播放器
+        """
+        from app.player import Player
+        
+        player = Player(backend=self.backend)
+        source = open_macro(job.path)
+        try:
+            player.set_actions(source)
+            player.set_speed(job.speed)
+            player.set_repeat_count(job.repeat)
+            player.get_projected_duration()
+        except Exception:
+            _close_source(source)
+            raise
+        return player
+    
+    def _preload_key(self, job):
+        """
+        预加载结果的有效条件：同一任务、同样的设置、文件没有变化
+        """
+        try:
+            stat = os.stat(job.path)
+        except OSError:
+            return None
+        return (job.id, job.path, job.speed, job.repeat, stat.st_size, stat.st_mtime_ns)
+    
+    def preload(self, job):
+        """
+        在后台线程中准备任务的播放器，已经为同一任务准备过时不重复准备
+        """
+        if job is None:
+            return
+        key = self._preload_key(job)
+        if key is None or (self.preloaded is not None and self.preloaded[0] == key):
+            return
+        self._discard_preloaded()
+        self.preloaded = (key, self.executor.submit(self.prepare, job))
+    
+    def _take(self, job):
+        """
+        取出预加载的播放器，没有或已失效时直接准备
+        """
+        if self.preloaded is not None and self.preloaded[0] == self._preload_key(job):
+            preloaded, self.preloaded = self.preloaded, None
+            return preloaded[1].result()
+        self._discard_preloaded()
+        return self.prepare(job)
+    
+    def _discard_preloaded(self):
+        """
+        丢弃预加载的结果，准备完成后关闭它打开的宏文件
+        """
+        preloaded, self.preloaded = self.preloaded, None
+        if preloaded is not None:
+            preloaded[1].add_done_callback(_close_prepared)
+    
+    def run(self, until_idle=False):
+        """
+        依次执行到期的任务，直到 stop() 被调用；until_idle 为 True 时没有到期的任务就返回
+        """
+        queue = self.queue
+        while not self.stopped.is_set():
+            queue.refresh()
+            now = time.time()
+            job = queue.next_due(now)
+            if job is None:
+                if until_idle:
+                    return
+                # 空闲时预加载下一个将要到期的任务，到期时立即开始
+                upcoming = queue.next_pending()
+                self.preload(upcoming)
+                timeout = POLL_INTERVAL
+                if upcoming is not None and upcoming.next_run is not None:
+                    timeout = max(0.0, min(timeout, upcoming.next_run - now))
+                with queue.changed:
+                    queue.changed.wait(timeout)
+                continue
+            self.run_job(job)
+    
+    def run_job(self, job):
+        """
+        回放一个任务并记录结果
+        """
+        queue = self.queue
+        job = queue.start(job)
+        error = None
+        player = None
+        started = time.perf_counter()
+        try:
+            player = self._take(job)
+            self.load_seconds.append(time.perf_counter() - started)
+            self.player = player
+            if self.stopped.is_set():
+                # 准备期间被停止
+                queue.requeue(job)
+                return
+            self.job_started.emit(job, player)
+            
+            # 预加载当前任务结束时将要执行的任务
+            finish_at = time.time() + player.get_projected_duration() * player.repeat_count
+            self.preload(queue.next_due(finish_at, exclude=job.id))
+            
+            player.start_playing()
+            if player.last_error is not None:
+                error = f"{type(player.last_error).__name__}: {player.last_error}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            self.player = None
+            if player is not None:
+                _close_source(player.actions)
+        
+        if self.stopped.is_set() and error is None:
+            # 被停止的任务没有完整执行，下次重新执行
+            queue.requeue(job)
+            return
+        self.job_finished.emit(queue.finish(job, error))
+    
+    def stop(self):
+        """
+        停止运行：打断正在回放的任务并唤醒等待中的 run()
+        """
+        self.stopped.set()
+        player = self.player
+        if player is not None:
+            player.stop_playing()
+        with self.queue.changed:
+            self.queue.changed.notify_all()
+    
+    def close(self):
+        """
+        释放预加载线程、尚未使用的预加载结果和输入后端
+        """
+        self._discard_preloaded()
+        self.executor.shutdown(wait=True)
+        self.backend.close()
+
+
+def _close_source(actions):
+    """
+    关闭 open_macro() 打开的宏文件或组合文档；JSON 宏已整体读入内存，没有需要关闭的资源
+    """
+    close = getattr(actions, 'close', None)
+    if close is not None:
+        close()
+
+
+def _close_prepared(future):
+    """
+    被丢弃的预加载完成后关闭播放器的宏文件，准备失败时没有需要关闭的资源
+    """
+    if not future.cancelled() and future.exception() is None:
+        _close_source(future.result().actions)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+关键帧索引模块
+
+从中间位置开始回放时，需要知道该位置的时间以及此刻按住的按键、鼠标按钮和光标位置。
+关键帧索引按块记录这些信息：
+- 每个关键帧对应一个块的起始动作，保存块开始前的输入状态和时间轴游标，
+  以及块中第一个动作变换后的时间
+- 按时间或动作下标定位时先二分查找关键帧，再从关键帧起处理不超过一个块的动作，
+  定位的开销与宏的长度无关
+
+内存映射的宏文件按文件中的记录块建立关键帧，从关键帧的游标继续变换即可得到后续的时间戳；
+内存中的动作每 KEYFRAME_INTERVAL 个动作一个关键帧。
+索引可以随块的到来逐步建立（add()），不需要先把整个宏读入内存。
+"""
+
+import copy
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+from app.action_buffer import (
+    FLAG_PRESSED, TYPE_MOUSE_MOVE, TYPE_MOUSE_CLICK, TYPE_MOUSE_SCROLL,
+    TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+)
+
+
+# 内存中的动作每隔多少个动作记录一个关键帧
+KEYFRAME_INTERVAL = 4096
+
+
+class InputState:
+    """
+    某一时刻的输入状态：按住的按键、按住的鼠标按钮（按按下的顺序）和光标位置
+    
+    按键和按钮保存录制时的字符串，光标位置在第一个带坐标的动作之前为 None
+    """
+    
+    __slots__ = ('keys', 'buttons', 'x', 'y')
+    
+    def __init__(self, keys=(), buttons=(), x=None, y=None):
+        """
+        初始化
+        """
+        self.keys = dict.fromkeys(keys)
+        self.buttons = dict.fromkeys(buttons)
+        self.x = x
+        self.y = y
+    
+    def __repr__(self):
+        return (f"InputState(keys={list(self.keys)}, buttons={list(self.buttons)}, "
+                f"x={self.x}, y={self.y})")
+    
+    def __eq__(self, other):
+        return (isinstance(other, InputState)
+                and list(self.keys) == list(other.keys)
+                and list(self.buttons) == list(other.buttons)
+                and (self.x, self.y) == (other.x, other.y))
+    
+    def copy(self):
+        """
+        复制状态
+        """
+        return InputState(self.keys, self.buttons, self.x, self.y)
+    
+    def advance(self, actions, start=0, end=None):
+        """
+        依次应用 actions[start:end] 中的动作
+        """
+        if end is None:
+            end = len(actions)
+        types = actions.types
+        keys = self.keys
+        buttons = self.buttons
+        position = None
+        for i in range(start, end):
+            type_code = types[i]
+            if type_code == TYPE_MOUSE_MOVE or type_code == TYPE_MOUSE_SCROLL:
+                position = i
+            elif type_code == TYPE_MOUSE_CLICK:
+                position = i
+                button = actions.get_string(actions.string_ids[i])
+                if actions.flags[i] & FLAG_PRESSED:
+                    buttons[button] = None
+                else:
+                    buttons.pop(button, None)
+            elif type_code == TYPE_KEY_PRESS:
+                keys[actions.get_string(actions.string_ids[i])] = None
+            elif type_code == TYPE_KEY_RELEASE:
+                keys.pop(actions.get_string(actions.string_ids[i]), None)
+        if position is not None:
+            self.x = actions.x[position]
+            self.y = actions.y[position]
+        return self
+    
+    def to_dict(self):
+        """
+        转换为字典
+        """
+        return {
+            'keys': list(self.keys),
+            'buttons': list(self.buttons),
+            'position': None if self.x is None else (self.x, self.y)
+        }
+
+
+# 关键帧：块起始动作下标、块中第一个动作变换后的时间（秒）、块开始前的输入状态和时间轴游标
+Keyframe = namedtuple('Keyframe', ('index', 'time', 'state', 'cursor'))
+
+
+class KeyframeIndex:
+    """
+    关键帧索引
+    
+    按顺序对每个块调用 add() 建立索引，时间为 transform 变换后、未按播放速度缩放的时间
+    """
+    
+    def __init__(self, transform):
+        """
+        初始化空索引
+        """
+        self.transform = transform
+        self.keyframes = []
+        self.indices = array('Q')
+        self.times = array('d')
+        self.count = 0  # 已加入索引的动作数
+        self.duration = 0.0  # 已加入索引的动作变换后的时长
+        self.state = InputState()
+        self.cursor = transform.cursor()
+    
+    def __len__(self):
+        return len(self.keyframes)
+    
+    def __repr__(self):
+        return f"KeyframeIndex({len(self.keyframes)} keyframes, {self.count} actions)"
+    
+    @classmethod
+    def build(cls, chunks, transform):
+        """
+        从 (块起始动作下标, ActionBuffer) 的迭代建立完整的索引
+        """
+        index = cls(transform)
+        for base, buffer in chunks:
+            index.add(base, buffer)
+        return index
+    
+    def add(self, base, buffer):
+        """
+        加入下一个块，返回块中动作变换后的时间戳
+        """
+        if base != self.count:
+            raise ValueError(f"关键帧块不连续: 期望从 {self.count} 开始，实际为 {base}")
+        state = self.state.copy()
+        cursor = copy.copy(self.cursor)
+        timestamps = self.cursor.advance(buffer)
+        if not len(buffer):
+            return timestamps
+        
+        self.keyframes.append(Keyframe(base, timestamps[0], state, cursor))
+        self.indices.append(base)
+        self.times.append(timestamps[0])
+        self.state.advance(buffer)
+        self.count += len(buffer)
+        self.duration = self.cursor.last_time
+        return timestamps
+    
+    def find_index(self, index):
+        """
+        获取动作下标 index 所在块的关键帧
+        """
+        if not self.keyframes:
+            raise IndexError("关键帧索引为空")
+        return self.keyframes[max(0, bisect_right(self.indices, index) - 1)]
+    
+    def find_time(self, time):
+        """
+        获取变换后时间 time 所在块的关键帧
+        """
+        if not self.keyframes:
+            raise IndexError("关键帧索引为空")
+        return self.keyframes[max(0, bisect_right(self.times, time) - 1)]
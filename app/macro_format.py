@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+宏文件格式模块
+
+支持两种文件格式：
+- JSON（.json）：早期版本使用的文本格式，便于查看和手工编辑
+- 二进制（.amc）：带版本号的紧凑容器，由定长记录和字符串表组成，可以增量读写
+
+二进制文件布局：
+    文件头 | 块 | 块 | ...
+每个块由块头（块类型、条目数、负载长度、CRC32）和负载组成。
+字符串块（S）向字符串表追加按键名、鼠标按钮名等字符串，
+记录块（R）包含若干条定长动作记录，记录通过编号引用字符串表。
+记录字段与 ActionBuffer 的列一一对应，块内按列依次存放，读写时整列复制。
+写入时按批次追加块，读取时逐块解码，无需一次性把整个文件读入内存。
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import weakref
+import zlib
+from array import array
+
+from app.action_buffer import ActionBuffer, TYPE_CODES, NO_STRING
+
+
+# 文件扩展名
+JSON_EXTENSION = '.json'
+BINARY_EXTENSION = '.amc'
+
+# 支持的文件格式名称
+FILE_FORMATS = ('amc', 'json')
+
+# 文件头：魔数、格式版本、标志位、单条记录长度
+MAGIC = b'AMCF'
+
+# 格式版本，增加记录类型时加一，旧程序据此拒绝读取新文件：
+# 1 - 鼠标移动、点击、滚轮和键盘按下、释放
+# 2 - 增加图像锚点（anchor）和等待步骤（wait）
+# 3 - 增加文字输入步骤（type_text）
+# 4 - 滚轮滚动量可以带小数（标志位 FLAG_FINE_SCROLL，dx/dy 为定点数）
+# 读取时接受不高于 FORMAT_VERSION 的所有版本；写入时总是使用 FORMAT_VERSION
+FORMAT_VERSION = 4
+_HEADER = struct.Struct('<4sHHH')
+
+# 文件头标志位：边录制边写入的日志文件，读取时容忍末尾不完整的块
+FLAG_JOURNAL = 0x0001
+
+# 块头：块类型、条目数、负载长度、负载的CRC32
+_CHUNK_HEADER = struct.Struct('<cIII')
+CHUNK_STRINGS = b'S'
+CHUNK_RECORDS = b'R'
+
+# 动作记录：类型、标志、字符串编号、x、y、dx、dy、时间戳，与 ActionBuffer 的列对应
+RECORD_SIZE = sum(column.itemsize for column in ActionBuffer().columns())
+_STRING_LENGTH = struct.Struct('<I')
+
+# 文件统一使用小端字节序，大端平台读写时需要转换
+_BYTESWAP = sys.byteorder != 'little'
+
+# 默认每批写入的记录数
+DEFAULT_BATCH_SIZE = 4096
+
+
+class MacroFormatError(Exception):
+    """
+    宏文件格式错误
+    """
+
+
+def is_binary_filename(filename):
+    """
+    根据扩展名判断是否为二进制宏文件
+    """
+    return os.path.splitext(filename)[1].lower() == BINARY_EXTENSION
+
+
+class MacroWriter:
+    """
+    二进制宏文件写入器
+    
+    动作先缓存在一个 ActionBuffer 中，每满一批就以块的形式追加到文件，
+    调用 flush() 可以立即写出当前缓存。
+    """
+    
+    def __init__(self, fileobj, batch_size=DEFAULT_BATCH_SIZE, flags=0):
+        """
+        初始化写入器并写出文件头
+        """
+        self.fileobj = fileobj
+        self.batch_size = max(1, batch_size)
+        self.pending = ActionBuffer()
+        self.written_strings = 0
+        self.count = 0
+        self.fileobj.write(_HEADER.pack(MAGIC, FORMAT_VERSION, flags, RECORD_SIZE))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def write(self, action):
+        """
+        写入单个动作字典
+        """
+        self.pending.append(action)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def write_many(self, actions):
+        """
+        写入多个动作，ActionBuffer 按列批量写入
+        """
+        if isinstance(actions, ActionBuffer):
+            self.write_buffer(actions)
+            return
+        if isinstance(actions, MappedMacro):
+            for _, buffer in actions.iter_buffers():
+                self.write_buffer(buffer)
+            return
+        
+        for action in actions:
+            self.write(action)
+    
+    def write_buffer(self, buffer):
+        """
+        按列批量写入 ActionBuffer 中的全部动作
+        """
+        for start in range(0, len(buffer), self.batch_size):
+            self.pending.extend(buffer[start:start + self.batch_size])
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+    
+    def flush(self):
+        """
+        把缓存的字符串和记录写出到文件
+        """
+        strings = self.pending.strings
+        if len(strings) > self.written_strings:
+            new_strings = strings[self.written_strings:]
+            payload = b''.join(
+                _STRING_LENGTH.pack(len(data)) + data
+                for data in (text.encode('utf-8') for text in new_strings)
+            )
+            self._write_chunk(CHUNK_STRINGS, len(new_strings), payload)
+            self.written_strings = len(strings)
+        
+        count = len(self.pending)
+        if count:
+            payload = b''.join(_column_bytes(column) for column in self.pending.columns())
+            self._write_chunk(CHUNK_RECORDS, count, payload)
+            self.count += count
+            self.pending.clear()
+        
+        self.fileobj.flush()
+    
+    def close(self):
+        """
+        写出剩余数据
+        """
+        self.flush()
+    
+    def _write_chunk(self, kind, count, payload):
+        """
+        写出一个块
+        """
+        header = _CHUNK_HEADER.pack(kind, count, len(payload), zlib.crc32(payload))
+        self.fileobj.write(header)
+        self.fileobj.write(payload)
+
+
+class MacroReader:
+    """
+    二进制宏文件读取器
+    
+    按块逐步读取文件，每个记录块解码为一个 ActionBuffer，
+    所有块共享同一张字符串表，因此记录中的字符串编号无需转换。
+    直接迭代读取器时依次产生动作字典。
+    
+    录制日志（带 FLAG_JOURNAL 标志）可能因崩溃或断电而在末尾留下不完整的块，
+    读取时会停在最后一个完整的块并把 truncated 置为 True，而不是报错。
+    """
+    
+    def __init__(self, fileobj, recover=None):
+        """
+        初始化读取器并校验文件头
+        
+        recover 为 None 时，只有日志文件才容忍末尾不完整的块
+        """
+        self.fileobj = fileobj
+        self.strings = []
+        self.string_index = {}
+        self.truncated = False
+        
+        self.version, self.flags = _parse_header(fileobj.read(_HEADER.size))
+        self.recover = bool(self.flags & FLAG_JOURNAL) if recover is None else recover
+    
+    def __iter__(self):
+        for buffer in self.iter_buffers():
+            yield from buffer
+    
+    def iter_buffers(self):
+        """
+        逐块读取文件，每次产生一个记录块对应的 ActionBuffer
+        """
+        while True:
+            header = self.fileobj.read(_CHUNK_HEADER.size)
+            if not header:
+                return
+            if len(header) < _CHUNK_HEADER.size:
+                self._damaged("块头不完整")
+                return
+            
+            kind, count, length, checksum = _CHUNK_HEADER.unpack(header)
+            payload = self.fileobj.read(length)
+            if len(payload) < length:
+                self._damaged("块数据不完整")
+                return
+            if zlib.crc32(payload) != checksum:
+                self._damaged("块校验失败")
+                return
+            
+            if kind == CHUNK_STRINGS:
+                self._read_strings(payload, count)
+            elif kind == CHUNK_RECORDS:
+                yield self._read_records(payload, count)
+            # 忽略未知类型的块，便于以后扩展
+    
+    def _damaged(self, message):
+        """
+        处理损坏的块：恢复模式下标记截断，否则报错
+        """
+        if not self.recover:
+            raise MacroFormatError(message)
+        self.truncated = True
+    
+    def read_all(self):
+        """
+        读取剩余的全部动作，合并为一个 ActionBuffer
+        """
+        result = ActionBuffer((self.strings, self.string_index))
+        for buffer in self.iter_buffers():
+            result.extend(buffer)
+        return result
+    
+    def _read_strings(self, payload, count):
+        """
+        解析字符串块
+        """
+        _parse_strings(payload, count, self.strings, self.string_index)
+    
+    def _read_records(self, payload, count):
+        """
+        把记录块解码为 ActionBuffer
+        """
+        return _decode_records(payload, count, self.strings, self.string_index)
+
+
+# 替换文件前是否必须先解除对它的映射：Windows 上不能替换或删除正被映射的文件
+_RELEASE_BEFORE_REPLACE = os.name == 'nt'
+
+# 当前打开的 MappedMacro，保存时用来找到映射了目标文件的对象
+_open_macros = weakref.WeakSet()
+
+
+class MappedMacro:
+    """
+    以内存映射方式打开的二进制宏文件
+    
+    打开时只扫描块头并读取字符串表，记录块在迭代时才从映射中解码，
+    因此打开多 GB 的文件也只需要几毫秒，内存占用与文件大小无关。
+    可以像 ActionBuffer 一样取长度和迭代动作字典，
+    回放时通过 iter_buffers() 逐块读取。
+    """
+    
+    def __init__(self, filename):
+        """
+        打开文件并建立块索引
+        """
+        self.filename = filename
+        self.strings = []
+        self.string_index = {}
+        self.chunks = []  # (起始动作下标, 负载偏移, 动作数, 负载长度, CRC32)
+        self.count = 0
+        self.truncated = False
+        
+        self.file = open(filename, 'rb')
+        _open_macros.add(self)
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.version, self.flags = _parse_header(self.map[:_HEADER.size])
+            self._scan(bool(self.flags & FLAG_JOURNAL))
+        except Exception:
+            self.close()
+            raise
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def __len__(self):
+        return self.count
+    
+    def __iter__(self):
+        for _, buffer in self.iter_buffers():
+            yield from buffer
+    
+    def __repr__(self):
+        return f"MappedMacro({self.filename!r}, {self.count} actions)"
+    
+    def close(self):
+        """
+        关闭映射和文件
+        """
+        if isinstance(getattr(self, 'map', None), mmap.mmap):
+            self.map.close()
+        self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+    
+    def release(self):
+        """
+        把文件内容读入内存并解除映射、关闭文件，之后仍可正常读取
+        
+        用于在 Windows 上覆盖正被映射的文件
+        """
+        if not isinstance(getattr(self, 'map', None), mmap.mmap):
+            return
+        data = self.map[:]
+        self.close()
+        self.map = data
+    
+    def _scan(self, recover):
+        """
+        扫描所有块头，读取字符串表并记录每个记录块的位置
+        """
+        data = self.map
+        offset = _HEADER.size
+        end = len(data)
+        while offset < end:
+            if end - offset < _CHUNK_HEADER.size:
+                self._damaged(recover, "块头不完整")
+                return
+            
+            kind, count, length, checksum = _CHUNK_HEADER.unpack_from(data, offset)
+            offset += _CHUNK_HEADER.size
+            if end - offset < length:
+                self._damaged(recover, "块数据不完整")
+                return
+            
+            if kind == CHUNK_STRINGS:
+                payload = data[offset:offset + length]
+                if zlib.crc32(payload) != checksum:
+                    self._damaged(recover, "块校验失败")
+                    return
+                _parse_strings(payload, count, self.strings, self.string_index)
+            elif kind == CHUNK_RECORDS:
+                self.chunks.append((self.count, offset, count, length, checksum))
+                self.count += count
+            offset += length
+    
+    def _damaged(self, recover, message):
+        """
+        处理损坏的块：日志文件标记截断，否则报错
+        """
+        if not recover:
+            raise MacroFormatError(message)
+        self.truncated = True
+    
+    def iter_buffers(self, start_index=0):
+        """
+        从包含 start_index 的记录块开始，逐块解码为 ActionBuffer
+        
+        产生 (块起始动作下标, ActionBuffer)
+        """
+        for first, offset, count, length, checksum in self.chunks:
+            if first + count <= start_index:
+                continue
+            payload = memoryview(self.map)[offset:offset + length]
+            try:
+                if zlib.crc32(payload) != checksum:
+                    raise MacroFormatError("块校验失败")
+                buffer = _decode_records(payload, count, self.strings, self.string_index)
+            finally:
+                payload.release()
+            yield first, buffer
+    
+    def read_all(self):
+        """
+        读取全部动作，合并为一个 ActionBuffer
+        """
+        result = ActionBuffer((self.strings, self.string_index))
+        for _, buffer in self.iter_buffers():
+            result.extend(buffer)
+        return result
+    
+    def duration(self):
+        """
+        获取动作总时长（秒），只解码最后一个记录块
+        """
+        if not self.chunks:
+            return 0.0
+        start = self.chunks[-1][0]
+        for _, buffer in self.iter_buffers(start):
+            return buffer.duration()
+        return 0.0
+
+
+def _parse_header(header):
+    """
+    校验文件头，返回 (格式版本, 标志位)
+    """
+    if len(header) < _HEADER.size:
+        raise MacroFormatError("文件头不完整")
+    
+    magic, version, flags, record_size = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise MacroFormatError("不是有效的宏文件")
+    if version > FORMAT_VERSION:
+        raise MacroFormatError(
+            f"文件由更新版本的程序写入（格式版本 {version}，本程序最高支持 {FORMAT_VERSION}），请升级后再打开"
+        )
+    if record_size != RECORD_SIZE:
+        raise MacroFormatError(f"不支持的记录长度: {record_size}")
+    return version, flags
+
+
+def _parse_strings(payload, count, strings, string_index):
+    """
+    解析字符串块，追加到字符串表
+    """
+    payload = bytes(payload)
+    offset = 0
+    for _ in range(count):
+        (length,) = _STRING_LENGTH.unpack_from(payload, offset)
+        offset += _STRING_LENGTH.size
+        text = payload[offset:offset + length].decode('utf-8')
+        string_index[text] = len(strings)
+        strings.append(text)
+        offset += length
+
+
+def _decode_records(payload, count, strings, string_index):
+    """
+    把记录块解码为 ActionBuffer，块内各列依次存放
+    """
+    if len(payload) != count * RECORD_SIZE:
+        raise MacroFormatError("记录块长度错误")
+    
+    buffer = ActionBuffer((strings, string_index))
+    offset = 0
+    for column in buffer.columns():
+        size = column.itemsize * count
+        column.frombytes(payload[offset:offset + size])
+        if _BYTESWAP:
+            column.byteswap()
+        offset += size
+    
+    if count:
+        if max(buffer.types) >= len(TYPE_CODES):
+            raise MacroFormatError(f"未知的动作类型编码: {max(buffer.types)}")
+        used_ids = set(buffer.string_ids)
+        used_ids.discard(NO_STRING)
+        if used_ids and max(used_ids) >= len(strings):
+            raise MacroFormatError(f"无效的字符串编号: {max(used_ids)}")
+    return buffer
+
+
+def _column_bytes(column):
+    """
+    把一列数据转换为小端字节序的字节串
+    """
+    if _BYTESWAP:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def save_macro(filename, actions, file_format=None):
+    """
+    保存动作到文件
+    
+    file_format 可以是 'amc' 或 'json'，不指定时根据扩展名选择格式。
+    先写入临时文件再替换目标文件，写入失败不会破坏原文件。
+    目标文件正以内存映射方式打开时：POSIX 系统上原映射继续指向旧的文件内容；
+    Windows 上不能替换被映射的文件，替换前把这些 MappedMacro 的内容读入内存并解除映射
+    """
+    if file_format is None:
+        binary = is_binary_filename(filename)
+    elif file_format in FILE_FORMATS:
+        binary = file_format == 'amc'
+    else:
+        raise ValueError(f"未知的文件格式: {file_format}")
+    
+    temp_filename = filename + '.tmp'
+    try:
+        if binary:
+            with open(temp_filename, 'wb') as f:
+                with MacroWriter(f) as writer:
+                    writer.write_many(actions)
+        else:
+            with open(temp_filename, 'w', encoding='utf-8') as f:
+                json.dump(list(actions), f, indent=2, ensure_ascii=False)
+        if _RELEASE_BEFORE_REPLACE:
+            _release_mappings(filename)
+        os.replace(temp_filename, filename)
+    except Exception:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+
+def _release_mappings(filename):
+    """
+    解除所有对 filename 的映射，映射的内容读入内存
+    """
+    target = os.path.realpath(filename)
+    for macro in list(_open_macros):
+        if macro.map is not None and os.path.realpath(macro.filename) == target:
+            macro.release()
+
+
+def open_macro(filename, params=None):
+    """
+    打开宏文件：二进制格式以内存映射方式延迟读取，返回 MappedMacro；
+    组合文档（.amx）返回回放时逐块展开的 composition.Composition，params 为文档参数；
+    JSON 格式只能整体解析，返回 ActionBuffer
+    """
+    from app.composition import Composition, is_composition_filename
+    
+    if is_binary_filename(filename):
+        return MappedMacro(filename)
+    if is_composition_filename(filename):
+        return Composition(filename, params)
+    return load_macro(filename)
+
+
+def load_macro(filename, params=None):
+    """
+    从文件加载动作，根据扩展名选择格式，返回 ActionBuffer
+    
+    组合文档（.amx）展开全部步骤，params 为文档参数
+    """
+    from app.composition import Composition, is_composition_filename
+    
+    if is_composition_filename(filename):
+        return Composition(filename, params).read_all()
+    if is_binary_filename(filename):
+        with open(filename, 'rb') as f:
+            return MacroReader(f).read_all()
+    with open(filename, 'r', encoding='utf-8') as f:
+        return ActionBuffer.from_actions(json.load(f))
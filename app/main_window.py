@@ -8,15 +8,43 @@ import threading
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QLabel, QSpinBox, QFileDialog, QMessageBox, QGroupBox, QSlider,
-    QTextEdit, QApplication
+    QTextEdit, QApplication, QCheckBox
 )
-from PySide6.QtCore import Qt, Signal, QThread
+from PySide6.QtCore import Qt, Signal, QThread, QTimer
 from PySide6.QtGui import QKeySequence
-from app.recorder import Recorder
+from app.action_buffer import ActionBuffer
+from app.recorder import Recorder, default_journal_path
 from app.player import Player
+from app.macro_format import BINARY_EXTENSION, JSON_EXTENSION
+from app.simplify import MoveFilter
+from app.capture import default_capture
+from app.timeline import TimelineTransform
+from app.signals import ThrottledSignal
+from app.metrics import PlaybackMetrics, METRICS_INTERVAL, format_metrics
 from pynput import keyboard
 
 
+# 文件对话框过滤器，二进制格式在前作为默认选项
+MACRO_FILE_FILTER = "Macro Files (*.amc);;JSON Files (*.json);;All Files (*)"
+
+# 加载时还可以选择组合文档
+MACRO_OPEN_FILTER = "Macro Files (*.amc *.amx);;JSON Files (*.json);;All Files (*)"
+
+# 回放中进度和重复次数通知界面的最小间隔（毫秒）
+POSITION_UPDATE_INTERVAL = 100
+
+# 快退/快进按钮每次跳过的秒数
+SKIP_SECONDS = 10
+
+
+def format_position(seconds):
+    """
+    把秒数格式化为 分:秒.十分之一秒
+    """
+    minutes, seconds = divmod(max(0.0, seconds), 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
+
+
 class KeyboardListener(QThread):
     """
     全局键盘监听器线程
@@ -94,6 +122,60 @@ class KeyboardListener(QThread):
         self.toggle_pause.emit()
 
 
+class PlaybackWorker(QThread):
+    """
+    回放线程
+    
+    在线程中运行 Player.start_playing()，不直接访问任何控件；
+    播放器在回放线程中的回调经 ThrottledSignal 合并、限频后转为 Qt 信号，
+    由界面线程处理，密集回放时也不会占满事件循环
+    """
+    
+    # 信号定义
+    progress_changed = Signal(float)  # 回放位置（秒）
+    repeat_changed = Signal(int)  # 当前重复次数
+    playback_finished = Signal(int, str)  # 回放结束，参数为回放编号和错误信息，正常结束或被停止时错误信息为空字符串
+    
+    def __init__(self, player, interval=POSITION_UPDATE_INTERVAL / 1000.0):
+        super().__init__()
+        self.player = player
+        self.progress = ThrottledSignal(interval)
+        self.progress.connect(self.progress_changed.emit)
+        self.repeat = ThrottledSignal(interval)
+        self.repeat.connect(self.repeat_changed.emit)
+        self.generation = 0  # 回放编号，每次 start_playback() 加一
+    
+    def start_playback(self):
+        """
+        开始新的一次回放，返回本次回放的编号
+        
+        结束通知带有编号，界面据此丢弃上一次回放迟到的通知，
+        不依赖 isRunning()：通知可能在 run() 返回之前就被界面线程处理
+        """
+        self.generation += 1
+        self.start()
+        return self.generation
+    
+    def run(self):
+        """
+        回放，结束后补发最后的进度和重复次数，再通知界面
+        """
+        self.progress.cancel()
+        self.repeat.cancel()
+        self.player.progress.connect(self.progress.emit)
+        self.player.repeat_started.connect(self.repeat.emit)
+        try:
+            self.player.start_playing()
+        finally:
+            self.player.progress.disconnect(self.progress.emit)
+            self.player.repeat_started.disconnect(self.repeat.emit)
+            self.repeat.flush()
+            self.progress.cancel()
+        
+        error = self.player.last_error
+        self.playback_finished.emit(self.generation, "" if error is None else str(error))
+
+
 class MainWindow(QMainWindow):
     """
     主窗口类
@@ -101,6 +183,7 @@ class MainWindow(QMainWindow):
     
     # 信号定义
     update_status = Signal(str)
+    load_finished = Signal(str, bool)  # 后台加载完成信号，参数为文件名和是否成功
     
     def __init__(self):
         """
@@ -115,14 +198,22 @@ class MainWindow(QMainWindow):
         # 初始化组件
         self.recorder = Recorder()
         self.player = Player()
+        self.playback_worker = PlaybackWorker(self.player)
+        self.playback_generation = 0  # 当前回放的编号，用于丢弃过期的结束通知
+        self.metrics = PlaybackMetrics(self.player)
         self.is_recording = False
         self.is_playing = False
+        self.stop_requested = False  # 回放是否被用户停止，决定结束时的状态提示
         
         # 创建UI
         self._create_ui()
         
         # 连接信号
         self.update_status.connect(self._update_status_label)
+        self.load_finished.connect(self._on_load_finished)
+        self.playback_worker.progress_changed.connect(self._on_playback_progress)
+        self.playback_worker.repeat_changed.connect(self._on_repeat_started)
+        self.playback_worker.playback_finished.connect(self._on_playback_finished)
         
         # 初始化全局键盘监听器
         self.keyboard_listener = KeyboardListener()
@@ -353,6 +444,18 @@ class MainWindow(QMainWindow):
         self.stop_record_button.setEnabled(False)
         record_layout.addWidget(self.stop_record_button)
         
+        self.simplify_checkbox = QCheckBox("录制时简化轨迹")
+        self.simplify_checkbox.setToolTip("丢弃与上一个点距离过近的鼠标移动点，点击和按键不受影响")
+        record_layout.addWidget(self.simplify_checkbox)
+        
+        self.journal_checkbox = QCheckBox("边录制边保存")
+        self.journal_checkbox.setToolTip("录制过程中持续写入 recordings 目录，长时间录制不占用内存，异常退出也可恢复")
+        record_layout.addWidget(self.journal_checkbox)
+        
+        self.anchor_checkbox = QCheckBox("记录点击位置的图像锚点")
+        self.anchor_checkbox.setToolTip("点击时截取周围的小块图像，回放时按图像位置修正点击坐标，窗口移动后仍能点中目标")
+        record_layout.addWidget(self.anchor_checkbox)
+        
         record_group.setLayout(record_layout)
         main_layout.addWidget(record_group)
         
@@ -426,6 +529,71 @@ class MainWindow(QMainWindow):
         speed_layout.addLayout(preset_speed_layout)
         play_layout.addLayout(speed_layout)
         
+        # 时间轴变换设置
+        timeline_layout = QHBoxLayout()
+        self.max_gap_checkbox = QCheckBox("空闲间隔最长")
+        self.max_gap_checkbox.setToolTip("相邻两个动作之间超过该时长的等待被截短")
+        self.max_gap_checkbox.toggled.connect(self._on_timeline_changed)
+        timeline_layout.addWidget(self.max_gap_checkbox)
+        
+        self.max_gap_spinbox = QSpinBox()
+        self.max_gap_spinbox.setRange(50, 60000)
+        self.max_gap_spinbox.setSingleStep(100)
+        self.max_gap_spinbox.setValue(1000)
+        self.max_gap_spinbox.setSuffix(" ms")
+        self.max_gap_spinbox.valueChanged.connect(self._on_timeline_changed)
+        timeline_layout.addWidget(self.max_gap_spinbox)
+        
+        self.fast_moves_checkbox = QCheckBox("快速执行鼠标移动")
+        self.fast_moves_checkbox.setToolTip("纯鼠标移动不再等待，点击、按键之间的间隔和拖动保持不变")
+        self.fast_moves_checkbox.toggled.connect(self._on_timeline_changed)
+        timeline_layout.addWidget(self.fast_moves_checkbox)
+        play_layout.addLayout(timeline_layout)
+        
+        self.duration_label = QLabel("预计回放时长：-")
+        play_layout.addWidget(self.duration_label)
+        self.repeat_spinbox.valueChanged.connect(self._update_duration_label)
+        
+        # 回放进度条：拖动后从该位置开始或继续回放，单位为毫秒
+        seek_layout = QHBoxLayout()
+        self.rewind_button = QPushButton(f"-{SKIP_SECONDS}s")
+        self.rewind_button.setToolTip(f"后退 {SKIP_SECONDS} 秒")
+        self.rewind_button.clicked.connect(lambda: self._on_skip_clicked(-SKIP_SECONDS))
+        seek_layout.addWidget(self.rewind_button)
+        
+        self.seek_slider = QSlider(Qt.Horizontal)
+        self.seek_slider.setRange(0, 0)
+        self.seek_slider.setToolTip("拖动选择回放位置，按键和鼠标按钮会恢复为该位置的状态")
+        self.seek_slider.sliderMoved.connect(self._on_seek_moved)
+        self.seek_slider.sliderReleased.connect(self._on_seek_released)
+        seek_layout.addWidget(self.seek_slider)
+        
+        self.forward_button = QPushButton(f"+{SKIP_SECONDS}s")
+        self.forward_button.setToolTip(f"快进 {SKIP_SECONDS} 秒，跳过的按键不会注入，按住的按键保持一致")
+        self.forward_button.clicked.connect(lambda: self._on_skip_clicked(SKIP_SECONDS))
+        seek_layout.addWidget(self.forward_button)
+        
+        self.position_label = QLabel("0:00.0 / 0:00.0")
+        seek_layout.addWidget(self.position_label)
+        play_layout.addLayout(seek_layout)
+        
+        # 回放指标面板：回放中按固定间隔采样播放器的计数
+        self.metrics_label = QLabel("")
+        self.metrics_label.setStyleSheet("""
+            QLabel {
+                font-family: Consolas, monospace;
+                font-size: 11px;
+                color: #495057;
+                padding: 2px;
+            }
+        """)
+        self.metrics_label.setVisible(False)
+        play_layout.addWidget(self.metrics_label)
+        
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(int(METRICS_INTERVAL * 1000))
+        self.metrics_timer.timeout.connect(self._update_metrics)
+        
         play_group.setLayout(play_layout)
         main_layout.addWidget(play_group)
         
@@ -441,6 +609,10 @@ class MainWindow(QMainWindow):
         self.load_button.clicked.connect(self._on_load_clicked)
         file_layout.addWidget(self.load_button)
         
+        self.simplify_button = QPushButton("简化轨迹")
+        self.simplify_button.clicked.connect(self._on_simplify_clicked)
+        file_layout.addWidget(self.simplify_button)
+        
         self.shortcuts_button = QPushButton("快捷键")
         self.shortcuts_button.clicked.connect(self._on_shortcuts_clicked)
         file_layout.addWidget(self.shortcuts_button)
@@ -464,9 +636,6 @@ class MainWindow(QMainWindow):
             }
         """)
         main_layout.addWidget(self.repeat_counter_label)
-        
-        # 连接重复计数信号
-        self.player.repeat_started.connect(self._on_repeat_started)
 
     def _on_repeat_started(self, repeat_number):
         """重复开始处理"""
@@ -482,10 +651,31 @@ class MainWindow(QMainWindow):
         self.play_button.setEnabled(False)
         self.save_button.setEnabled(False)
         self.load_button.setEnabled(False)
+        self.simplify_button.setEnabled(False)
+        self.simplify_checkbox.setEnabled(False)
+        self.journal_checkbox.setEnabled(False)
+        self.anchor_checkbox.setEnabled(False)
         
         # 开始录制
-        self.recorder.start_recording()
-        self.update_status.emit("正在录制...")
+        if self.simplify_checkbox.isChecked():
+            self.recorder.set_move_filter(MoveFilter())
+        else:
+            self.recorder.set_move_filter(None)
+        
+        anchor_source = None
+        if self.anchor_checkbox.isChecked():
+            anchor_source = default_capture()
+            if anchor_source is None:
+                QMessageBox.warning(self, "警告", "图像锚点需要 opencv-python、numpy 以及 mss 或 Pillow，本次录制不记录锚点")
+        self.recorder.set_anchor_source(anchor_source)
+        
+        if self.journal_checkbox.isChecked():
+            journal_path = default_journal_path()
+            self.recorder.start_recording(journal_path)
+            self.update_status.emit(f"正在录制到 {journal_path}...")
+        else:
+            self.recorder.start_recording()
+            self.update_status.emit("正在录制...")
     
     def _on_stop_record_clicked(self):
         """
@@ -497,14 +687,27 @@ class MainWindow(QMainWindow):
         self.play_button.setEnabled(True)
         self.save_button.setEnabled(True)
         self.load_button.setEnabled(True)
+        self.simplify_button.setEnabled(True)
+        self.simplify_checkbox.setEnabled(True)
+        self.journal_checkbox.setEnabled(True)
+        self.anchor_checkbox.setEnabled(True)
         
         # 停止录制
         self.recorder.stop_recording()
-        self.update_status.emit("录制完成")
+        count = len(self.recorder.get_actions())
+        if self.recorder.anchor_count:
+            self.update_status.emit(f"录制完成：{count} 个事件，其中 {self.recorder.anchor_count} 个图像锚点")
+        elif self.recorder.filtered_moves:
+            self.update_status.emit(
+                f"录制完成：{count + self.recorder.filtered_moves} → {count} 个事件"
+            )
+        else:
+            self.update_status.emit(f"录制完成：{count} 个事件")
         
         # 更新播放器的动作
         actions = self.recorder.get_actions()
         self.player.set_actions(actions)
+        self._update_duration_label()
     
     def _on_play_clicked(self):
         """
@@ -516,19 +719,21 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "没有录制的动作，请先录制")
             return
         
-        # 如果正在播放，先停止当前回放（处理双击重新启动）
-        if self.is_playing:
+        # 如果正在播放，先停止当前回放（处理双击重新启动）；停止会打断等待，线程很快结束
+        if self.playback_worker.isRunning():
             self.player.stop_playing()
-            # 等待当前回放线程结束
-            time.sleep(0.1)
+            self.playback_worker.wait()
         
         self.is_playing = True
+        self.stop_requested = False
         self.play_button.setEnabled(False)
         self.pause_button.setEnabled(True)
         self.stop_play_button.setEnabled(True)
         self.record_button.setEnabled(False)
         self.save_button.setEnabled(False)
         self.load_button.setEnabled(False)
+        self.simplify_button.setEnabled(False)
+        self._set_timeline_controls_enabled(False)
         
         # 重置暂停按钮状态
         self.pause_button.setText("暂停")
@@ -541,44 +746,66 @@ class MainWindow(QMainWindow):
         current_speed = self.player.get_speed()
         self.player.set_speed(current_speed)
         
-        # 开始回放（在新线程中）
+        # 开始回放（在回放线程中）
         self.update_status.emit("正在回放...")
-        playback_thread = threading.Thread(target=self._playback_thread)
-        playback_thread.daemon = True
-        playback_thread.start()
+        self.metrics.reset()
+        self.metrics_label.setVisible(True)
+        self.playback_generation = self.playback_worker.start_playback()
+        self.metrics_timer.start()
     
-    def _playback_thread(self):
+    def _on_playback_progress(self, position):
         """
-        回放线程
+        回放进度更新（回放线程经 PlaybackWorker 合并后转到界面线程）
         """
-        self.player.start_playing()
+        if self.seek_slider.isSliderDown():
+            return
+        self._set_slider_position(position)
+    
+    def _update_metrics(self):
+        """
+        采样回放指标并显示在指标面板中
+        """
+        self.metrics_label.setText("\n".join(format_metrics(self.metrics.sample())))
+    
+    def _on_playback_finished(self, generation, error):
+        """
+        回放结束处理，在界面线程中恢复按钮状态
+        """
+        if generation != self.playback_generation:
+            # 重新开始回放时，上一次回放的结束通知到达得较晚，忽略
+            return
         self.is_playing = False
         
-        # 更新UI状态
         self.play_button.setEnabled(True)
         self.pause_button.setEnabled(False)
         self.stop_play_button.setEnabled(False)
         self.record_button.setEnabled(True)
         self.save_button.setEnabled(True)
         self.load_button.setEnabled(True)
+        self.simplify_button.setEnabled(True)
+        self._set_timeline_controls_enabled(True)
+        self._update_position()
+        self.metrics_timer.stop()
+        self._update_metrics()
         
-        self.update_status.emit("回放完成")
+        if error:
+            self.update_status.emit(f"回放失败：{error}")
+        elif self.stop_requested:
+            self.update_status.emit("回放已停止")
+        else:
+            self.update_status.emit("回放完成")
     
     def _on_stop_play_clicked(self):
         """
-        停止回放按钮点击事件
+        停止回放按钮点击事件，按钮状态在回放线程结束后恢复
         """
+        if not self.is_playing:
+            return
+        self.stop_requested = True
         self.player.stop_playing()
-        self.is_playing = False
-        
-        self.play_button.setEnabled(True)
         self.pause_button.setEnabled(False)
         self.stop_play_button.setEnabled(False)
-        self.record_button.setEnabled(True)
-        self.save_button.setEnabled(True)
-        self.load_button.setEnabled(True)
-        
-        self.update_status.emit("回放已停止")
+        self.update_status.emit("正在停止回放...")
     
     def _on_save_clicked(self):
         """
@@ -591,20 +818,25 @@ class MainWindow(QMainWindow):
             return
         
         # 打开保存对话框
-        filename, _ = QFileDialog.getSaveFileName(
-            self, "保存动作", "", "JSON Files (*.json)"
+        filename, selected_filter = QFileDialog.getSaveFileName(
+            self, "保存动作", "", MACRO_FILE_FILTER
         )
         
         if filename:
-            # 确保文件扩展名正确
-            if not filename.endswith('.json'):
-                filename += '.json'
+            # 没有扩展名时按所选过滤器补全，格式由扩展名决定
+            extension = os.path.splitext(filename)[1].lower()
+            if extension not in (BINARY_EXTENSION, JSON_EXTENSION):
+                if JSON_EXTENSION in selected_filter:
+                    filename += JSON_EXTENSION
+                else:
+                    filename += BINARY_EXTENSION
             
             # 保存动作
-            if self.recorder.save_actions(filename):
+            try:
+                self.recorder.save_actions(filename)
                 self.update_status.emit(f"动作已保存到 {filename}")
-            else:
-                QMessageBox.error(self, "错误", "保存失败")
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"保存失败: {e}")
     
     def _on_load_clicked(self):
         """
@@ -612,18 +844,78 @@ class MainWindow(QMainWindow):
         """
         # 打开加载对话框
         filename, _ = QFileDialog.getOpenFileName(
-            self, "加载动作", "", "JSON Files (*.json)"
+            self, "加载动作", "", MACRO_OPEN_FILTER
         )
         
         if filename:
-            # 加载动作
-            if self.recorder.load_actions(filename):
-                # 更新播放器的动作
-                actions = self.recorder.get_actions()
-                self.player.set_actions(actions)
-                self.update_status.emit(f"动作已从 {filename} 加载")
-            else:
-                QMessageBox.error(self, "错误", "加载失败")
+            # 在后台线程中加载，避免大文件阻塞界面
+            self._set_file_buttons_enabled(False)
+            self.update_status.emit(f"正在加载 {filename}...")
+            load_thread = threading.Thread(target=self._load_thread, args=(filename,))
+            load_thread.daemon = True
+            load_thread.start()
+    
+    def _load_thread(self, filename):
+        """
+        加载线程：二进制文件以内存映射方式打开，JSON 文件整体解析并编译
+        
+        加载成功后录制器会关闭之前映射的文件，因此先让播放器放开之前的动作，失败时再恢复
+        """
+        self.player.set_actions(ActionBuffer())
+        success = self.recorder.load_actions(filename, lazy=True)
+        # 更新播放器的动作
+        self.player.set_actions(self.recorder.get_actions())
+        if success:
+            # 内存映射的文件需要读取全部时间戳才能算出时长，在加载线程中提前计算
+            self.player.get_projected_duration()
+        self.load_finished.emit(filename, success)
+    
+    def _on_load_finished(self, filename, success):
+        """
+        后台加载完成处理
+        """
+        self._set_file_buttons_enabled(True)
+        if success:
+            count = len(self.recorder.get_actions())
+            self.update_status.emit(f"动作已从 {filename} 加载（{count} 个事件）")
+            self._update_duration_label()
+        else:
+            self.update_status.emit("加载失败")
+            QMessageBox.critical(self, "错误", "加载失败")
+    
+    def _set_file_buttons_enabled(self, enabled):
+        """
+        启用或禁用依赖动作数据的按钮
+        """
+        self.play_button.setEnabled(enabled)
+        self.record_button.setEnabled(enabled)
+        self.save_button.setEnabled(enabled)
+        self.load_button.setEnabled(enabled)
+        self.simplify_button.setEnabled(enabled)
+        self._set_timeline_controls_enabled(enabled)
+    
+    def _set_timeline_controls_enabled(self, enabled):
+        """
+        启用或禁用时间轴设置
+        
+        修改时间轴会替换播放器的时间戳和关键帧索引，回放或加载线程正在使用它们时禁止修改
+        """
+        self.max_gap_checkbox.setEnabled(enabled)
+        self.max_gap_spinbox.setEnabled(enabled)
+        self.fast_moves_checkbox.setEnabled(enabled)
+    
+    def _on_simplify_clicked(self):
+        """
+        简化轨迹按钮点击事件
+        """
+        if not self.recorder.get_actions():
+            QMessageBox.warning(self, "警告", "没有录制的动作，请先录制")
+            return
+        
+        before, after = self.recorder.simplify()
+        self.player.set_actions(self.recorder.get_actions())
+        self._update_duration_label()
+        self.update_status.emit(f"轨迹已简化：{before} → {after} 个事件")
     
     def _update_status_label(self, text):
         """
@@ -638,6 +930,7 @@ class MainWindow(QMainWindow):
         speed = value / 100.0
         self.player.set_speed(speed)
         self.speed_label.setText(f"{speed:.2f}x")
+        self._update_duration_label()
     
     def _on_preset_speed_clicked(self, speed):
         """
@@ -646,6 +939,90 @@ class MainWindow(QMainWindow):
         self.player.set_speed(speed)
         self.speed_slider.setValue(int(speed * 100))
         self.speed_label.setText(f"{speed:.2f}x")
+        self._update_duration_label()
+    
+    def _on_timeline_changed(self, *args):
+        """
+        时间轴设置变化时重新计算变换后的时间轴
+        """
+        max_gap = None
+        if self.max_gap_checkbox.isChecked():
+            max_gap = self.max_gap_spinbox.value() / 1000.0
+        self.player.set_timeline(TimelineTransform(
+            max_gap=max_gap,
+            fast_moves=self.fast_moves_checkbox.isChecked()
+        ))
+        self._update_duration_label()
+    
+    def _update_duration_label(self, *args):
+        """
+        显示按当前时间轴、速度和重复次数计算的预计回放时长
+        """
+        if not len(self.player.actions):
+            self.duration_label.setText("预计回放时长：-")
+            self.seek_slider.setRange(0, 0)
+            self._update_position()
+            return
+        once = self.player.get_projected_duration()
+        repeat = self.repeat_spinbox.value()
+        original = self.player.actions.duration()
+        text = f"预计回放时长：{once:.1f} 秒"
+        if repeat > 1:
+            text += f" × {repeat} = {once * repeat:.1f} 秒"
+        text += f"（录制时长 {original:.1f} 秒）"
+        self.duration_label.setText(text)
+        self.seek_slider.setRange(0, int(once * 1000))
+        self._update_position()
+    
+    def _update_position(self):
+        """
+        按播放器的当前位置更新进度条和位置标签
+        """
+        if self.seek_slider.isSliderDown():
+            return
+        self._set_slider_position(self.player.get_position())
+    
+    def _set_slider_position(self, position):
+        """
+        移动进度条（不触发拖动事件）并更新位置标签
+        """
+        self.seek_slider.blockSignals(True)
+        self.seek_slider.setValue(int(position * 1000))
+        self.seek_slider.blockSignals(False)
+        self._set_position_label(position)
+    
+    def _set_position_label(self, position):
+        """
+        显示 当前位置 / 单次回放时长
+        """
+        duration = self.seek_slider.maximum() / 1000.0
+        self.position_label.setText(f"{format_position(position)} / {format_position(duration)}")
+    
+    def _on_seek_moved(self, value):
+        """
+        拖动进度条时只更新位置标签
+        """
+        self._set_position_label(value / 1000.0)
+    
+    def _on_seek_released(self):
+        """
+        松开进度条时跳转：回放中立即从该位置继续，否则下次开始回放时从该位置开始
+        """
+        if not len(self.player.actions):
+            return
+        self.player.seek_time(self.seek_slider.value() / 1000.0)
+        self._update_position()
+        self.update_status.emit(f"回放位置：{format_position(self.player.get_position())}")
+    
+    def _on_skip_clicked(self, seconds):
+        """
+        快退/快进按钮点击事件
+        """
+        if not len(self.player.actions):
+            return
+        self.player.fast_forward(seconds)
+        self._update_position()
+        self.update_status.emit(f"回放位置：{format_position(self.player.get_position())}")
     
     def _on_pause_clicked(self):
         """
@@ -684,8 +1061,10 @@ class MainWindow(QMainWindow):
         # 停止录制和回放
         if self.is_recording:
             self.recorder.stop_recording()
-        if self.is_playing:
+        if self.playback_worker.isRunning():
+            # 等待回放线程释放按住的按键后再退出
             self.player.stop_playing()
+            self.playback_worker.wait(1000)
         
         # 停止键盘监听器线程
         if hasattr(self, 'keyboard_listener'):
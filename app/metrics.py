@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+回放指标模块
+
+按固定的低频率读取播放器已有的计数，计算吞吐量、延迟、进度和剩余时间：
+- 已执行的事件数和延迟来自 LatenessStats 的计数器和分桶计数，回放线程只累加，
+  采样线程比较两次采样的分桶计数得到区间内的最大延迟，不需要加锁
+- 进度、重复次数、注入失败次数等都是播放器的普通属性
+
+回放线程不为指标做任何额外的工作，采样的开销只与采样频率有关。
+"""
+
+import time
+
+
+# 界面刷新指标的间隔（秒）
+METRICS_INTERVAL = 0.25
+
+
+class PlaybackMetrics:
+    """
+    回放指标采样器
+    
+    每次 sample() 返回一个指标字典，吞吐量和最大延迟按两次采样之间新增的事件计算
+    """
+    
+    def __init__(self, player):
+        """
+        初始化采样器
+        """
+        self.player = player
+        self.reset()
+    
+    def reset(self):
+        """
+        开始新的一次回放前清零累计值
+        """
+        self.timing = None  # 正在读取的 LatenessStats（每次重复一个）
+        self.seen = 0  # 已读取的样本数
+        self.buckets = None  # 上次采样时的分桶计数
+        self.events = 0  # 本次回放累计执行的事件数
+        self.last_sample = time.perf_counter()  # 上次采样的时间
+        self.position = 0.0  # 回放中最后采样到的位置，回放结束后显示
+    
+    def sample(self):
+        """
+        采样一次，返回指标字典（时间单位为秒，延迟单位为毫秒）
+        """
+        player = self.player
+        now = time.perf_counter()
+        
+        # 换到下一次重复时，先补上一次重复中还没读取的样本
+        timing = player.last_timing
+        new_events = 0
+        if timing is not self.timing:
+            if self.timing is not None:
+                new_events += len(self.timing) - self.seen
+            self.timing = timing
+            self.seen = 0
+            self.buckets = None
+        window_max = None
+        if timing is not None:
+            count = len(timing)
+            if count > self.seen:
+                window_max, self.buckets = timing.max_since(self.buckets)
+            new_events += count - self.seen
+            self.seen = count
+        self.events += new_events
+        
+        elapsed = now - self.last_sample
+        self.last_sample = now
+        
+        playing = player.is_playing
+        duration = player.get_projected_duration() if len(player.actions) else 0.0
+        repeat = max(1, player.current_repeat)
+        remaining = None
+        if playing:
+            position = self.position = min(player.get_position(), duration)
+            remaining = (duration - position) + (player.repeat_count - repeat) * duration
+        elif self.events:
+            position = self.position
+        else:
+            position = min(player.get_position(), duration)
+        
+        return {
+            'playing': playing,
+            'paused': player.is_paused,
+            'repeat': player.current_repeat,
+            'repeat_count': player.repeat_count,
+            'events': self.events,
+            'events_per_second': new_events / elapsed if elapsed > 0 and not player.is_paused else 0.0,
+            'lateness_ms': timing.last / 1e6 if timing is not None and len(timing) else None,
+            'max_lateness_ms': window_max / 1e6 if window_max is not None else None,
+            'position': position,
+            'duration': duration,
+            'percent': position / duration * 100 if duration > 0 else 0.0,
+            'eta': remaining,
+            'injection_errors': player.injection_errors,
+            'skipped': player.skipped_actions
+        }
+
+
+def format_metrics(metrics):
+    """
+    把指标格式化为便于阅读的文本行
+    """
+    lines = []
+    progress = f"进度 {metrics['percent']:5.1f}%（{metrics['position']:.1f} / {metrics['duration']:.1f} 秒）"
+    if metrics['repeat_count'] > 1:
+        progress += f"，重复 {metrics['repeat']}/{metrics['repeat_count']}"
+    if metrics['eta'] is not None:
+        progress += f"，剩余约 {metrics['eta']:.1f} 秒"
+    if metrics['paused']:
+        progress += "（已暂停）"
+    lines.append(progress)
+    
+    throughput = f"{metrics['events_per_second']:,.0f} 事件/秒，共 {metrics['events']:,} 个事件"
+    if metrics['lateness_ms'] is not None:
+        throughput += f"，延迟 {metrics['lateness_ms']:.2f} 毫秒"
+    if metrics['max_lateness_ms'] is not None:
+        throughput += f"（区间最大 {metrics['max_lateness_ms']:.2f}）"
+    lines.append(throughput)
+    
+    if metrics['injection_errors'] or metrics['skipped']:
+        lines.append(f"注入失败 {metrics['injection_errors']} 次，无法解析而跳过 {metrics['skipped']} 个动作")
+    return lines
@@ -3,39 +3,267 @@
 动作回放模块
 """
 
+import copy
+import json
+import threading
 import time
-from PySide6.QtCore import QObject, Signal
-from pynput import mouse, keyboard
+from bisect import bisect_left
+from functools import partial
+from app.action_buffer import (
+    ActionBuffer, FLAG_PRESSED, TYPE_MOUSE_MOVE, TYPE_MOUSE_CLICK,
+    TYPE_MOUSE_SCROLL, TYPE_KEY_PRESS, TYPE_KEY_RELEASE, TYPE_ANCHOR, TYPE_WAIT,
+    TYPE_TEXT, WAIT_CONDITIONS
+)
+from app.anchor import AnchorTracker
+from app.capture import default_capture
+from app.input_backend import HeldInput, create_backend
+from app.keyframes import KeyframeIndex, InputState, KEYFRAME_INTERVAL
+from app.waits import (
+    WaitError, WaitTimeoutError, create_condition, wait_for, DEFAULT_TIMEOUT
+)
+from app.prefetch import Prefetcher
+from app.text import text_duration, text_keys
+from app.scheduler import PlaybackScheduler, LatenessStats
+from app.timeline import TimelineTransform
+from app.signals import Signal
 
 
-class Player(QObject):
+def _noop():
     """
-    回放鼠标和键盘动作的类
+    无法解析的动作编译为空操作
+    """
+
+
+def _raise(error):
+    """
+    无法执行的动作编译为在回放到该处时抛出异常
     """
+    raise error
+
+
+class Player:
+    """
+    回放鼠标和键盘动作的类
     
-    # 信号定义
-    repeat_started = Signal(int)  # 重复开始信号，参数为重复次数
+    不依赖 Qt，可以在命令行中使用；界面通过信号回调获取回放状态。
+    鼠标键盘事件通过输入后端（input_backend）注入，默认使用 pynput。
+    批量注入的后端在每批到期的动作执行完、进入等待前统一发送
+    """
     
-    def __init__(self):
+    def __init__(self, backend=None):
         """
         初始化播放器
         """
-        super().__init__()
+        # 信号定义
+        self.repeat_started = Signal()  # 重复开始信号，参数为重复次数，在回放线程中触发
+        self.progress = Signal()  # 回放进度信号，参数为当前位置（秒），每批到期的动作执行完后在回放线程中触发
+        
         self.is_playing = False
         self.is_paused = False
-        self.actions = []
+        self.actions = ActionBuffer()
+        self.plan = []
+        self.timeline = TimelineTransform()  # 回放前的时间轴变换，默认不改变
+        self.timestamps = self.actions.timestamps  # 变换后的时间戳（内存中的动作）
+        self.timeline_duration = None  # 变换后的单次回放时长缓存
         self.repeat_count = 1
         self.current_repeat = 0
         self.current_action_index = 0
+        self.start_index = 0  # 下次开始回放的动作下标，只用于第一次重复
+        self.start_time = 0.0  # start_index 处变换后的时间（秒，未按速度缩放）
+        self.pending_seek = None  # 回放中请求跳转到的动作下标
+        self.keyframes = None  # 关键帧索引，首次跳转时建立
+        self.segment_base = 0  # 正在播放的片段的起始动作下标
+        self.segment_timestamps = None  # 正在播放的片段变换后的时间戳
         self.speed = 1.0  # 播放速度，默认1.0倍
-        self.mouse_controller = mouse.Controller()
-        self.keyboard_controller = keyboard.Controller()
+        self.scheduler = PlaybackScheduler()
+        self.state_changed = threading.Condition()  # 播放/暂停状态变化时通知回放线程
+        self.last_timing = None  # 最近一次重复的延迟统计
+        self.timing_history = []  # 每次重复的延迟统计汇总
+        self.last_error = None  # 最近一次回放中断时的异常
+        self.injection_errors = 0  # 本次回放中注入失败并被忽略的按键次数
+        self.skipped_actions = 0  # 本次回放中因按键或按钮无法解析而跳过的动作数
+        self.held = HeldInput()  # 回放中已按下、尚未释放的按键和鼠标按钮
+        self.capture = None  # 屏幕截图对象，首次遇到锚点或等待步骤时创建
+        self.capture_checked = False
+        self.anchors_enabled = True  # 是否按图像锚点修正鼠标位置
+        self.anchor_tracker = None  # 锚点跟踪器，首次遇到锚点时创建
+        self.anchor_offset = (0, 0)  # 当前锚点偏移，加到之后的鼠标坐标上
+        self.backend = backend if backend is not None else create_backend()
     
     def set_actions(self, actions):
         """
         设置要回放的动作
+        
+        接受 ActionBuffer 或动作字典列表，列表会被转换为 ActionBuffer 并预先编译；
+        内存映射的宏文件（MappedMacro）和组合文档（Composition）等按块提供动作的来源
+        不整体载入，回放时逐块预取和编译
+        """
+        if hasattr(actions, 'iter_buffers'):
+            self.actions = actions
+            self.plan = None
+        else:
+            self.actions = ActionBuffer.from_actions(actions)
+            self.plan = self._compile_plan(self.actions)
+        self.start_index = 0
+        self._apply_timeline()
+        return True
+    
+    def set_timeline(self, transform):
+        """
+        设置时间轴变换（timeline.TimelineTransform），传入 None 恢复录制的时间轴
         """
-        self.actions = actions
+        self.timeline = transform if transform is not None else TimelineTransform()
+        self._apply_timeline()
+        return True
+    
+    def get_projected_duration(self):
+        """
+        获取按当前时间轴变换和播放速度计算的单次回放时长（秒），不含等待步骤的等待时间
+        
+        内存映射的宏文件首次调用时需要读取全部时间戳并建立关键帧索引，结果会被缓存
+        """
+        if self.timeline_duration is None:
+            if self.plan is not None:
+                self.timeline_duration = self.timestamps[-1] if len(self.timestamps) else 0.0
+            else:
+                self.timeline_duration = self._get_keyframes().duration
+        return self.timeline_duration / self.speed
+    
+    def _apply_timeline(self):
+        """
+        预先计算内存中动作变换后的时间戳；内存映射的宏文件在回放时逐块变换
+        
+        时间轴改变后关键帧索引失效，起始位置的时间重新计算
+        """
+        self.timeline_duration = None
+        self.keyframes = None
+        if self.plan is not None:
+            self.timestamps = self.timeline.apply(self.actions)
+        else:
+            self.timestamps = None
+        self.start_index = min(self.start_index, len(self.actions))
+        self.start_time = self.locate(self.start_index)[1]
+    
+    def _get_keyframes(self):
+        """
+        获取关键帧索引，首次调用时建立
+        
+        内存中的动作每 KEYFRAME_INTERVAL 个动作一个关键帧；内存映射的宏文件每个记录块一个关键帧
+        """
+        if self.keyframes is None:
+            if self.plan is not None:
+                actions = self.actions
+                chunks = (
+                    (base, actions[base:base + KEYFRAME_INTERVAL])
+                    for base in range(0, len(actions), KEYFRAME_INTERVAL)
+                )
+            else:
+                chunks = self.actions.iter_buffers()
+            self.keyframes = KeyframeIndex.build(chunks, self.timeline)
+        return self.keyframes
+    
+    def locate(self, index):
+        """
+        获取第 index 个动作执行前的输入状态（keyframes.InputState）和该动作变换后的时间（秒，未按速度缩放）
+        
+        从所在块的关键帧起最多处理一个块的动作；index 为 0 时时间为 0（从头回放），
+        等于动作数时返回结束时的状态和总时长
+        """
+        count = len(self.actions)
+        index = max(0, min(index, count))
+        if index == 0:
+            return InputState(), 0.0
+        keyframes = self._get_keyframes()
+        if index == count:
+            return keyframes.state.copy(), keyframes.duration
+        
+        keyframe = keyframes.find_index(index)
+        state = keyframe.state.copy()
+        if self.plan is not None:
+            state.advance(self.actions, keyframe.index, index)
+            return state, self.timestamps[index]
+        
+        base, buffer = next(self.actions.iter_buffers(keyframe.index))
+        timestamps = copy.copy(keyframe.cursor).advance(buffer)
+        state.advance(buffer, 0, index - base)
+        return state, timestamps[index - base]
+    
+    def find_index(self, seconds):
+        """
+        获取变换后时间不早于 seconds（未按速度缩放）的第一个动作的下标，没有时返回动作数
+        """
+        if self.plan is not None:
+            return bisect_left(self.timestamps, seconds)
+        keyframes = self._get_keyframes()
+        if not keyframes:
+            return 0
+        keyframe = keyframes.find_time(seconds)
+        base, buffer = next(self.actions.iter_buffers(keyframe.index))
+        timestamps = copy.copy(keyframe.cursor).advance(buffer)
+        return base + bisect_left(timestamps, seconds)
+    
+    def seek(self, index):
+        """
+        跳转到第 index 个动作
+        
+        回放中跳转时打断当前的等待，从新位置继续回放，按键和鼠标按钮调整为该位置应有的状态；
+        未在回放时设置下次开始回放的位置
+        """
+        index = max(0, min(index, len(self.actions)))
+        self.start_time = self.locate(index)[1]
+        if self.is_playing:
+            self.pending_seek = index
+            self.scheduler.interrupt()
+        else:
+            self.start_index = index
+            self.current_action_index = index
+        return True
+    
+    def seek_time(self, seconds):
+        """
+        跳转到回放时间 seconds（按当前播放速度计算，与 get_projected_duration 一致）
+        """
+        return self.seek(self.find_index(seconds * self.speed))
+    
+    def fast_forward(self, seconds):
+        """
+        从当前位置向后跳过 seconds 秒（负数为后退）
+        
+        跳过的片段不注入任何事件，只把按住的按键和鼠标按钮调整为新位置应有的状态：
+        片段中按下又释放的输入不会出现，跨过片段仍按住的输入保持按下
+        """
+        return self.seek_time(self.get_position() + seconds)
+    
+    def get_position(self):
+        """
+        获取当前回放位置（秒，按当前播放速度计算）
+        """
+        timestamps = self.segment_timestamps
+        if not self.is_playing or self.pending_seek is not None or timestamps is None:
+            return self.start_time / self.speed
+        i = self.current_action_index - self.segment_base
+        if not 0 <= i < len(timestamps):
+            return self.start_time / self.speed
+        return timestamps[i] / self.speed
+    
+    def set_capture(self, capture):
+        """
+        设置锚点和等待步骤使用的截图对象（capture.ScreenCapture）
+        
+        需要在 set_actions 之前调用
+        """
+        self.capture = capture
+        self.capture_checked = True
+        self.anchor_tracker = None
+        return True
+    
+    def set_anchor_tracker(self, tracker):
+        """
+        设置锚点跟踪器（anchor.AnchorTracker），用于调整查找参数
+        
+        需要在 set_actions 之前调用
+        """
+        self.anchor_tracker = tracker
         return True
     
     def set_repeat_count(self, count):
@@ -66,7 +294,13 @@ class Player(QObject):
         self.is_playing = True
         self.is_paused = False
         self.current_repeat = 0
-        self.current_action_index = 0
+        self.current_action_index = self.start_index
+        self.pending_seek = None
+        self.timing_history = []
+        self.last_error = None
+        self.injection_errors = 0
+        self.skipped_actions = 0
+        self.held = HeldInput()
         
         try:
             while self.is_playing and self.current_repeat < self.repeat_count:
@@ -75,34 +309,52 @@ class Player(QObject):
                 self.repeat_started.emit(self.current_repeat)
                 
                 self._play_actions()
+                self.timing_history.append(self.get_timing_stats())
                 if not self.is_playing:
                     break
                 self.current_action_index = 0
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             self.stop_playing()
+        finally:
+            # 停止、出错或被 Ctrl+C 中断时，释放仍按住的按键和鼠标按钮
+            self._release_held()
         
+        self.is_playing = False
+        self.pending_seek = None
+        self.segment_timestamps = None
+        self.start_index = 0
+        self.start_time = 0.0
         return True
     
     def stop_playing(self):
         """
-        停止回放
+        停止回放，正在等待中的回放线程会被立即唤醒
         """
-        self.is_playing = False
-        self.is_paused = False
+        with self.state_changed:
+            self.is_playing = False
+            self.is_paused = False
+            self.state_changed.notify_all()
+        self.scheduler.interrupt()
         return True
     
     def pause_playing(self):
         """
-        暂停回放
+        暂停回放，正在等待中的回放线程会被立即唤醒并进入暂停
         """
-        self.is_paused = True
+        with self.state_changed:
+            self.is_paused = True
+            self.state_changed.notify_all()
+        self.scheduler.interrupt()
         return True
     
     def resume_playing(self):
         """
         恢复回放
         """
-        self.is_paused = False
+        with self.state_changed:
+            self.is_paused = False
+            self.state_changed.notify_all()
         return True
     
     def get_is_paused(self):
@@ -115,182 +367,449 @@ class Player(QObject):
         """
         回放一组动作
         """
-        if not self.actions:
+        if not len(self.actions):
             return
         
-        start_time = time.time()
+        scheduler = self.scheduler
+        lateness = LatenessStats()
+        self.last_timing = lateness
+        self.anchor_offset = (0, 0)
+        if self.anchor_tracker is not None:
+            self.anchor_tracker.reset()
         
-        # 从当前动作索引开始播放
-        for i in range(self.current_action_index, len(self.actions)):
-            if not self.is_playing:
-                break
+        # 从当前动作索引开始，逐段播放；回放中跳转后从新位置重新开始
+        start_index = self.current_action_index
+        while True:
+            scheduler.start()
+            if start_index or self.held:
+                state, start_time = self.locate(start_index)
+                self._restore_state(state)
+                scheduler.shift(-int(start_time * 1e9 / self.speed))
             
-            # 检查是否暂停
-            while self.is_paused:
-                time.sleep(0.01)  # Reduced sleep time from 0.1s to 0.01s for faster response
-                if not self.is_playing:
-                    break
+            segments = self._iter_segments(start_index)
+            try:
+                for base, timestamps, plan in segments:
+                    first = max(0, start_index - base)
+                    if not self._play_segment(base, timestamps, plan, first, lateness.record):
+                        break
+            finally:
+                segments.close()
             
-            if not self.is_playing:
+            seek = self.pending_seek
+            if seek is None or not self.is_playing:
                 break
+            self.pending_seek = None
+            self.current_action_index = start_index = seek
+            self.start_time = self.locate(seek)[1]
+        
+        # 重置当前动作索引
+        self.current_action_index = 0
+    
+    def _restore_state(self, state):
+        """
+        把实际按住的输入（self.held）调整为 state（keyframes.InputState）：
+        释放多余的按键和鼠标按钮，移动光标，再按下缺少的按钮和按键
+        """
+        held = self.held
+        backend = self.backend
+        keys = [key for key in map(self._resolve_key, state.keys) if key is not None]
+        buttons = [button for button in map(self._resolve_button, state.buttons) if button is not None]
+        
+        for key in reversed(list(held.keys)):
+            if key not in keys:
+                self._release(key)
+        for button in reversed(list(held.buttons)):
+            if button not in buttons:
+                backend.release_button(button)
+                del held.buttons[button]
+        if state.x is not None:
+            self._move_to(state.x, state.y)
+        for button in buttons:
+            if button not in held.buttons:
+                backend.press_button(button)
+                held.buttons[button] = None
+        for key in keys:
+            if key not in held.keys:
+                self._press(key)
+        backend.flush()
+    
+    def _release_held(self):
+        """
+        释放所有按住的按键和鼠标按钮
+        """
+        if self.held:
+            self.injection_errors += self.held.release_all(self.backend)
+    
+    def _iter_segments(self, start_index):
+        """
+        产生待播放的片段 (起始动作下标, 时间戳列, 回放计划)
+        
+        内存中的动作只有一个预先编译好的片段；
+        内存映射的宏文件由后台线程逐块解码、编译，提前准备好后续片段
+        """
+        if self.plan is not None:
+            yield 0, self.timestamps, self.plan
+            return
+        
+        chunks = self.actions.iter_buffers(start_index)
+        if start_index:
+            # 从所在块的关键帧游标继续变换时间戳
+            cursor = copy.copy(self._get_keyframes().find_index(start_index).cursor)
+        else:
+            cursor = self.timeline.cursor()
+        with Prefetcher(chunks, partial(self._compile_segment, cursor)) as prefetcher:
+            yield from prefetcher
+    
+    def _compile_segment(self, cursor, chunk):
+        """
+        编译内存映射文件中的一个块，并按顺序变换其时间戳
+        """
+        base, buffer = chunk
+        return base, cursor.advance(buffer), self._compile_plan(buffer)
+    
+    def _play_segment(self, base, timestamps, plan, i, record):
+        """
+        从第 i 个动作开始播放一个片段，被停止时返回 False
+        """
+        scheduler = self.scheduler
+        clock = scheduler.now
+        flush = self.backend.flush
+        progress = self.progress
+        count = len(plan)
+        self.segment_base = base
+        self.segment_timestamps = timestamps
+        while i < count:
+            if not self.is_playing or self.pending_seek is not None:
+                return False
             
-            action = self.actions[i]
-            self.current_action_index = i
+            # 检查是否暂停
+            if self.is_paused:
+                self._wait_while_paused(base + i)
+                continue
             
             # 等待到动作应该执行的时间，考虑播放速度
-            expected_time = action['timestamp'] / self.speed
-            actual_time = time.time() - start_time
-            if expected_time > actual_time:
-                time.sleep(expected_time - actual_time)
+            scale = 1e9 / self.speed
+            now = scheduler.wait_until(int(timestamps[i] * scale))
+            if now is None:
+                # 等待被暂停或停止打断，回到循环开头重新检查状态
+                scheduler.clear_interrupt()
+                continue
             
-            # 执行动作
-            self._execute_action(action)
+            # 依次执行所有已到期的动作，不再逐个进入等待
+            while i < count:
+                target = int(timestamps[i] * scale)
+                if target > now or not self.is_playing or self.is_paused or self.pending_seek is not None:
+                    break
+                self.current_action_index = base + i
+                handler, args = plan[i]
+                handler(*args)
+                record(now - target)
+                i += 1
+                now = clock()
+            flush()
+            if progress.slots:
+                progress.emit(self.get_position())
         
-        # 重置当前动作索引
-        self.current_action_index = 0
+        return self.is_playing and self.pending_seek is None
+    
+    def _wait_while_paused(self, next_index):
+        """
+        阻塞直到恢复或停止，并从时间轴中扣除暂停的时长
+        
+        暂停期间释放所有按住的按键和鼠标按钮，恢复时按第 next_index 个动作之前的状态重新按下；
+        暂停中跳转或停止时由跳转或停止的处理恢复、释放
+        """
+        paused_at = time.perf_counter_ns()
+        self._release_held()
+        with self.state_changed:
+            while self.is_paused and self.is_playing:
+                self.state_changed.wait()
+        if self.is_playing and self.pending_seek is None:
+            self._restore_state(self.locate(next_index)[0])
+        self.scheduler.shift(time.perf_counter_ns() - paused_at)
+        self.scheduler.clear_interrupt()
+    
+    def get_timing_stats(self):
+        """
+        获取最近一次重复的回放时间统计（延迟 p50/p99/最大值等，单位毫秒）
+        """
+        if self.last_timing is None:
+            return None
+        return self.last_timing.summary()
     
     def _execute_action(self, action):
         """
-        执行单个动作
+        执行单个动作字典
+        """
+        buffer = ActionBuffer()
+        buffer.append(action)
+        handler, args = self._compile_plan(buffer)[0]
+        handler(*args)
+        self.backend.flush()
+    
+    def _compile_plan(self, actions):
+        """
+        把动作编译为回放计划
+        
+        计划中的每一步是 (处理函数, 参数元组)，与动作一一对应。
+        按键名和鼠标按钮名在编译时按字符串表解析一次，
+        回放时只需调用处理函数，不再做类型判断和字符串解析。
+        """
+        keys = [self._resolve_key(text) for text in actions.strings]
+        buttons = [self._resolve_button(text) for text in actions.strings]
+        
+        def compile_move(i):
+            return self._move_to, (actions.x[i], actions.y[i])
+        
+        def compile_click(i):
+            button = buttons[actions.string_ids[i]]
+            if button is None:
+                return self._skip, ()
+            if actions.flags[i] & FLAG_PRESSED:
+                return self._click_press, (actions.x[i], actions.y[i], button)
+            return self._click_release, (actions.x[i], actions.y[i], button)
+        
+        def compile_scroll(i):
+            return self.backend.scroll, actions.scroll_amount(i)
+        
+        def compile_key_press(i):
+            key = keys[actions.string_ids[i]]
+            if key is None:
+                return self._skip, ()
+            return self._press, (key,)
+        
+        def compile_key_release(i):
+            key = keys[actions.string_ids[i]]
+            if key is None:
+                return self._skip, ()
+            return self._release, (key,)
+        
+        def compile_anchor(i):
+            tracker = self._get_anchor_tracker()
+            if tracker is None:
+                return _noop, ()
+            matcher = tracker.get_matcher(actions.get_string(actions.string_ids[i]))
+            if matcher is None:
+                return _noop, ()
+            return self._resolve_anchor, (
+                tracker, matcher, actions.x[i], actions.y[i], actions.dx[i], actions.dy[i]
+            )
+        
+        def compile_wait(i):
+            capture = self._get_capture()
+            if capture is None:
+                return _raise, (WaitError("等待步骤需要截图支持（opencv-python、numpy 以及 mss 或 Pillow）"),)
+            text = actions.get_string(actions.string_ids[i])
+            params = json.loads(text) if text is not None else {}
+            try:
+                condition = create_condition(
+                    WAIT_CONDITIONS[actions.flags[i]],
+                    actions.x[i], actions.y[i], actions.dx[i], actions.dy[i],
+                    params
+                )
+            except WaitError as e:
+                return _raise, (e,)
+            return self._wait, (
+                capture, condition,
+                params.get('timeout', DEFAULT_TIMEOUT),
+                params.get('on_timeout', 'fail') != 'continue'
+            )
+        
+        def compile_text(i):
+            try:
+                names = text_keys(actions.get_string(actions.string_ids[i]) or '')
+            except ValueError as e:
+                return _raise, (e,)
+            return self._type_text, ([self._resolve_key(name) for name in names], actions.dx[i] / 1e6)
+        
+        compilers = {
+            TYPE_MOUSE_MOVE: compile_move,
+            TYPE_MOUSE_CLICK: compile_click,
+            TYPE_MOUSE_SCROLL: compile_scroll,
+            TYPE_KEY_PRESS: compile_key_press,
+            TYPE_KEY_RELEASE: compile_key_release,
+            TYPE_ANCHOR: compile_anchor,
+            TYPE_WAIT: compile_wait,
+            TYPE_TEXT: compile_text,
+        }
+        
+        return [compilers[type_code](i) for i, type_code in enumerate(actions.types)]
+    
+    def _resolve_key(self, key_str):
+        """
+        把录制的按键字符串解析为可直接回放的按键对象
+        """
+        return self.backend.resolve_key(key_str)
+    
+    def _resolve_button(self, button_str):
+        """
+        把录制的鼠标按钮字符串解析为按钮对象
+        """
+        return self.backend.resolve_button(button_str)
+    
+    def _get_anchor_tracker(self):
         """
-        action_type = action['type']
+        获取锚点跟踪器，未设置时尝试使用默认屏幕来源创建
         
-        if action_type == 'mouse_move':
-            self._execute_mouse_move(action)
-        elif action_type == 'mouse_click':
-            self._execute_mouse_click(action)
-        elif action_type == 'mouse_scroll':
-            self._execute_mouse_scroll(action)
-        elif action_type == 'key_press':
-            self._execute_key_press(action)
-        elif action_type == 'key_release':
-            self._execute_key_release(action)
+        锚点被关闭或 OpenCV/截图不可用时返回 None，锚点动作编译为空操作
+        """
+        if not self.anchors_enabled:
+            return None
+        if self.anchor_tracker is None:
+            capture = self._get_capture()
+            if capture is not None:
+                self.anchor_tracker = AnchorTracker(capture)
+        return self.anchor_tracker
+    
+    def _get_capture(self):
+        """
+        获取截图对象，未设置时尝试创建默认的截图对象，不可用时返回 None
+        """
+        if self.capture is None and not self.capture_checked:
+            self.capture_checked = True
+            self.capture = default_capture()
+        return self.capture
     
-    def _execute_mouse_move(self, action):
+    def _resolve_anchor(self, tracker, matcher, x, y, template_x, template_y):
         """
-        执行鼠标移动
+        查找锚点，更新之后鼠标动作使用的偏移
         """
-        x = action['x']
-        y = action['y']
-        self.mouse_controller.position = (x, y)
+        # 先发送之前的事件，截图时画面已经响应了之前的操作
+        self.backend.flush()
+        self.anchor_offset = tracker.resolve(matcher, x, y, template_x, template_y)
     
-    def _execute_mouse_click(self, action):
+    def _wait(self, capture, condition, timeout, fail_on_timeout):
         """
-        执行鼠标点击
+        等待屏幕条件满足
+        
+        暂停时中断轮询，恢复后继续等待剩余的超时时间；
+        等待所用的时间从时间轴中扣除，之后的动作从等待结束时起按原来的间隔回放
         """
-        x = action['x']
-        y = action['y']
-        button = action['button']
-        pressed = action['pressed']
+        scheduler = self.scheduler
+        self.backend.flush()
         
-        # 移动到点击位置
-        self.mouse_controller.position = (x, y)
+        def cancelled():
+            return not self.is_playing or self.is_paused or self.pending_seek is not None
         
-        # 确定按钮类型
-        if 'left' in button:
-            mouse_button = mouse.Button.left
-        elif 'right' in button:
-            mouse_button = mouse.Button.right
-        elif 'middle' in button:
-            mouse_button = mouse.Button.middle
-        else:
-            return
+        waited_ns = 0
+        while True:
+            started = time.perf_counter_ns()
+            result = wait_for(
+                condition, capture, max(0.0, timeout - waited_ns / 1e9),
+                scheduler.wakeup.wait, cancelled
+            )
+            waited_ns += time.perf_counter_ns() - started
+            if result is None and self.is_playing and self.is_paused:
+                # 暂停的时长由 _wait_while_paused 扣除；等待步骤不改变按键状态
+                self._wait_while_paused(self.current_action_index)
+                continue
+            break
         
-        # 执行点击
-        if pressed:
-            self.mouse_controller.press(mouse_button)
-        else:
-            self.mouse_controller.release(mouse_button)
+        scheduler.shift(waited_ns)
+        if result is False and fail_on_timeout:
+            raise WaitTimeoutError(f"等待超时（{timeout} 秒）: {condition!r}")
     
-    def _execute_mouse_scroll(self, action):
+    def _type_text(self, keys, interval):
         """
-        执行鼠标滚轮
+        输入文字：逐个字符按下并释放
+        
+        interval 为 0 时连续注入全部字符，由后端一次发送；否则按 interval / 播放速度的间隔输入，
+        暂停时在字符之间停下，恢复后继续输入剩余的字符。
+        输入超出计划时长的部分从时间轴中扣除，之后的动作从输入结束时起按原来的间隔回放
+        """
+        scheduler = self.scheduler
+        flush = self.backend.flush
+        step = int(interval * 1e9 / self.speed)
+        flush()
+        started = scheduler.now()
+        for k, key in enumerate(keys):
+            if step and k:
+                while scheduler.wait_until(started + k * step) is None:
+                    scheduler.clear_interrupt()
+                    if self.is_playing and self.is_paused and self.pending_seek is None:
+                        self._wait_while_paused(self.current_action_index)
+                    if not self.is_playing or self.pending_seek is not None:
+                        return
+            elif not self.is_playing or self.pending_seek is not None:
+                return
+            if key is None:
+                self._skip()
+                continue
+            self._press(key)
+            self._release(key)
+            if step:
+                flush()
+        flush()
+        overrun = scheduler.now() - (started + text_duration(len(keys), step))
+        if overrun > 0:
+            scheduler.shift(overrun)
+    
+    def _move_to(self, x, y):
+        """
+        移动鼠标
         """
-        dx = action['dx']
-        dy = action['dy']
-        self.mouse_controller.scroll(dx, dy)
+        offset_x, offset_y = self.anchor_offset
+        self.backend.move(x + offset_x, y + offset_y)
     
-    def _execute_key_press(self, action):
+    def _click_press(self, x, y, button):
         """
-        执行键盘按下
+        移动到点击位置并按下鼠标按钮
         """
-        key = action['key']
-        self._press_key(key)
+        offset_x, offset_y = self.anchor_offset
+        self.backend.move(x + offset_x, y + offset_y)
+        self.backend.press_button(button)
+        self.held.buttons[button] = None
     
-    def _execute_key_release(self, action):
+    def _click_release(self, x, y, button):
         """
-        执行键盘释放
+        移动到点击位置并释放鼠标按钮
         """
-        key = action['key']
-        self._release_key(key)
+        offset_x, offset_y = self.anchor_offset
+        self.backend.move(x + offset_x, y + offset_y)
+        self.backend.release_button(button)
+        self.held.buttons.pop(button, None)
     
-    def _press_key(self, key):
+    def _skip(self):
         """
-        按下键盘按键
+        按键或鼠标按钮无法解析的动作编译为跳过，并计数
+        """
+        self.skipped_actions += 1
+    
+    def _press(self, key):
+        """
+        按下已解析的按键
         """
         try:
-            # 尝试直接按下字符键
-            if len(key) == 1 and key.isprintable():
-                self.keyboard_controller.press(key)
-            else:
-                # 处理特殊按键
-                special_key = self._get_special_key(key)
-                if special_key:
-                    self.keyboard_controller.press(special_key)
+            self.backend.press_key(key)
+            self.held.keys[key] = None
         except Exception:
-            pass
+            self.injection_errors += 1
     
-    def _release_key(self, key):
+    def _release(self, key):
         """
-        释放键盘按键
+        释放已解析的按键
         """
         try:
-            # 尝试直接释放字符键
-            if len(key) == 1 and key.isprintable():
-                self.keyboard_controller.release(key)
-            else:
-                # 处理特殊按键
-                special_key = self._get_special_key(key)
-                if special_key:
-                    self.keyboard_controller.release(special_key)
+            self.backend.release_key(key)
+            self.held.keys.pop(key, None)
         except Exception:
-            pass
-    
-    def _get_special_key(self, key_str):
-        """
-        获取特殊按键对象
-        """
-        key_map = {
-            'Key.esc': keyboard.Key.esc,
-            'Key.tab': keyboard.Key.tab,
-            'Key.caps_lock': keyboard.Key.caps_lock,
-            'Key.shift': keyboard.Key.shift,
-            'Key.ctrl_l': keyboard.Key.ctrl_l,
-            'Key.alt_l': keyboard.Key.alt_l,
-            'Key.space': keyboard.Key.space,
-            'Key.enter': keyboard.Key.enter,
-            'Key.backspace': keyboard.Key.backspace,
-            'Key.right': keyboard.Key.right,
-            'Key.left': keyboard.Key.left,
-            'Key.down': keyboard.Key.down,
-            'Key.up': keyboard.Key.up,
-            'Key.ctrl_r': keyboard.Key.ctrl_r,
-            'Key.alt_r': keyboard.Key.alt_r,
-            'Key.print_screen': keyboard.Key.print_screen,
-            'Key.scroll_lock': keyboard.Key.scroll_lock,
-            'Key.pause': keyboard.Key.pause,
-            'Key.insert': keyboard.Key.insert,
-            'Key.home': keyboard.Key.home,
-            'Key.page_up': keyboard.Key.page_up,
-            'Key.delete': keyboard.Key.delete,
-            'Key.end': keyboard.Key.end,
-            'Key.page_down': keyboard.Key.page_down,
-            'Key.num_lock': keyboard.Key.num_lock,
-            'Key.cmd': keyboard.Key.cmd,
-            'Key.cmd_r': keyboard.Key.cmd_r,
-        }
-        
-        return key_map.get(key_str)
+            self.injection_errors += 1
+    
+    def _press_key(self, key):
+        """
+        按下键盘按键
+        """
+        resolved = self._resolve_key(key)
+        if resolved is not None:
+            self._press(resolved)
+    
+    def _release_key(self, key):
+        """
+        释放键盘按键
+        """
+        resolved = self._resolve_key(key)
+        if resolved is not None:
+            self._release(resolved)
     
     def get_is_playing(self):
         """
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+预取模块
+
+在后台线程中提前读取并处理数据块，回放线程从有界队列中取用，
+读取文件和编译回放计划的耗时不会占用回放时间轴。
+"""
+
+import queue
+import threading
+
+
+# 默认预取的块数
+DEFAULT_DEPTH = 4
+
+# 结束标记
+_END = object()
+
+
+class Prefetcher:
+    """
+    后台预取迭代器
+    
+    在后台线程中依次对 source 的每个元素调用 transform，
+    结果放入容量为 depth 的队列，迭代 Prefetcher 时按顺序取出。
+    后台线程中的异常会在迭代时重新抛出。
+    """
+    
+    def __init__(self, source, transform=None, depth=DEFAULT_DEPTH):
+        """
+        初始化并启动后台线程
+        """
+        self.source = source
+        self.transform = transform
+        self.queue = queue.Queue(maxsize=max(1, depth))
+        self.stopped = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield item
+    
+    def close(self):
+        """
+        停止预取并等待后台线程退出
+        """
+        self.stopped.set()
+        self.thread.join()
+    
+    def _run(self):
+        """
+        后台线程：读取、处理并放入队列
+        """
+        try:
+            for item in self.source:
+                if self.stopped.is_set():
+                    break
+                if self.transform is not None:
+                    item = self.transform(item)
+                if not self._put(item):
+                    break
+        except Exception as e:
+            self.error = e
+        self._put(_END)
+    
+    def _put(self, item):
+        """
+        放入队列，停止后放弃
+        """
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                pass
+        return False
@@ -3,54 +3,158 @@
 鼠标和键盘动作录制模块
 """
 
+import os
+import threading
 import time
+from collections import deque
 from datetime import datetime
-from pynput import mouse, keyboard
+from app.action_buffer import (
+    ActionBuffer, TYPE_MOUSE_MOVE, TYPE_MOUSE_CLICK, TYPE_MOUSE_SCROLL,
+    TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+)
+from app.macro_format import (
+    save_macro, load_macro, open_macro, MacroWriter, FLAG_JOURNAL, BINARY_EXTENSION
+)
+from app.simplify import simplify_actions
+from app.anchor import encode_template, TemplateGrabber, DEFAULT_TEMPLATE_SIZE
+from app.input_backend import create_backend
+
+
+# 事件队列默认容量，超出后丢弃新事件并计数（见 Recorder._enqueue）
+DEFAULT_QUEUE_CAPACITY = 1 << 16
+
+# 消费线程处理完队列后的等待间隔（秒）
+CONSUMER_INTERVAL = 0.005
+
+# 日志模式下每批写入的事件数和最长写入间隔（秒）
+JOURNAL_BATCH_SIZE = 1024
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+# 默认的日志文件目录
+JOURNAL_DIR = 'recordings'
+
+
+def default_journal_path(directory=JOURNAL_DIR):
+    """
+    生成按时间命名的日志文件路径
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = datetime.now().strftime('record_%Y%m%d_%H%M%S') + BINARY_EXTENSION
+    return os.path.join(directory, name)
 
 
 class Recorder:
     """
     录制鼠标和键盘动作的类
+    
+    pynput 的回调运行在系统钩子线程上，回调过慢会导致系统丢弃或延迟用户输入。
+    因此回调只把 (类型, 时间戳, 原始参数...) 元组放入队列后立即返回，
+    由单独的消费线程完成时间换算、按键名转换、轨迹过滤和存储。
+    队列使用 collections.deque，append/popleft 本身是原子操作，生产者无需加锁。
+    队列满时丢弃新到的事件，已入队的事件不会被丢弃；丢弃数按回调线程分别计数，读取时求和。
+    监听器由输入后端（input_backend）创建，默认使用 pynput。
     """
     
-    def __init__(self):
+    def __init__(self, queue_capacity=DEFAULT_QUEUE_CAPACITY, backend=None):
         """
         初始化录制器
         """
         self.is_recording = False
-        self.actions = []
-        self.start_time = None
-        self.mouse_listener = None
-        self.keyboard_listener = None
+        self.actions = ActionBuffer()
+        self.start_ns = 0
+        self.backend = backend if backend is not None else create_backend()
+        self.listeners = []
+        self.move_filter = None  # 录制时的轨迹过滤器，None 表示保存全部移动点
+        self.filtered_moves = 0  # 本次录制中被过滤器丢弃的移动点数
+        self.anchor_source = None  # 录制图像锚点使用的屏幕来源，None 表示不录制锚点
+        self.anchor_size = DEFAULT_TEMPLATE_SIZE
+        self.anchor_grabber = None  # 录制期间截取锚点模板的后台线程
+        self.anchor_count = 0  # 本次录制中保存的锚点数
+        
+        # 回调线程与消费线程之间的事件队列
+        self.event_queue = deque()
+        self.queue_capacity = queue_capacity
+        self.drop_counts = {}  # 回调线程 id 到该线程丢弃的事件数，每个线程只写自己的计数
+        self.max_queue_depth = 0  # 消费线程观察到的最大队列深度
+        self.consumer_thread = None
+        self.consumer_stop = threading.Event()
+        
+        # 日志模式：边录制边把事件批量追加到文件
+        self.journal_path = None
+        self.journal_file = None
+        self.journal_writer = None
+        self.journal_flushed_at = 0.0
+    
+    def set_move_filter(self, move_filter):
+        """
+        设置录制时使用的轨迹过滤器（simplify.MoveFilter），传入 None 关闭过滤
+        """
+        self.move_filter = move_filter
+        return True
     
-    def start_recording(self):
+    def set_anchor_source(self, source, size=DEFAULT_TEMPLATE_SIZE):
+        """
+        设置录制图像锚点使用的截图对象（capture.ScreenCapture），传入 None 关闭锚点
+        
+        开启后每次鼠标按下时截取点击位置周围 size 像素的模板，作为锚点保存在点击之前。
+        截图在 anchor.TemplateGrabber 的后台线程中进行，录制开始时启动
+        """
+        self.anchor_source = source
+        self.anchor_size = size
+        return True
+    
+    def start_recording(self, journal_path=None):
         """
         开始录制
+        
+        指定 journal_path 时进入日志模式：消费线程每攒够一批事件就追加写入日志文件
+        并同步到磁盘，随后从内存中清除，内存占用不随录制时长增长。
+        程序崩溃或断电时，日志文件可以恢复到最后一个写入完成的批次。
         """
+        self.actions = ActionBuffer()
+        self.filtered_moves = 0
+        self.anchor_count = 0
+        self.event_queue.clear()
+        self.drop_counts = {}
+        self.max_queue_depth = 0
+        if self.move_filter is not None:
+            self.move_filter.reset()
+        
+        # 打开日志文件
+        self.journal_path = journal_path
+        if journal_path:
+            self.journal_file = open(journal_path, 'wb')
+            self.journal_writer = MacroWriter(self.journal_file, flags=FLAG_JOURNAL)
+            self._sync_journal()
+            self.journal_flushed_at = time.monotonic()
+        
+        # 启动锚点截图线程和消费线程
+        if self.anchor_source is not None:
+            self.anchor_grabber = TemplateGrabber(self.anchor_source, self.anchor_size)
+            self.anchor_grabber.start()
+        self.consumer_stop.clear()
+        self.consumer_thread = threading.Thread(target=self._consume_events, daemon=True)
+        self.consumer_thread.start()
+        
+        self.start_ns = time.perf_counter_ns()
         self.is_recording = True
-        self.actions = []
-        self.start_time = time.time()
-        
-        # 开始监听鼠标事件
-        self.mouse_listener = mouse.Listener(
-            on_move=self.on_mouse_move,
-            on_click=self.on_mouse_click,
-            on_scroll=self.on_mouse_scroll
-        )
-        self.mouse_listener.start()
         
-        # 开始监听键盘事件
-        self.keyboard_listener = keyboard.Listener(
-            on_press=self.on_key_press,
-            on_release=self.on_key_release
+        # 开始监听鼠标和键盘事件
+        self.listeners = self.backend.create_listeners(
+            self.on_mouse_move,
+            self.on_mouse_click,
+            self.on_mouse_scroll,
+            self.on_key_press,
+            self.on_key_release
         )
-        self.keyboard_listener.start()
+        for listener in self.listeners:
+            listener.start()
         
         return True
     
     def stop_recording(self):
         """
-        停止录制
+        停止录制，等待消费线程处理完队列中剩余的事件
         """
         if not self.is_recording:
             return False
@@ -58,123 +162,250 @@ class Recorder:
         self.is_recording = False
         
         # 停止监听
-        if self.mouse_listener:
-            self.mouse_listener.stop()
-        if self.keyboard_listener:
-            self.keyboard_listener.stop()
+        for listener in self.listeners:
+            listener.stop()
+        self.listeners = []
+        
+        # 停止消费线程
+        self.consumer_stop.set()
+        if self.consumer_thread:
+            self.consumer_thread.join()
+            self.consumer_thread = None
+        self._flush_pending_move()
+        
+        # 消费线程已取走所有锚点请求的结果，最后停止截图线程
+        if self.anchor_grabber is not None:
+            self.anchor_grabber.stop()
+            self.anchor_grabber = None
+        
+        # 写出剩余事件并关闭日志，随后以内存映射方式打开完整的录制结果
+        if self.journal_writer:
+            self._flush_journal()
+            self.journal_file.close()
+            self.journal_writer = None
+            self.journal_file = None
+            self.actions = open_macro(self.journal_path)
         
         return True
     
+    def get_queue_depth(self):
+        """
+        获取当前队列中尚未处理的事件数
+        """
+        return len(self.event_queue)
+    
+    @property
+    def dropped_events(self):
+        """
+        队列已满时丢弃的事件数（各回调线程的计数之和）
+        """
+        return sum(self.drop_counts.copy().values())
+    
+    def _enqueue(self, event):
+        """
+        把事件放入队列，队列已满时丢弃这个新事件并计数
+        
+        不加锁：检查长度和入队之间其他回调线程可能也在入队，队列最多超出容量
+        “回调线程数 - 1” 个事件（pynput 的鼠标和键盘各一个线程）。
+        计数写在当前线程自己的条目中，不会因多个线程同时加一而丢失
+        """
+        if len(self.event_queue) >= self.queue_capacity:
+            drop_counts = self.drop_counts
+            thread_id = threading.get_ident()
+            drop_counts[thread_id] = drop_counts.get(thread_id, 0) + 1
+            return
+        self.event_queue.append(event)
+    
     def on_mouse_move(self, x, y):
         """
         鼠标移动事件处理
         """
-        if not self.is_recording:
-            return
-        
-        timestamp = time.time() - self.start_time
-        self.actions.append({
-            'type': 'mouse_move',
-            'x': x,
-            'y': y,
-            'timestamp': timestamp
-        })
+        if self.is_recording:
+            self._enqueue((TYPE_MOUSE_MOVE, time.perf_counter_ns(), x, y))
+            if self.anchor_grabber is not None:
+                self.anchor_grabber.move(x, y)
     
     def on_mouse_click(self, x, y, button, pressed):
         """
         鼠标点击事件处理
-        """
-        if not self.is_recording:
-            return
         
-        timestamp = time.time() - self.start_time
-        self.actions.append({
-            'type': 'mouse_click',
-            'x': x,
-            'y': y,
-            'button': str(button),
-            'pressed': pressed,
-            'timestamp': timestamp
-        })
+        录制锚点时在按下的回调中请求模板：点击送达应用后菜单、按钮等很快会重绘，
+        等消费线程处理时再截图截到的已不是点击时的画面。回调中不截图，
+        只从截图线程预截的区域复制模板像素（见 anchor.TemplateGrabber），
+        请求随事件一起放入队列，消费线程取出结果后编码
+        """
+        if self.is_recording:
+            timestamp = time.perf_counter_ns()
+            anchor = None
+            if pressed and self.anchor_grabber is not None:
+                anchor = self.anchor_grabber.request(round(x), round(y))
+            self._enqueue((TYPE_MOUSE_CLICK, timestamp, x, y, button, pressed, anchor))
     
     def on_mouse_scroll(self, x, y, dx, dy):
         """
         鼠标滚轮事件处理
         """
-        if not self.is_recording:
-            return
-        
-        timestamp = time.time() - self.start_time
-        self.actions.append({
-            'type': 'mouse_scroll',
-            'x': x,
-            'y': y,
-            'dx': dx,
-            'dy': dy,
-            'timestamp': timestamp
-        })
+        if self.is_recording:
+            self._enqueue((TYPE_MOUSE_SCROLL, time.perf_counter_ns(), x, y, dx, dy))
     
     def on_key_press(self, key):
         """
         键盘按下事件处理
         """
-        if not self.is_recording:
-            return
-        
-        timestamp = time.time() - self.start_time
-        try:
-            key_str = key.char
-        except AttributeError:
-            key_str = str(key)
-        
-        self.actions.append({
-            'type': 'key_press',
-            'key': key_str,
-            'timestamp': timestamp
-        })
+        if self.is_recording:
+            self._enqueue((TYPE_KEY_PRESS, time.perf_counter_ns(), key))
     
     def on_key_release(self, key):
         """
         键盘释放事件处理
         """
-        if not self.is_recording:
+        if self.is_recording:
+            self._enqueue((TYPE_KEY_RELEASE, time.perf_counter_ns(), key))
+    
+    def _consume_events(self):
+        """
+        消费线程：批量取出队列中的事件并存储
+        """
+        queue = self.event_queue
+        while True:
+            stopping = self.consumer_stop.is_set()
+            depth = len(queue)
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+            
+            journal = self.journal_writer is not None
+            while queue:
+                self._store_event(queue.popleft())
+                if journal and len(self.actions) >= JOURNAL_BATCH_SIZE:
+                    self._flush_journal()
+            
+            if journal and time.monotonic() - self.journal_flushed_at >= JOURNAL_FLUSH_INTERVAL:
+                self._flush_journal()
+            
+            if stopping:
+                return
+            self.consumer_stop.wait(CONSUMER_INTERVAL)
+    
+    def _store_event(self, event):
+        """
+        把队列中的原始事件转换后存入动作缓冲区
+        """
+        type_code = event[0]
+        timestamp = (event[1] - self.start_ns) / 1e9
+        
+        if type_code == TYPE_MOUSE_MOVE:
+            x, y = event[2], event[3]
+            if self.move_filter is not None and not self.move_filter.accept(x, y, timestamp):
+                self.filtered_moves += 1
+                return
+            self.actions.append_move(x, y, timestamp)
             return
         
-        timestamp = time.time() - self.start_time
+        self._flush_pending_move()
+        if type_code == TYPE_MOUSE_CLICK:
+            _, _, x, y, button, pressed, anchor = event
+            if anchor is not None:
+                self._store_anchor(x, y, anchor, timestamp)
+            self.actions.append_click(x, y, str(button), pressed, timestamp)
+        elif type_code == TYPE_MOUSE_SCROLL:
+            _, _, x, y, dx, dy = event
+            self.actions.append_scroll(x, y, dx, dy, timestamp)
+        else:
+            key = event[2]
+            try:
+                key_str = key.char
+            except AttributeError:
+                key_str = str(key)
+            self.actions.append_key(type_code, key_str, timestamp)
+    
+    def _store_anchor(self, x, y, pending, timestamp):
+        """
+        取出点击时请求的模板，编码后保存为锚点；截图失败、纹理不足或编码失败时只跳过锚点
+        """
+        anchor = pending.wait()
+        if anchor is None:
+            return
+        template, template_x, template_y = anchor
         try:
-            key_str = key.char
-        except AttributeError:
-            key_str = str(key)
+            text = encode_template(template)
+        except Exception:
+            return
+        self.actions.append_anchor(x, y, text, template_x, template_y, timestamp)
+        self.anchor_count += 1
+    
+    def _flush_pending_move(self):
+        """
+        保存轨迹过滤器暂存的最后一个移动点，保证非移动事件之前的鼠标位置准确
+        """
+        if self.move_filter is None:
+            return
+        pending = self.move_filter.take_pending()
+        if pending is not None:
+            self.filtered_moves -= 1
+            self.actions.append_move(*pending)
+    
+    def _flush_journal(self):
+        """
+        把内存中的事件追加写入日志文件并同步到磁盘，然后清空内存缓冲
+        """
+        if len(self.actions):
+            self.journal_writer.write_buffer(self.actions)
+            self._sync_journal()
+            self.actions.clear()
+        self.journal_flushed_at = time.monotonic()
+    
+    def _sync_journal(self):
+        """
+        写出写入器缓存并强制同步到磁盘
+        """
+        self.journal_writer.flush()
+        os.fsync(self.journal_file.fileno())
+    
+    def simplify(self, **options):
+        """
+        对当前动作批量执行轨迹简化，返回 (简化前事件数, 简化后事件数)
         
-        self.actions.append({
-            'type': 'key_release',
-            'key': key_str,
-            'timestamp': timestamp
-        })
+        options 传给 simplify.simplify_actions
+        """
+        before = len(self.actions)
+        self.actions = simplify_actions(self.actions, **options)
+        return before, len(self.actions)
     
     def get_actions(self):
         """
         获取录制的动作
+        
+        返回 ActionBuffer，可以像动作字典列表一样迭代和切片。
+        日志模式录制期间只包含尚未写入日志的事件
         """
         return self.actions
     
     def save_actions(self, filename):
         """
-        保存录制的动作到文件
+        保存录制的动作到文件，根据扩展名选择JSON或二进制格式
         """
-        import json
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.actions, f, indent=2, ensure_ascii=False)
+        save_macro(filename, self.actions)
         return True
     
-    def load_actions(self, filename):
+    def load_actions(self, filename, lazy=False):
         """
-        从文件加载录制的动作
+        从文件加载录制的动作，根据扩展名选择JSON或二进制格式
+        
+        录制日志同样按二进制格式加载，中断的日志恢复到最后一个完整的批次。
+        lazy 为 True 时二进制文件以内存映射方式打开，不整体读入内存。
+        加载成功后关闭之前以内存映射方式打开的动作，调用前应让播放器不再引用它们；
+        加载失败时保留之前的动作
         """
-        import json
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                self.actions = json.load(f)
-            return True
+            if lazy:
+                actions = open_macro(filename)
+            else:
+                actions = load_macro(filename)
         except Exception:
             return False
+        previous, self.actions = self.actions, actions
+        if previous is not actions:
+            close = getattr(previous, 'close', None)
+            if close is not None:
+                close()
+        return True
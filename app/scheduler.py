@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+回放调度模块
+
+基于 time.perf_counter_ns 的单调高精度时钟：
+距离目标时间较远时先粗略 sleep，剩余不足自旋阈值时再自旋等待，
+避免操作系统定时器粒度造成的过睡。同时统计每个事件的延迟。
+"""
+
+import math
+import threading
+import time
+from array import array
+
+
+# 默认自旋阈值：剩余时间小于该值时不再 sleep，改为自旋等待
+DEFAULT_SPIN_NS = 1_500_000
+
+# 延迟统计中每个 2 的幂区间的分桶数
+_SUB_BUCKET_BITS = 4
+LATENESS_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+
+
+class LatenessStats:
+    """
+    事件延迟统计
+    
+    记录每个事件实际执行时间相对计划时间的延迟（纳秒），
+    汇总为 p50/p99/最大值等指标（毫秒）。
+    
+    不保存每个样本：延迟按对数分桶计数（每个 2 的幂区间 LATENESS_SUB_BUCKETS 个桶，
+    相对误差不超过 1/LATENESS_SUB_BUCKETS），另外累计事件数、总和、最大值和最后一个值。
+    占用的内存固定，与回放的事件数无关；百分位数取所在桶的上界，不超过最大值。
+    负的延迟计入第一个桶
+    """
+    
+    def __init__(self):
+        """
+        初始化统计
+        """
+        self.buckets = array('Q', bytes(8 * LATENESS_SUB_BUCKETS * 64))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+    
+    def record(self, lateness_ns):
+        """
+        记录一个事件的延迟
+        """
+        self.total += lateness_ns
+        self.last = lateness_ns
+        if lateness_ns > self.max:
+            self.max = lateness_ns
+        if lateness_ns < LATENESS_SUB_BUCKETS:
+            index = lateness_ns if lateness_ns > 0 else 0
+        else:
+            shift = lateness_ns.bit_length() - _SUB_BUCKET_BITS - 1
+            index = shift * LATENESS_SUB_BUCKETS + (lateness_ns >> shift)
+        self.buckets[index] += 1
+        self.count += 1
+    
+    def __len__(self):
+        return self.count
+    
+    def snapshot(self):
+        """
+        复制当前的分桶计数，用于之后计算新增样本的最大值
+        """
+        return array('Q', self.buckets)
+    
+    def max_since(self, previous):
+        """
+        获取 previous（snapshot() 的结果，None 表示从头开始）之后新增样本的最大延迟（纳秒）
+        
+        返回 (最大延迟, 当前的分桶计数)，没有新增样本时最大延迟为 None
+        """
+        current = self.snapshot()
+        for index in range(len(current) - 1, -1, -1):
+            if current[index] != (previous[index] if previous is not None else 0):
+                return min(_bucket_upper(index), self.max), current
+        return None, current
+    
+    def percentile(self, fraction):
+        """
+        计算百分位数（纳秒，最近秩法）
+        """
+        if not self.count:
+            return 0
+        rank = min(self.count, max(1, math.ceil(fraction * self.count)))
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+    
+    def summary(self):
+        """
+        汇总延迟指标，单位为毫秒
+        """
+        count = self.count
+        if not count:
+            return {
+                'count': 0,
+                'p50_ms': 0.0,
+                'p99_ms': 0.0,
+                'max_ms': 0.0,
+                'mean_ms': 0.0,
+                'drift_ms': 0.0
+            }
+        
+        return {
+            'count': count,
+            'p50_ms': self.percentile(0.50) / 1e6,
+            'p99_ms': self.percentile(0.99) / 1e6,
+            'max_ms': self.max / 1e6,
+            'mean_ms': self.total / count / 1e6,
+            # 最后一个事件的延迟即整次回放结束时的累计漂移
+            'drift_ms': self.last / 1e6
+        }
+
+
+def _bucket_upper(index):
+    """
+    获取延迟分桶的上界（纳秒）
+    """
+    if index < LATENESS_SUB_BUCKETS:
+        return index
+    shift, mantissa = divmod(index, LATENESS_SUB_BUCKETS)
+    shift -= 1
+    return ((mantissa + LATENESS_SUB_BUCKETS + 1) << shift) - 1
+
+
+class PlaybackScheduler:
+    """
+    高精度回放调度器
+    
+    所有时间都是相对 start() 时刻的纳秒数。
+    粗略等待阶段可以被 interrupt() 立即唤醒，用于暂停和停止。
+    """
+    
+    def __init__(self, spin_ns=DEFAULT_SPIN_NS):
+        """
+        初始化调度器
+        """
+        self.spin_ns = spin_ns
+        self.origin_ns = 0
+        self.wakeup = threading.Event()
+    
+    def start(self):
+        """
+        以当前时刻作为时间零点
+        """
+        self.wakeup.clear()
+        self.origin_ns = time.perf_counter_ns()
+    
+    def shift(self, delta_ns):
+        """
+        把时间零点向后推移，用于扣除暂停的时长
+        """
+        self.origin_ns += delta_ns
+    
+    def interrupt(self):
+        """
+        唤醒正在等待的 wait_until()
+        """
+        self.wakeup.set()
+    
+    def clear_interrupt(self):
+        """
+        清除唤醒标志，之后的 wait_until() 恢复正常等待
+        """
+        self.wakeup.clear()
+    
+    def now(self):
+        """
+        获取相对时间零点的当前时间（纳秒）
+        """
+        return time.perf_counter_ns() - self.origin_ns
+    
+    def wait_until(self, target_ns):
+        """
+        等待到目标时间，返回等待结束时的当前时间（纳秒）
+        
+        等待期间被 interrupt() 唤醒时返回 None
+        """
+        clock = time.perf_counter_ns
+        deadline = self.origin_ns + target_ns
+        remaining = deadline - clock()
+        
+        # 粗略等待，留出自旋余量
+        while remaining > self.spin_ns:
+            if self.wakeup.wait((remaining - self.spin_ns) / 1e9):
+                return None
+            remaining = deadline - clock()
+        
+        # 自旋等待剩余的时间
+        now = clock()
+        while now < deadline:
+            now = clock()
+        return now - self.origin_ns
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+轻量信号模块
+
+提供与 Qt 信号相同的 connect/disconnect/emit 接口，但不依赖 Qt，
+使录制和回放模块可以在没有 PySide6 的环境（如命令行）中使用。
+与 Qt 信号不同，回调在调用 emit() 的线程中同步执行，
+界面需要自行把回调转发到 Qt 信号，以便在界面线程中处理。
+ThrottledSignal 限制回调的频率，高频的进度通知转发到界面前先合并。
+"""
+
+import threading
+import time
+
+
+class Signal:
+    """
+    回调列表形式的信号
+    """
+    
+    def __init__(self):
+        """
+        初始化信号
+        """
+        self.slots = []
+        self.lock = threading.Lock()
+    
+    def connect(self, slot):
+        """
+        连接回调
+        """
+        with self.lock:
+            self.slots = self.slots + [slot]
+    
+    def disconnect(self, slot=None):
+        """
+        断开回调，不指定回调时断开全部
+        """
+        with self.lock:
+            if slot is None:
+                self.slots = []
+            else:
+                self.slots = [s for s in self.slots if s != slot]
+    
+    def emit(self, *args):
+        """
+        依次调用所有回调
+        """
+        for slot in self.slots:
+            slot(*args)
+
+
+class ThrottledSignal(Signal):
+    """
+    限制频率的信号
+    
+    两次回调之间至少间隔 interval 秒；间隔内的 emit() 只保留最后一次的参数，
+    在间隔结束时由定时器线程补发一次，因此最后的状态不会丢失。
+    同一时刻最多只有一个定时器，emit() 本身只做一次时间比较
+    """
+    
+    def __init__(self, interval):
+        """
+        初始化信号，interval 为最小回调间隔（秒）
+        """
+        super().__init__()
+        self.interval = interval
+        self.last_emit = None  # 上次回调的时间（time.monotonic）
+        self.pending = None  # 等待补发的参数
+        self.timer = None
+    
+    def emit(self, *args):
+        """
+        距上次回调已超过间隔时立即回调，否则合并到下一次补发
+        """
+        now = time.monotonic()
+        with self.lock:
+            if self.timer is not None:
+                self.pending = args
+                return
+            if self.last_emit is not None and now - self.last_emit < self.interval:
+                self.pending = args
+                self.timer = threading.Timer(self.last_emit + self.interval - now, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+                return
+            self.last_emit = now
+        super().emit(*args)
+    
+    def flush(self):
+        """
+        立即补发等待中的参数（如果有），并取消定时器
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            args = self.pending
+            self.pending = None
+            if args is None:
+                return
+            self.last_emit = time.monotonic()
+        super().emit(*args)
+    
+    def cancel(self):
+        """
+        丢弃等待中的参数，下一次 emit() 立即回调
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.pending = None
+            self.last_emit = None
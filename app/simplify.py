@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+鼠标轨迹简化模块
+
+只精简鼠标移动事件，点击、滚轮和键盘事件原样保留。
+连续的一段鼠标移动（两个非移动事件之间）作为一条轨迹处理，轨迹的首尾点总是保留。
+
+支持两种方式，可以组合使用：
+- 距离/时间阈值：与上一个保留点距离过近或间隔过短的点被丢弃，可在录制时实时使用
+- Ramer–Douglas–Peucker：在 (x, y, t) 空间中删除偏离轨迹不超过 epsilon 的点，用于批量处理
+"""
+
+from array import array
+from itertools import compress
+
+from app.action_buffer import ActionBuffer, TYPE_MOUSE_MOVE
+
+
+# 默认参数
+DEFAULT_MIN_DISTANCE = 2.0  # 像素
+DEFAULT_MIN_INTERVAL = 0.0  # 秒
+DEFAULT_EPSILON = 1.5  # 像素
+DEFAULT_TIME_SCALE = 200.0  # 每秒折算的像素数，即 5 毫秒相当于 1 像素
+
+
+class MoveFilter:
+    """
+    录制时使用的实时轨迹过滤器
+    
+    accept() 判断一个移动点是否需要保存。被丢弃的最后一个点暂存起来，
+    在下一个非移动事件之前通过 take_pending() 取回，保证点击前的最终位置不丢失。
+    """
+    
+    def __init__(self, min_distance=DEFAULT_MIN_DISTANCE, min_interval=DEFAULT_MIN_INTERVAL):
+        """
+        初始化过滤器
+        """
+        self.min_distance_sq = min_distance * min_distance
+        self.min_interval = min_interval
+        self.reset()
+    
+    def reset(self):
+        """
+        重置过滤器状态
+        """
+        self.last = None
+        self.pending = None
+    
+    def accept(self, x, y, timestamp):
+        """
+        判断移动点是否需要保存
+        """
+        last = self.last
+        if last is not None:
+            last_x, last_y, last_time = last
+            dx = x - last_x
+            dy = y - last_y
+            if (dx * dx + dy * dy < self.min_distance_sq
+                    or timestamp - last_time < self.min_interval):
+                self.pending = (x, y, timestamp)
+                return False
+        
+        self.last = (x, y, timestamp)
+        self.pending = None
+        return True
+    
+    def take_pending(self):
+        """
+        取回最后一个被丢弃的点，并开始新的一段轨迹
+        """
+        pending = self.pending
+        self.reset()
+        return pending
+
+
+def simplify_actions(actions, min_distance=DEFAULT_MIN_DISTANCE,
+                     min_interval=DEFAULT_MIN_INTERVAL, epsilon=DEFAULT_EPSILON,
+                     time_scale=DEFAULT_TIME_SCALE):
+    """
+    简化动作中的鼠标轨迹，返回新的 ActionBuffer
+    
+    min_distance/min_interval 为 0 时不做阈值过滤，epsilon 为 None 或 0 时不做 RDP 简化
+    """
+    actions = ActionBuffer.from_actions(actions)
+    keep = array('B', [1]) * len(actions)
+    
+    for start, end in _move_runs(actions.types):
+        if min_distance > 0 or min_interval > 0:
+            _threshold_run(actions, keep, start, end, min_distance, min_interval)
+        if epsilon:
+            _rdp_run(actions, keep, start, end, epsilon, time_scale)
+    
+    result = ActionBuffer((actions.strings, actions.string_index))
+    for target, source in zip(result.columns(), actions.columns()):
+        target.extend(compress(source, keep))
+    return result
+
+
+def _move_runs(types):
+    """
+    找出所有连续鼠标移动的区间 [start, end)
+    """
+    start = None
+    for i, type_code in enumerate(types):
+        if type_code == TYPE_MOUSE_MOVE:
+            if start is None:
+                start = i
+        elif start is not None:
+            yield start, i
+            start = None
+    if start is not None:
+        yield start, len(types)
+
+
+def _threshold_run(actions, keep, start, end, min_distance, min_interval):
+    """
+    按距离/时间阈值过滤一段轨迹
+    """
+    xs, ys, timestamps = actions.x, actions.y, actions.timestamps
+    move_filter = MoveFilter(min_distance, min_interval)
+    for i in range(start, end - 1):
+        if keep[i] and not move_filter.accept(xs[i], ys[i], timestamps[i]):
+            keep[i] = 0
+
+
+def _rdp_run(actions, keep, start, end, epsilon, time_scale):
+    """
+    对一段轨迹中仍保留的点执行 Ramer–Douglas–Peucker 简化
+    """
+    indices = [i for i in range(start, end) if keep[i]]
+    if len(indices) < 3:
+        return
+    
+    xs, ys, timestamps = actions.x, actions.y, actions.timestamps
+    points = [(xs[i], ys[i], timestamps[i] * time_scale) for i in indices]
+    retained = [False] * len(points)
+    retained[0] = retained[-1] = True
+    epsilon_sq = epsilon * epsilon
+    
+    # 用栈代替递归，避免长轨迹超出递归深度
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        
+        max_dist_sq = -1.0
+        max_index = first
+        a = points[first]
+        b = points[last]
+        for k in range(first + 1, last):
+            dist_sq = _segment_distance_sq(points[k], a, b)
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                max_index = k
+        
+        if max_dist_sq > epsilon_sq:
+            retained[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+    
+    for index, kept in zip(indices, retained):
+        if not kept:
+            keep[index] = 0
+
+
+def _segment_distance_sq(p, a, b):
+    """
+    计算三维空间中点 p 到线段 ab 的距离平方
+    """
+    abx, aby, abz = b[0] - a[0], b[1] - a[1], b[2] - a[2]
+    apx, apy, apz = p[0] - a[0], p[1] - a[1], p[2] - a[2]
+    length_sq = abx * abx + aby * aby + abz * abz
+    if length_sq == 0:
+        return apx * apx + apy * apy + apz * apz
+    
+    t = max(0.0, min(1.0, (apx * abx + apy * aby + apz * abz) / length_sq))
+    dx = apx - t * abx
+    dy = apy - t * aby
+    dz = apz - t * abz
+    return dx * dx + dy * dy + dz * dz
+
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+文字输入快速路径模块
+
+录制时每个字符保存为按下和释放两个事件，回放时按录制的打字节奏逐个执行。
+collapse_text() 把连续输入的字符合并为一个文字输入步骤（type_text）：
+- 只由可打印字符和空格的按下、释放组成，且每个按键都在这一段内按下并释放的连续事件
+  合并为一个步骤，字符按按下的顺序排列
+- 修饰键、功能键、鼠标事件和其他动作打断合并并原样保留，
+  按住 Shift、Ctrl 等修饰键时输入的字符仍在修饰键按下期间输入
+- 步骤按 interval（秒/字符）的间隔输入，interval 为 0 时一次性注入全部字符，
+  速度只受输入后端限制；步骤之后的动作与步骤结束时保持原来的间隔
+"""
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+
+
+# 合并为文字输入步骤的最少字符数
+MIN_TEXT_LENGTH = 2
+
+# 不能直接作为按键字符串回放的字符对应的按键名
+TEXT_KEYS = {
+    '\n': 'Key.enter',
+    '\t': 'Key.tab',
+    ' ': 'Key.space'
+}
+
+# 合并时当作字符处理的特殊按键，回车和制表符通常会切换焦点或提交表单，不合并
+_KEY_CHARS = {'Key.space': ' '}
+
+
+def text_keys(text):
+    """
+    把文本转换为按键名列表，含有无法输入的字符时抛出 ValueError
+    """
+    keys = []
+    for char in text:
+        key = TEXT_KEYS.get(char, char)
+        if len(key) == 1 and not key.isprintable():
+            raise ValueError(f"无法输入的字符: {char!r}")
+        keys.append(key)
+    return keys
+
+
+def text_duration(count, interval):
+    """
+    获取输入 count 个字符的步骤从第一个字符到最后一个字符的时长
+    
+    第 k 个字符在步骤开始后 k * interval 输入，最后一个字符输入后步骤即结束；
+    播放器、合并和组合文档都按这个时长安排之后的动作
+    """
+    return max(0, count - 1) * interval
+
+
+def rate_to_interval(rate):
+    """
+    把每秒字符数转换为字符间隔（秒），0 表示不限速
+    """
+    if rate < 0:
+        raise ValueError(f"输入速度不能为负数: {rate}")
+    return 1.0 / rate if rate else 0.0
+
+
+def _key_char(key):
+    """
+    获取按键对应的可合并字符，不可合并时返回 None
+    """
+    if key is None:
+        return None
+    if len(key) == 1:
+        return key if key.isprintable() else None
+    return _KEY_CHARS.get(key)
+
+
+def _text_run(actions, start):
+    """
+    从 start 开始查找可以合并的一段按键事件，返回 (结束下标, 文本)
+    
+    结束下标之前的每个按键都已释放；没有可以合并的事件时返回 (start, '')
+    """
+    types = actions.types
+    string_ids = actions.string_ids
+    pressed = {}
+    chars = []
+    end, text = start, ''
+    for i in range(start, len(types)):
+        type_code = types[i]
+        if type_code != TYPE_KEY_PRESS and type_code != TYPE_KEY_RELEASE:
+            break
+        key = actions.get_string(string_ids[i])
+        char = _key_char(key)
+        if char is None:
+            break
+        if type_code == TYPE_KEY_PRESS:
+            if key in pressed:
+                # 按住不放产生的重复按下不合并
+                break
+            pressed[key] = None
+            chars.append(char)
+        else:
+            if key not in pressed:
+                break
+            del pressed[key]
+            if not pressed:
+                end, text = i + 1, ''.join(chars)
+    return end, text
+
+
+def collapse_text(actions, interval=0.0, min_length=MIN_TEXT_LENGTH):
+    """
+    把连续输入的字符合并为文字输入步骤，返回新的 ActionBuffer
+    
+    interval 为步骤中的字符间隔（秒），0 表示尽快输入；
+    少于 min_length 个字符的一段保持原来的按键事件
+    """
+    actions = ActionBuffer.from_actions(actions)
+    result = ActionBuffer()
+    timestamps = actions.timestamps
+    delta = 0.0  # 合并后之后的动作时间的变化量
+    count = len(actions)
+    i = 0
+    while i < count:
+        end, text = _text_run(actions, i)
+        if len(text) >= min_length:
+            result.append_text(text, interval, timestamps[i] + delta)
+            delta += text_duration(len(text), interval) - (timestamps[end - 1] - timestamps[i])
+            i = end
+            continue
+        for j in range(i, max(end, i + 1)):
+            result.append_record(
+                actions.types[j], actions.flags[j],
+                result.intern(actions.get_string(actions.string_ids[j])),
+                actions.x[j], actions.y[j], actions.dx[j], actions.dy[j],
+                timestamps[j] + delta
+            )
+        i = max(end, i + 1)
+    return result
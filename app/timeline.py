@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+回放时间轴变换模块
+
+在回放前把录制的时间戳变换为新的时间轴，播放速度在此基础上再整体缩放：
+- 变速区间（rates）：原时间 [start, end) 内的间隔除以对应的倍率，用于只加速或放慢某一段
+- 快速移动（fast_moves）：纯鼠标移动的间隔压缩为 move_interval，
+  点击、滚轮、按键之间的间隔以及按住鼠标拖动时的移动保持不变
+- 空闲压缩（max_gap）：任意两个相邻动作之间超过 max_gap 的间隔截断为 max_gap
+
+变换按块进行，状态保存在 TimelineCursor 中，内存映射的大文件可以边读边变换。
+"""
+
+from array import array
+
+from app.action_buffer import FLAG_PRESSED, TYPE_MOUSE_MOVE, TYPE_MOUSE_CLICK
+
+
+class TimelineTransform:
+    """
+    时间轴变换参数
+    
+    max_gap 为 None 时不压缩空闲；rates 为 (开始秒, 结束秒, 倍率) 的序列，按录制时间计算
+    """
+    
+    def __init__(self, max_gap=None, fast_moves=False, move_interval=0.0, rates=()):
+        """
+        初始化变换参数
+        """
+        if max_gap is not None and max_gap < 0:
+            raise ValueError("max_gap 不能为负数")
+        if move_interval < 0:
+            raise ValueError("move_interval 不能为负数")
+        for start, end, rate in rates:
+            if rate <= 0 or end <= start:
+                raise ValueError(f"无效的变速区间: ({start}, {end}, {rate})")
+        
+        self.max_gap = max_gap
+        self.fast_moves = fast_moves
+        self.move_interval = move_interval
+        self.rates = sorted((float(start), float(end), float(rate)) for start, end, rate in rates)
+        for previous, current in zip(self.rates, self.rates[1:]):
+            if current[0] < previous[1]:
+                raise ValueError(f"变速区间重叠: {previous} 与 {current}")
+    
+    def __repr__(self):
+        return (f"TimelineTransform(max_gap={self.max_gap}, fast_moves={self.fast_moves}, "
+                f"move_interval={self.move_interval}, rates={self.rates})")
+    
+    def is_identity(self):
+        """
+        是否不改变时间轴
+        """
+        return self.max_gap is None and not self.fast_moves and not self.rates
+    
+    def cursor(self):
+        """
+        创建逐块变换的游标
+        """
+        return TimelineCursor(self)
+    
+    def apply(self, actions):
+        """
+        变换整个 ActionBuffer 的时间戳，不改变时间轴时直接返回原时间戳列
+        """
+        return self.cursor().advance(actions)
+    
+    def projected_duration(self, chunks):
+        """
+        计算变换后的总时长（秒），chunks 为 ActionBuffer 块的迭代
+        """
+        cursor = self.cursor()
+        for buffer in chunks:
+            cursor.advance(buffer)
+        return cursor.last_time
+
+
+class TimelineCursor:
+    """
+    时间轴变换的状态，按顺序对各块调用 advance()
+    """
+    
+    def __init__(self, transform):
+        """
+        初始化游标
+        """
+        self.transform = transform
+        self.last_original = 0.0  # 上一个动作的录制时间
+        self.last_time = 0.0  # 上一个动作变换后的时间
+        self.buttons_held = 0  # 当前按住的鼠标按钮数
+        self.rate_index = 0
+    
+    def advance(self, actions):
+        """
+        变换下一块动作的时间戳，返回新的时间戳列
+        
+        不改变时间轴时直接返回原时间戳列
+        """
+        transform = self.transform
+        if transform.is_identity():
+            if len(actions):
+                self.last_original = self.last_time = actions.timestamps[-1]
+            return actions.timestamps
+        
+        max_gap = transform.max_gap
+        fast_moves = transform.fast_moves
+        move_interval = transform.move_interval
+        rates = transform.rates
+        
+        types = actions.types
+        flags = actions.flags
+        result = array('d', bytes(8 * len(actions)))
+        last_original = self.last_original
+        last_time = self.last_time
+        buttons_held = self.buttons_held
+        
+        for i, original in enumerate(actions.timestamps):
+            gap = original - last_original
+            if gap < 0:
+                gap = 0.0
+            if rates and gap > 0:
+                gap = self._scale(last_original, original, gap)
+            
+            type_code = types[i]
+            if fast_moves and type_code == TYPE_MOUSE_MOVE and not buttons_held:
+                gap = min(gap, move_interval)
+            elif type_code == TYPE_MOUSE_CLICK:
+                if flags[i] & FLAG_PRESSED:
+                    buttons_held += 1
+                elif buttons_held:
+                    buttons_held -= 1
+            
+            if max_gap is not None and gap > max_gap:
+                gap = max_gap
+            
+            last_time += gap
+            last_original = original
+            result[i] = last_time
+        
+        self.last_original = last_original
+        self.last_time = last_time
+        self.buttons_held = buttons_held
+        return result
+    
+    def _scale(self, start, end, gap):
+        """
+        按变速区间换算 [start, end) 这段录制时间的回放时长
+        """
+        rates = self.transform.rates
+        index = self.rate_index
+        # 跳过已经结束的区间
+        while index < len(rates) and rates[index][1] <= start:
+            index += 1
+        self.rate_index = index
+        if index == len(rates) or rates[index][0] >= end:
+            return gap
+        
+        scaled = 0.0
+        position = start
+        while index < len(rates) and rates[index][0] < end:
+            rate_start, rate_end, rate = rates[index]
+            if rate_start > position:
+                scaled += rate_start - position
+                position = rate_start
+            segment_end = min(rate_end, end)
+            scaled += (segment_end - position) / rate
+            position = segment_end
+            if rate_end > end:
+                break
+            index += 1
+        scaled += max(0.0, end - position)
+        return scaled
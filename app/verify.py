@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+回放核对模块
+
+回放宏的同时记录实际注入的事件，与宏中应有的事件逐个对齐，报告回放的忠实程度：
+- 时间误差：对齐后每个事件实际时间与计划时间之差（以第一个对齐的事件为零点），
+  以及相邻事件间隔的误差
+- 缺失和多余的事件：回放时没有出现的事件（如无法解析的按键、注入失败）和宏中没有的事件
+- 位置误差：鼠标移动和点击的实际坐标与录制坐标的距离（图像锚点的修正也会体现在这里）
+
+记录注入事件的方式：
+- memory：使用内存输入后端，直接读取后端记录的事件，不接触真实设备
+- listener：回放的同时用 Recorder 的监听器录制，经过系统的输入通道，更接近真实情况；
+  录制期间用户的操作也会被记为多余的事件
+
+对齐按事件顺序进行：类型和参数（按钮、按键、滚动量）相同的事件才能配对，鼠标移动还要求坐标相同；
+不一致时在前后 LOOKAHEAD 个事件内查找，跳过事件较少的一侧记为缺失或多余（可选事件不计数），
+都找不到时类型和参数相同的事件仍然配对，坐标之差计为位置误差。
+点击前的鼠标移动由回放器生成，实际中可能不产生移动事件，因此是可选的。
+等待步骤的等待时间会体现为其后事件的时间误差，相邻间隔误差只受一次影响。
+"""
+
+import math
+import time
+from collections import Counter
+
+from app.action_buffer import (
+    ActionBuffer, ACTION_TYPES, FLAG_PRESSED, TYPE_MOUSE_MOVE, TYPE_MOUSE_CLICK,
+    TYPE_MOUSE_SCROLL, TYPE_KEY_PRESS, TYPE_KEY_RELEASE, TYPE_TEXT
+)
+from app.input_backend import FakeBackend, create_backend
+from app.macro_format import load_macro
+from app.text import text_keys
+
+
+# 记录注入事件的方式
+VERIFY_MODES = ('memory', 'listener')
+
+# 对齐时向前查找的事件数
+LOOKAHEAD = 64
+
+# 位置误差超过该值（像素）的事件计为位置错误
+DEFAULT_POSITION_TOLERANCE = 0
+
+# 报告中列出的缺失和多余事件的最大数量
+MAX_EXAMPLES = 10
+
+# 流中每个事件为 (类型, 参数, 时间（秒）, x, y, 是否可选)，没有坐标的事件 x、y 为 None
+_KIND, _DETAIL, _TIME, _X, _Y, _OPTIONAL = range(6)
+
+
+def expected_stream(actions, timestamps, speed=1.0):
+    """
+    生成宏应当产生的事件流，timestamps 为时间轴变换后的时间戳
+    
+    锚点和等待步骤不产生输入事件，不包含在内；文字输入步骤展开为每个字符的按下和释放
+    """
+    stream = []
+    for i, type_code in enumerate(actions.types):
+        t = timestamps[i] / speed
+        if type_code == TYPE_MOUSE_MOVE:
+            stream.append((type_code, None, t, actions.x[i], actions.y[i], False))
+        elif type_code == TYPE_MOUSE_CLICK:
+            x, y = actions.x[i], actions.y[i]
+            button = actions.get_string(actions.string_ids[i])
+            stream.append((TYPE_MOUSE_MOVE, None, t, x, y, True))
+            stream.append((type_code, (button, bool(actions.flags[i] & FLAG_PRESSED)), t, x, y, False))
+        elif type_code == TYPE_MOUSE_SCROLL:
+            stream.append((type_code, actions.scroll_amount(i), t, None, None, False))
+        elif type_code in (TYPE_KEY_PRESS, TYPE_KEY_RELEASE):
+            stream.append((type_code, actions.get_string(actions.string_ids[i]), t, None, None, False))
+        elif type_code == TYPE_TEXT:
+            interval = actions.dx[i] / 1e6 / speed
+            for k, key in enumerate(text_keys(actions.get_string(actions.string_ids[i]))):
+                stream.append((TYPE_KEY_PRESS, key, t + k * interval, None, None, False))
+                stream.append((TYPE_KEY_RELEASE, key, t + k * interval, None, None, False))
+    return stream
+
+
+def observed_stream(actions, offset=0.0):
+    """
+    把录制到的动作转换为事件流，offset（秒）加到时间戳上
+    """
+    stream = []
+    for i, type_code in enumerate(actions.types):
+        t = actions.timestamps[i] + offset
+        if type_code == TYPE_MOUSE_MOVE:
+            stream.append((type_code, None, t, actions.x[i], actions.y[i], False))
+        elif type_code == TYPE_MOUSE_CLICK:
+            button = actions.get_string(actions.string_ids[i])
+            detail = (button, bool(actions.flags[i] & FLAG_PRESSED))
+            stream.append((type_code, detail, t, actions.x[i], actions.y[i], False))
+        elif type_code == TYPE_MOUSE_SCROLL:
+            stream.append((type_code, actions.scroll_amount(i), t, None, None, False))
+        elif type_code in (TYPE_KEY_PRESS, TYPE_KEY_RELEASE):
+            stream.append((type_code, actions.get_string(actions.string_ids[i]), t, None, None, False))
+    return stream
+
+
+def backend_events_to_actions(events, origin_ns):
+    """
+    把内存输入后端记录的事件转换为 ActionBuffer，时间戳相对 origin_ns
+    """
+    buffer = ActionBuffer()
+    x = y = 0
+    for event in events:
+        timestamp = (event[0] - origin_ns) / 1e9
+        kind = event[1]
+        if kind == 'move':
+            x, y = event[2], event[3]
+            buffer.append_move(x, y, timestamp)
+        elif kind == 'press_button':
+            buffer.append_click(x, y, str(event[2]), True, timestamp)
+        elif kind == 'release_button':
+            buffer.append_click(x, y, str(event[2]), False, timestamp)
+        elif kind == 'scroll':
+            buffer.append_scroll(x, y, event[2], event[3], timestamp)
+        elif kind == 'press_key':
+            buffer.append_key(TYPE_KEY_PRESS, str(event[2]), timestamp)
+        elif kind == 'release_key':
+            buffer.append_key(TYPE_KEY_RELEASE, str(event[2]), timestamp)
+    return buffer
+
+
+def _compatible(a, b):
+    """
+    类型和参数相同，可以配对
+    """
+    return a[_KIND] == b[_KIND] and a[_DETAIL] == b[_DETAIL]
+
+
+def _same(a, b):
+    """
+    可以配对，鼠标移动的坐标也相同
+    """
+    if not _compatible(a, b):
+        return False
+    return a[_KIND] != TYPE_MOUSE_MOVE or (a[_X] == b[_X] and a[_Y] == b[_Y])
+
+
+def _find(stream, start, event, lookahead):
+    """
+    在 stream[start:start + lookahead] 中查找与 event 相同的事件，返回下标或 None
+    """
+    for index in range(start, min(len(stream), start + lookahead)):
+        if _same(stream[index], event):
+            return index
+    return None
+
+
+def align(expected, observed, lookahead=LOOKAHEAD):
+    """
+    按顺序对齐两个事件流
+    
+    返回 (配对的 (期望下标, 实际下标) 列表, 缺失的期望下标列表, 多余的实际下标列表)，
+    未配对的可选事件不计为缺失
+    """
+    pairs = []
+    missing = []
+    extra = []
+    i = j = 0
+    while i < len(expected) and j < len(observed):
+        wanted = expected[i]
+        seen = observed[j]
+        if _same(wanted, seen):
+            pairs.append((i, j))
+            i += 1
+            j += 1
+            continue
+        
+        k = _find(observed, j + 1, wanted, lookahead)
+        m = _find(expected, i + 1, seen, lookahead)
+        if k is None and m is None:
+            if _compatible(wanted, seen):
+                pairs.append((i, j))
+            elif wanted[_OPTIONAL]:
+                i += 1
+                continue
+            else:
+                missing.append(i)
+                extra.append(j)
+            i += 1
+            j += 1
+            continue
+        
+        skipped = None
+        if m is not None:
+            skipped = [index for index in range(i, m) if not expected[index][_OPTIONAL]]
+        if skipped is None or (k is not None and k - j < len(skipped)):
+            extra.extend(range(j, k))
+            j = k
+        else:
+            missing.extend(skipped)
+            i = m
+    
+    missing.extend(index for index in range(i, len(expected)) if not expected[index][_OPTIONAL])
+    extra.extend(range(j, len(observed)))
+    return pairs, missing, extra
+
+
+def _percentile(ordered, fraction):
+    """
+    计算已排序样本的百分位数（最近秩法）
+    """
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _distribution(values):
+    """
+    汇总数值的分布（按绝对值计算百分位数）
+    """
+    if not values:
+        return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0, 'mean': 0.0}
+    ordered = sorted(abs(value) for value in values)
+    return {
+        'count': len(ordered),
+        'p50': _percentile(ordered, 0.50),
+        'p95': _percentile(ordered, 0.95),
+        'p99': _percentile(ordered, 0.99),
+        'max': ordered[-1],
+        'mean': sum(values) / len(values)
+    }
+
+
+def _describe(event):
+    """
+    生成事件的简短描述，用于报告中的示例
+    """
+    description = {'type': ACTION_TYPES[event[_KIND]], 'time': round(event[_TIME], 6)}
+    if event[_DETAIL] is not None:
+        description['detail'] = event[_DETAIL]
+    if event[_X] is not None:
+        description['x'] = event[_X]
+        description['y'] = event[_Y]
+    return description
+
+
+def compare_streams(expected, observed, lookahead=LOOKAHEAD,
+                    position_tolerance=DEFAULT_POSITION_TOLERANCE):
+    """
+    对齐并比较两个事件流，返回报告字典
+    
+    时间误差单位为毫秒，mean 为带符号的平均值（正数表示偏晚）；位置误差单位为像素
+    """
+    pairs, missing, extra = align(expected, observed, lookahead)
+    
+    offsets = []
+    intervals = []
+    distances = []
+    base = None
+    previous = None
+    for i, j in pairs:
+        wanted = expected[i]
+        seen = observed[j]
+        delta = seen[_TIME] - wanted[_TIME]
+        if base is None:
+            base = delta
+        offsets.append((delta - base) * 1000)
+        if previous is not None:
+            expected_gap = wanted[_TIME] - expected[previous[0]][_TIME]
+            observed_gap = seen[_TIME] - observed[previous[1]][_TIME]
+            intervals.append((observed_gap - expected_gap) * 1000)
+        previous = (i, j)
+        if wanted[_X] is not None and seen[_X] is not None:
+            distances.append(math.hypot(seen[_X] - wanted[_X], seen[_Y] - wanted[_Y]))
+    
+    position = _distribution(distances)
+    position['exceeded'] = sum(1 for distance in distances if distance > position_tolerance)
+    # 期望的事件数包括实际出现了的可选事件
+    required = sum(1 for event in expected if not event[_OPTIONAL])
+    return {
+        'expected': required + sum(1 for i, _ in pairs if expected[i][_OPTIONAL]),
+        'observed': len(observed),
+        'matched': len(pairs),
+        'missing': len(missing),
+        'extra': len(extra),
+        'missing_types': dict(Counter(ACTION_TYPES[expected[i][_KIND]] for i in missing)),
+        'extra_types': dict(Counter(ACTION_TYPES[observed[j][_KIND]] for j in extra)),
+        'missing_examples': [_describe(expected[i]) for i in missing[:MAX_EXAMPLES]],
+        'extra_examples': [_describe(observed[j]) for j in extra[:MAX_EXAMPLES]],
+        'start_offset_ms': base * 1000 if base is not None else None,
+        'timing_ms': _distribution(offsets),
+        'interval_ms': _distribution(intervals),
+        'position_px': position
+    }
+
+
+def verify_playback(actions, speed=1.0, mode='memory', backend=None, timeline=None,
+                    lookahead=LOOKAHEAD, position_tolerance=DEFAULT_POSITION_TOLERANCE):
+    """
+    以指定速度回放一次并核对实际注入的事件，返回报告字典
+    
+    memory 模式忽略 backend；listener 模式的 backend 为输入后端名称，
+    'memory' 表示使用把注入事件回送给监听器的内存后端
+    """
+    from app.player import Player
+    
+    if mode not in VERIFY_MODES:
+        raise ValueError(f"未知的核对方式: {mode}")
+    
+    recorder = None
+    if mode == 'memory':
+        input_backend = FakeBackend()
+    elif backend == 'memory':
+        input_backend = FakeBackend(record=False, loopback=True)
+    else:
+        input_backend = create_backend(backend)
+    if mode == 'listener':
+        from app.recorder import Recorder
+        recorder = Recorder(backend=input_backend)
+    
+    player = Player(backend=input_backend)
+    player.set_actions(actions)
+    player.set_timeline(timeline)
+    player.set_speed(speed)
+    
+    try:
+        if recorder is not None:
+            recorder.start_recording()
+        started_ns = time.perf_counter_ns()
+        player.start_playing()
+        elapsed = (time.perf_counter_ns() - started_ns) / 1e9
+    finally:
+        if recorder is not None:
+            recorder.stop_recording()
+        if mode == 'listener' and backend != 'memory':
+            input_backend.close()
+    
+    if recorder is not None:
+        observed = observed_stream(
+            recorder.get_actions(), (recorder.start_ns - started_ns) / 1e9
+        )
+    else:
+        observed = observed_stream(backend_events_to_actions(input_backend.events, started_ns))
+    
+    expected = expected_stream(player.actions, player.timestamps, player.speed)
+    report = {
+        'speed': player.speed,
+        'mode': mode,
+        'backend': input_backend.name,
+        'duration': elapsed,
+        'events_per_second': len(observed) / elapsed if elapsed > 0 else 0.0,
+        **compare_streams(expected, observed, lookahead, position_tolerance),
+        'lateness': player.get_timing_stats(),
+        'injection_errors': player.injection_errors,
+        'error': str(player.last_error) if player.last_error is not None else None
+    }
+    return report
+
+
+def verify_macro(filename, speeds=(1.0,), **kwargs):
+    """
+    加载宏文件，按每个速度回放核对一次，返回报告列表
+    """
+    actions = load_macro(filename)
+    return [verify_playback(actions, speed, **kwargs) for speed in speeds]
+
+
+def is_faithful(report):
+    """
+    报告中没有缺失、多余的事件，位置误差都在允许范围内，回放也没有出错
+    """
+    return (not report['missing'] and not report['extra']
+            and not report['position_px']['exceeded']
+            and not report['injection_errors'] and report['error'] is None)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+等待条件模块
+
+等待步骤让回放在某个屏幕条件满足后再继续，而不是只按录制的时间戳推进：
+- region_changed：区域内容与开始等待时不同
+- pixel_color：像素颜色与指定颜色的每个通道相差不超过 tolerance
+- template_appears：区域内出现指定的模板图像
+
+轮询时先计算区域的哈希，画面与上一次轮询相同时跳过条件判断（模板匹配等开销较大的操作），
+并逐步拉长轮询间隔；画面有变化时立即恢复为最短间隔。
+条件满足后，之后的动作从等待结束的时刻起按原来的间隔继续回放。
+
+等待步骤在 JSON 宏文件中的写法：
+    {"type": "wait", "condition": "pixel_color", "x": 100, "y": 200,
+     "color": [255, 255, 255], "tolerance": 8, "timeout": 10, "timestamp": 1.5}
+    {"type": "wait", "condition": "region_changed", "x": 0, "y": 0, "width": 400, "height": 300,
+     "timeout": 5, "on_timeout": "continue", "timestamp": 2.0}
+    {"type": "wait", "condition": "template_appears", "x": 0, "y": 0, "width": 800, "height": 600,
+     "template": "<PNG 的 base64>", "threshold": 0.85, "timestamp": 3.0}
+
+超时默认终止回放，on_timeout 为 "continue" 时继续执行后续动作。
+"""
+
+import time
+import zlib
+
+from app.anchor import TemplateMatcher, decode_template, DEFAULT_THRESHOLD
+
+
+# 默认超时（秒）
+DEFAULT_TIMEOUT = 10.0
+
+# 像素颜色每个通道允许的误差
+DEFAULT_TOLERANCE = 8
+
+# 轮询间隔（秒）：画面没有变化时每次乘以 POLL_BACKOFF，直到 MAX_POLL_INTERVAL
+MIN_POLL_INTERVAL = 0.005
+MAX_POLL_INTERVAL = 0.1
+POLL_BACKOFF = 1.5
+
+
+class WaitError(Exception):
+    """
+    等待步骤无法执行
+    """
+
+
+class WaitTimeoutError(WaitError):
+    """
+    等待条件在超时前没有满足
+    """
+
+
+def region_hash(image):
+    """
+    计算图像区域的哈希
+    """
+    if not image.flags.c_contiguous:
+        image = image.copy()
+    return zlib.crc32(image)
+
+
+class WaitCondition:
+    """
+    等待条件基类
+    
+    check() 先比较采样区域的哈希，画面没有变化时直接返回上一次的判断结果
+    """
+    
+    def __init__(self, x, y, width, height):
+        """
+        初始化，(x, y, width, height) 为采样区域
+        """
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.last_hash = None
+        self.last_result = False
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.x}, {self.y}, {self.width}, {self.height})"
+    
+    def begin(self, capture):
+        """
+        开始一次等待，清除上一次的状态
+        """
+        self.last_hash = None
+        self.last_result = False
+    
+    def check(self, capture):
+        """
+        检查条件，返回 (是否满足, 画面是否有变化)
+        """
+        image = self.sample(capture)
+        current = region_hash(image)
+        if current == self.last_hash:
+            return self.last_result, False
+        self.last_hash = current
+        self.last_result = self.evaluate(image)
+        return self.last_result, True
+    
+    def sample(self, capture):
+        """
+        截取采样区域
+        """
+        return capture.grab(self.x, self.y, self.width, self.height)
+    
+    def evaluate(self, image):
+        """
+        判断条件是否满足，只在画面变化时调用
+        """
+        raise NotImplementedError
+
+
+class RegionChanged(WaitCondition):
+    """
+    区域内容与开始等待时不同
+    """
+    
+    def begin(self, capture):
+        super().begin(capture)
+        self.baseline = region_hash(self.sample(capture))
+    
+    def evaluate(self, image):
+        return self.last_hash != self.baseline
+
+
+class PixelColor(WaitCondition):
+    """
+    像素颜色与指定颜色相近
+    """
+    
+    def __init__(self, x, y, color, tolerance=DEFAULT_TOLERANCE):
+        super().__init__(x, y, 1, 1)
+        self.color = tuple(int(c) for c in color)
+        self.tolerance = tolerance
+    
+    def sample(self, capture):
+        return capture.grab_color(self.x, self.y, 1, 1)
+    
+    def evaluate(self, image):
+        b, g, r = image[0, 0]
+        target_r, target_g, target_b = self.color
+        return (abs(int(r) - target_r) <= self.tolerance
+                and abs(int(g) - target_g) <= self.tolerance
+                and abs(int(b) - target_b) <= self.tolerance)
+
+
+class TemplateAppears(WaitCondition):
+    """
+    区域内出现指定的模板图像
+    """
+    
+    def __init__(self, x, y, width, height, template, threshold=DEFAULT_THRESHOLD):
+        super().__init__(x, y, width, height)
+        self.matcher = TemplateMatcher(decode_template(template))
+        self.threshold = threshold
+        self.found_at = None  # 最近一次找到模板时模板左上角的屏幕坐标
+    
+    def evaluate(self, image):
+        match = self.matcher.locate(image, self.threshold)
+        if match is None:
+            return False
+        self.found_at = (self.x + match[0], self.y + match[1])
+        return True
+
+
+def create_condition(condition, x, y, width, height, params):
+    """
+    根据等待步骤的参数创建条件对象，参数无效时抛出 WaitError
+    """
+    try:
+        if condition == 'region_changed':
+            return RegionChanged(x, y, width, height)
+        if condition == 'pixel_color':
+            return PixelColor(x, y, params['color'], params.get('tolerance', DEFAULT_TOLERANCE))
+        if condition == 'template_appears':
+            return TemplateAppears(
+                x, y, width, height, params['template'], params.get('threshold', DEFAULT_THRESHOLD)
+            )
+    except (KeyError, ValueError, TypeError) as e:
+        raise WaitError(f"等待步骤参数无效（{condition}）: {e}") from e
+    raise WaitError(f"未知的等待条件: {condition}")
+
+
+def wait_for(condition, capture, timeout, sleep=time.sleep, cancelled=None):
+    """
+    轮询直到条件满足
+    
+    sleep(秒) 用于等待下一次轮询，可以传入能被提前唤醒的等待函数；
+    cancelled() 返回 True 时放弃等待。
+    返回 True 表示条件满足，False 表示超时，None 表示被取消
+    """
+    deadline = time.perf_counter() + timeout
+    interval = MIN_POLL_INTERVAL
+    condition.begin(capture)
+    
+    while True:
+        # 每次轮询都需要新的画面，不使用帧缓存
+        capture.invalidate()
+        met, changed = condition.check(capture)
+        if met:
+            return True
+        
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        
+        if changed:
+            interval = MIN_POLL_INTERVAL
+        else:
+            interval = min(MAX_POLL_INTERVAL, interval * POLL_BACKOFF)
+        sleep(min(interval, remaining))
+        if cancelled is not None and cancelled():
+            return None
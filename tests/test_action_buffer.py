@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+按列存储的动作缓冲区测试
+"""
+
+import pytest
+
+from app.action_buffer import ActionBuffer, FLAG_FINE_SCROLL, NO_STRING, TYPE_KEY_PRESS
+
+
+ACTIONS = [
+    {'type': 'mouse_move', 'x': 1, 'y': 2, 'timestamp': 0.0},
+    {'type': 'mouse_click', 'x': 1, 'y': 2, 'button': 'Button.left', 'pressed': True, 'timestamp': 0.1},
+    {'type': 'mouse_click', 'x': 1, 'y': 2, 'button': 'Button.left', 'pressed': False, 'timestamp': 0.2},
+    {'type': 'mouse_scroll', 'x': 1, 'y': 2, 'dx': 0, 'dy': -1, 'timestamp': 0.3},
+    {'type': 'key_press', 'key': 'a', 'timestamp': 0.4},
+    {'type': 'key_release', 'key': 'a', 'timestamp': 0.5},
+    {'type': 'anchor', 'x': 1, 'y': 2, 'template': 'dGVtcGxhdGU=', 'template_x': 3, 'template_y': 4,
+     'timestamp': 0.6},
+]
+
+
+def test_dict_round_trip():
+    buffer = ActionBuffer.from_actions(ACTIONS)
+    assert len(buffer) == len(ACTIONS)
+    assert buffer.to_list() == ACTIONS
+    assert buffer[-1] == ACTIONS[-1]
+    assert buffer.duration() == 0.6
+    assert ActionBuffer.from_actions(buffer) is buffer
+    with pytest.raises(IndexError):
+        buffer[len(ACTIONS)]
+
+
+def test_strings_interned_once():
+    buffer = ActionBuffer.from_actions(ACTIONS)
+    assert buffer.strings == ['Button.left', 'a', 'dGVtcGxhdGU=']
+    assert buffer.string_ids[0] == NO_STRING
+    assert buffer.string_ids[1] == buffer.string_ids[2]
+
+
+def test_slice_shares_string_table():
+    buffer = ActionBuffer.from_actions(ACTIONS)
+    part = buffer[1:3]
+    assert part.to_list() == ACTIONS[1:3]
+    assert part.strings is buffer.strings
+    
+    # 追加字符串表不同的缓冲区时转换字符串编号
+    other = ActionBuffer()
+    other.append_key(TYPE_KEY_PRESS, 'b', 1.0)
+    other.append_key(TYPE_KEY_PRESS, 'a', 1.1)
+    buffer.extend(other)
+    assert [action.get('key') for action in buffer[-2:]] == ['b', 'a']
+    assert buffer.strings == ['Button.left', 'a', 'dGVtcGxhdGU=', 'b']
+
+
+def test_clear_keeps_strings():
+    buffer = ActionBuffer.from_actions(ACTIONS)
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.duration() == 0.0
+    assert buffer.strings == ['Button.left', 'a', 'dGVtcGxhdGU=']
+
+
+def test_unknown_type_rejected():
+    with pytest.raises(ValueError):
+        ActionBuffer().append({'type': 'teleport', 'timestamp': 0.0})
+
+
+def test_wait_parameters_round_trip():
+    wait = {'type': 'wait', 'condition': 'pixel_color', 'x': 1, 'y': 2, 'width': 1, 'height': 1,
+            'color': [255, 255, 255], 'timeout': 5.0, 'timestamp': 0.7}
+    buffer = ActionBuffer.from_actions(ACTIONS + [wait])
+    assert buffer[-1] == wait
+    assert buffer.duration() == 0.7
+
+
+def test_type_text_round_trip():
+    text = {'type': 'type_text', 'text': 'hello', 'interval': 0.05, 'timestamp': 0.8}
+    buffer = ActionBuffer.from_actions(ACTIONS + [text])
+    assert buffer[-1] == text
+    assert 'hello' in buffer.strings
+
+
+def test_fractional_scroll_round_trip():
+    buffer = ActionBuffer()
+    buffer.append_scroll(1, 2, 0, -3, 0.0)
+    buffer.append_scroll(1, 2, 0.25, -1.5, 0.1)
+    # 整数格数不使用定点数，与旧文件相同
+    assert buffer.flags[0] == 0
+    assert buffer.flags[1] == FLAG_FINE_SCROLL
+    assert buffer.scroll_amount(0) == (0, -3)
+    assert buffer.scroll_amount(1) == (0.25, -1.5)
+    assert buffer[1]['dx'] == 0.25 and buffer[1]['dy'] == -1.5
+    assert ActionBuffer.from_actions(buffer.to_list()).to_list() == buffer.to_list()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+在合成图像上测试锚点模板的截取和匹配
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from app.anchor import AnchorTracker, TemplateGrabber, TemplateMatcher, capture_template, decode_template
+from app.capture import FakeFramebuffer, ScreenCapture
+
+
+WIDTH, HEIGHT = 640, 480
+BACKGROUND = 128
+
+
+def make_screen(seed=1):
+    """
+    生成纯灰背景上带一个随机纹理按钮的屏幕，返回 (帧缓冲, 截图对象, 屏幕图像, 按钮图像)
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((HEIGHT, WIDTH), BACKGROUND, dtype=np.uint8)
+    button = rng.integers(0, 256, (40, 80), dtype=np.uint8)
+    image[200:240, 300:380] = button
+    framebuffer = FakeFramebuffer(image)
+    # 不缓存帧，画面修改后立即可见
+    return framebuffer, ScreenCapture(framebuffer, ttl=0), image, button
+
+
+def move_button(framebuffer, button, shift):
+    """
+    把按钮移动 shift 像素
+    """
+    framebuffer.draw(0, 0, np.full((HEIGHT, WIDTH), BACKGROUND, dtype=np.uint8))
+    framebuffer.draw(300 + shift[0], 200 + shift[1], button)
+
+
+def test_template_capture():
+    framebuffer, capture, image, button = make_screen()
+    # 纹理不足的区域不保存锚点
+    assert capture_template(capture, 50, 50) is None
+    
+    text, template_x, template_y = capture_template(capture, 340, 220)
+    assert (template_x, template_y) == (24, 24)
+    template = decode_template(text)
+    assert template.shape == (48, 48)
+    assert np.array_equal(template, image[196:244, 316:364])
+    
+    # 靠近屏幕边缘时模板被裁剪，点击点在模板中的位置相应变化
+    framebuffer.draw(0, 0, button[:30, :30])
+    _, template_x, template_y = capture_template(capture, 5, 5)
+    assert (template_x, template_y) == (5, 5)
+
+
+def test_grabber_copies_prefetched_region():
+    framebuffer, capture, image, button = make_screen()
+    grabber = TemplateGrabber(capture)
+    grabber._prefetch(340, 220)
+    move_button(framebuffer, button, (40, 0))
+    
+    # 预截区域足够新时直接复制，不再截图
+    grabs = capture.grabs
+    template, template_x, template_y = grabber.request(340, 220).wait(0)
+    assert capture.grabs == grabs
+    assert np.array_equal(template, image[196:244, 316:364])
+    assert (template_x, template_y) == (24, 24)
+    # 模板区域超出预截区域
+    assert not grabber.request(500, 220).event.is_set()
+    assert (grabber.prefetch_hits, grabber.prefetch_misses) == (1, 1)
+
+
+def test_grabber_thread_serves_requests():
+    framebuffer, capture, _, button = make_screen()
+    grabber = TemplateGrabber(capture, max_age=0)
+    grabber._prefetch(340, 220)
+    move_button(framebuffer, button, (40, 0))
+    
+    # 预截区域过旧时由后台线程截取当前画面
+    pending = grabber.request(380, 220)
+    flat = grabber.request(50, 50)
+    assert grabber.prefetch_misses == 2
+    grabber.start()
+    try:
+        grabbed, flat_grabbed = pending.wait(), flat.wait()
+    finally:
+        # 截图缓冲区由后台线程使用，停止后再在测试线程中截图比较
+        grabber.stop()
+    assert np.array_equal(grabbed[0], capture.grab(356, 196, 48, 48))
+    # 纹理不足时没有模板
+    assert flat_grabbed is None
+
+
+@pytest.mark.parametrize('shift', [(0, 0), (13, -7), (-60, 25)])
+def test_tracker_follows_moved_button(shift):
+    framebuffer, capture, _, button = make_screen()
+    text, template_x, template_y = capture_template(capture, 340, 220)
+    move_button(framebuffer, button, shift)
+    
+    tracker = AnchorTracker(capture)
+    matcher = tracker.get_matcher(text)
+    assert tracker.resolve(matcher, 340, 220, template_x, template_y) == shift
+    assert tracker.found == 1
+
+
+def test_tracker_keeps_offset_when_missing():
+    framebuffer, capture, _, button = make_screen()
+    text, template_x, template_y = capture_template(capture, 340, 220)
+    
+    tracker = AnchorTracker(capture)
+    tracker.offset = (5, 5)
+    framebuffer.draw(0, 0, np.full((HEIGHT, WIDTH), BACKGROUND, dtype=np.uint8))
+    assert tracker.resolve(tracker.get_matcher(text), 340, 220, template_x, template_y) == (5, 5)
+    assert tracker.missed == 1
+    
+    # 超出搜索半径的移动同样找不到
+    move_button(framebuffer, button, (250, 0))
+    tracker.reset()
+    assert tracker.resolve(tracker.get_matcher(text), 340, 220, template_x, template_y) == (0, 0)
+    assert tracker.missed == 1
+
+
+def test_undecodable_template():
+    tracker = AnchorTracker(make_screen()[1])
+    assert tracker.get_matcher('bm90IGEgcG5n') is None
+    assert 'bm90IGEgcG5n' in tracker.matchers
+
+
+def test_matcher_with_pyramid():
+    rng = np.random.default_rng(2)
+    frame = rng.integers(0, 256, (200, 300), dtype=np.uint8)
+    matcher = TemplateMatcher(frame[80:140, 150:210].copy())
+    assert matcher.coarse is not None
+    x, y, score = matcher.locate(frame)
+    assert (x, y) == (150, 80)
+    assert score > 0.99
+    assert matcher.locate(np.full((200, 300), 7, dtype=np.uint8)) is None
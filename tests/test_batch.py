@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+批量处理测试：文件查找、清单和续跑
+"""
+
+import json
+import os
+
+import pytest
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS
+from app.batch import (
+    MANIFEST_NAME, BatchSummary, find_macro_files, is_nested, load_manifest, run_batch
+)
+from app.macro_format import load_macro, save_macro
+
+
+def make_tree(root):
+    """
+    在 root 下生成两层目录的宏文件，其中 bad.json 无法解析
+    """
+    actions = ActionBuffer()
+    actions.append_move(1, 2, 0.0)
+    actions.append_move(3, 4, 0.5)
+    save_macro(str(root / 'b.json'), actions)
+    save_macro(str(root / 'a.amc'), actions)
+    (root / 'sub').mkdir()
+    actions.append_key(TYPE_KEY_PRESS, 'a', 1.0)  # 没有释放的按键
+    save_macro(str(root / 'sub' / 'c.json'), actions)
+    (root / 'sub' / 'bad.json').write_text('not json', encoding='utf-8')
+    (root / 'notes.txt').write_text('', encoding='utf-8')
+
+
+def results_by_file(results):
+    return {result['file']: result for result in results}
+
+
+def test_find_macro_files(tmp_path):
+    make_tree(tmp_path)
+    sub = os.path.join('sub', '')
+    assert list(find_macro_files(str(tmp_path))) == ['a.amc', 'b.json', sub + 'bad.json', sub + 'c.json']
+    assert list(find_macro_files(str(tmp_path), recursive=False)) == ['a.amc', 'b.json']
+
+
+def test_validate_reports_issues(tmp_path):
+    make_tree(tmp_path)
+    summary = BatchSummary()
+    results = results_by_file(run_batch(str(tmp_path), 'validate', jobs=1, summary=summary))
+    assert results['a.amc']['ok'] and results['b.json']['ok']
+    assert results[os.path.join('sub', 'c.json')]['issues']
+    assert 'error' in results[os.path.join('sub', 'bad.json')]
+    assert (summary.files, summary.succeeded, summary.failed) == (4, 2, 2)
+
+
+def test_convert_resumes_from_manifest(tmp_path):
+    root = tmp_path / 'in'
+    root.mkdir()
+    make_tree(root)
+    output = tmp_path / 'out'
+    
+    results = results_by_file(run_batch(str(root), 'convert', str(output), jobs=1))
+    converted = output / 'sub' / 'c.amc'
+    assert len(load_macro(str(converted))) == 3
+    assert results[os.path.join('sub', 'c.json')]['output'] == str(converted)
+    
+    # 被中断时写了一半的行被忽略
+    manifest = output / MANIFEST_NAME
+    torn = tmp_path / 'torn.jsonl'
+    torn.write_text(manifest.read_text(encoding='utf-8') + '{"file": "b.js', encoding='utf-8')
+    assert load_manifest(str(torn)) == load_manifest(str(manifest))
+    assert len(load_manifest(str(manifest))) == 4
+    
+    # 续跑时只处理失败的和修改过的文件
+    (root / 'b.json').write_text(json.dumps([]), encoding='utf-8')
+    summary = BatchSummary()
+    results = list(run_batch(str(root), 'convert', str(output), jobs=1, resume=True, summary=summary))
+    assert sorted(result['file'] for result in results) == ['b.json', os.path.join('sub', 'bad.json')]
+    assert summary.skipped == 2
+    assert load_manifest(str(manifest))['b.json']['count'] == 0
+    
+    # 清单末尾有不完整的行时，续跑追加的第一条记录不会与它连在一起
+    with open(manifest, 'a', encoding='utf-8') as f:
+        f.write('{"file": "a.a')
+    os.utime(root / 'a.amc', ns=(0, 0))
+    results = list(run_batch(str(root), 'convert', str(output), jobs=1, resume=True))
+    assert [result['file'] for result in results] == ['a.amc', os.path.join('sub', 'bad.json')]
+    assert load_manifest(str(manifest))['a.amc']['mtime_ns'] == 0
+
+
+def test_parallel_matches_serial(tmp_path):
+    make_tree(tmp_path)
+    serial = results_by_file(run_batch(str(tmp_path), 'stats', jobs=1))
+    parallel = results_by_file(run_batch(str(tmp_path), 'stats', jobs=2))
+    assert serial.keys() == parallel.keys()
+    for name, result in serial.items():
+        assert parallel[name]['ok'] == result['ok']
+        assert parallel[name].get('count') == result.get('count')
+
+
+def test_is_nested(tmp_path):
+    assert is_nested(str(tmp_path), str(tmp_path))
+    assert is_nested(str(tmp_path / 'a' / 'b'), str(tmp_path / 'a'))
+    assert not is_nested(str(tmp_path / 'ab'), str(tmp_path / 'a'))
+    assert not is_nested(str(tmp_path), str(tmp_path / 'a'))
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        list(run_batch(str(tmp_path), 'compress'))
+    with pytest.raises(ValueError):
+        list(run_batch(str(tmp_path), 'convert'))
+    with pytest.raises(ValueError):
+        list(run_batch(str(tmp_path), 'convert', str(tmp_path)))
+    # 输出目录位于输入目录中
+    with pytest.raises(ValueError):
+        list(run_batch(str(tmp_path), 'convert', str(tmp_path / 'out')))
+    assert not (tmp_path / 'out').exists()
+    with pytest.raises(ValueError):
+        list(run_batch(str(tmp_path), 'stats', resume=True))
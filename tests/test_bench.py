@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+基准套件测试：合成数据、结果比较和小规模运行
+"""
+
+from app.action_buffer import TYPE_MOUSE_MOVE
+from app.bench import compare_results, run_benchmarks, synthetic_actions
+
+
+def test_synthetic_actions():
+    actions = synthetic_actions(1000)
+    assert len(actions) == 1000
+    assert list(actions.timestamps) == sorted(actions.timestamps)
+    assert actions.types.count(TYPE_MOUSE_MOVE) > 800
+    # 相同种子生成相同的数据
+    assert synthetic_actions(1000).to_list() == actions.to_list()
+
+
+def test_compare_flags_regressions():
+    old = {'results': {'loop': {'events_per_second': 1000.0, 'p99_ms': 1.0, 'interval_ms': 1.0}}}
+    new = {'results': {'loop': {'events_per_second': 850.0, 'p99_ms': 0.5, 'interval_ms': 9.0}}}
+    rows = {row[0]: row for row in compare_results(old, new, threshold=0.1)}
+    # 只比较吞吐量和延迟
+    assert set(rows) == {'loop.events_per_second', 'loop.p99_ms'}
+    assert rows['loop.events_per_second'][4]
+    assert rows['loop.p99_ms'][3] == 0.5
+    assert not rows['loop.p99_ms'][4]
+
+
+def test_quick_run(tmp_path):
+    names = ('record_move', 'plan_dispatch', 'roundtrip_sample')
+    report = run_benchmarks(names, large_events=2000, sample=str(tmp_path / 'missing.json'), repeat=1)
+    assert set(report['results']) == set(names)
+    assert report['parameters']['large_events'] == 2000
+    assert report['results']['plan_dispatch']['dispatch']['events'] == 2000
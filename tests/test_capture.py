@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+区域截图和帧缓存测试
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from app.capture import FakeFramebuffer, ScreenCapture
+
+
+def make_capture(ttl=60.0, max_buffers=8):
+    """
+    创建以 (100, 50) 为左上角的 200x100 彩色帧缓冲和截图对象
+    """
+    image = np.zeros((100, 200, 3), dtype=np.uint8)
+    image[:, :, 0] = np.arange(200, dtype=np.uint8)  # 蓝色通道随 x 变化
+    image[:, :, 2] = np.arange(100, dtype=np.uint8)[:, None]  # 红色通道随 y 变化
+    framebuffer = FakeFramebuffer(image, origin=(100, 50))
+    return framebuffer, ScreenCapture(framebuffer, ttl=ttl, max_buffers=max_buffers)
+
+
+def test_region_and_pixel():
+    framebuffer, capture = make_capture()
+    assert capture.bounds == (100, 50, 300, 150)
+    assert capture.pixel(110, 70) == (20, 0, 10)
+    color = capture.grab_color(120, 60, 4, 3)
+    assert color.shape == (3, 4, 3)
+    assert color[0, 0].tolist() == [20, 0, 10]
+    assert capture.grab(120, 60, 4, 3).shape == (3, 4)
+
+
+def test_cached_frame_serves_contained_regions():
+    framebuffer, capture = make_capture()
+    capture.prefetch(100, 50, 100, 50)
+    capture.pixel(110, 60)
+    capture.grab(120, 70, 10, 10)
+    assert framebuffer.grab_count == 1
+    assert capture.get_stats()['cache_hits'] == 2
+    
+    # 超出缓存帧的区域重新截图
+    capture.grab(250, 120, 10, 10)
+    assert framebuffer.grab_count == 2
+
+
+def test_ttl_and_invalidate():
+    framebuffer, capture = make_capture(ttl=0)
+    capture.pixel(110, 60)
+    capture.pixel(110, 60)
+    assert framebuffer.grab_count == 2
+    
+    framebuffer, capture = make_capture()
+    capture.pixel(110, 60)
+    framebuffer.draw(110, 60, np.full((1, 1, 3), 255, dtype=np.uint8))
+    assert capture.pixel(110, 60) == (10, 0, 10)
+    capture.invalidate()
+    assert capture.pixel(110, 60) == (255, 255, 255)
+
+
+def test_buffers_reused_and_bounded():
+    framebuffer, capture = make_capture(ttl=0, max_buffers=2)
+    first = capture.grab_color(100, 50, 10, 10)
+    second = capture.grab_color(150, 50, 10, 10)
+    # 同一尺寸复用缓冲区，之前返回的视图被覆盖
+    assert np.shares_memory(first, second)
+    assert first[0, 0, 0] == 50
+    
+    capture.grab(100, 50, 20, 20)
+    capture.grab(100, 50, 30, 30)
+    assert len(capture.buffers) == 2
+
+
+def test_out_of_bounds_rejected():
+    framebuffer, capture = make_capture()
+    with pytest.raises(ValueError):
+        capture.grab(90, 50, 10, 10)
+    with pytest.raises(ValueError):
+        capture.grab(100, 50, 0, 10)
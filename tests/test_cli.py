@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+命令行测试（不需要图形界面和输入设备的命令）
+"""
+
+import json
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS
+from app import cli
+from app.analysis import summarize_actions
+from app.cli import EXIT_FAILURE, EXIT_OK, main
+from app.macro_format import load_macro, open_macro, save_macro
+
+
+def make_actions():
+    """
+    生成一段带轨迹、点击和按键的动作
+    """
+    actions = ActionBuffer()
+    for i in range(50):
+        actions.append_move(10 + i * 4, 20 + i * 2, i * 0.01)
+    actions.append_click(206, 118, 'Button.left', True, 0.6)
+    actions.append_key(TYPE_KEY_PRESS, 'a', 0.7)
+    return actions
+
+
+def test_summarize_actions():
+    summary = summarize_actions(make_actions())
+    assert summary == {
+        'count': 52,
+        'duration': 0.7,
+        'types': {'mouse_move': 50, 'mouse_click': 1, 'key_press': 1},
+        'bounds': (10, 20, 206, 118)
+    }
+    assert summarize_actions([])['bounds'] is None
+
+
+def test_convert_and_info(tmp_path, capsys):
+    source = str(tmp_path / 'macro.json')
+    target = str(tmp_path / 'macro.amc')
+    save_macro(source, make_actions())
+    
+    assert main(['convert', source, target]) == EXIT_OK
+    assert load_macro(target).to_list() == make_actions().to_list()
+    
+    # 简化轨迹后直线上的中间点被删除
+    simplified = str(tmp_path / 'simple.amc')
+    assert main(['convert', source, simplified, '--simplify']) == EXIT_OK
+    assert len(load_macro(simplified)) == 4
+    
+    capsys.readouterr()
+    assert main(['info', '--json', target]) == EXIT_OK
+    info = json.loads(capsys.readouterr().out)
+    assert info['file'] == target
+    assert info['count'] == 52
+
+
+def test_info_reports_unreadable_files(tmp_path, capsys):
+    broken = tmp_path / 'broken.amc'
+    broken.write_bytes(b'not a macro')
+    good = str(tmp_path / 'good.amc')
+    save_macro(good, make_actions())
+    
+    assert main(['info', str(broken), good]) == EXIT_FAILURE
+    captured = capsys.readouterr()
+    assert 'broken.amc' in captured.err
+    assert '事件数: 52' in captured.out
+
+
+def test_play_closes_macro(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'macro.amc')
+    save_macro(filename, make_actions())
+    opened = []
+    
+    def record_open(*args):
+        opened.append(open_macro(*args))
+        return opened[-1]
+    
+    monkeypatch.setattr(cli, 'open_macro', record_open)
+    assert main(['play', filename, '--backend', 'memory', '--speed', '4']) == EXIT_OK
+    assert main(['info', filename]) == EXIT_OK
+    # 回放和查看结束后文件映射都已关闭
+    assert len(opened) == 2
+    assert all(macro.map is None for macro in opened)
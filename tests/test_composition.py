@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+组合文档和文字输入步骤测试
+"""
+
+import json
+
+import pytest
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+from app.composition import Composition, CompositionError
+from app.input_backend import FakeBackend
+from app.macro_format import load_macro, open_macro, save_macro
+from app.player import Player
+from app.text import collapse_text, rate_to_interval, text_duration, text_keys
+
+
+# 时间相关断言的容差（秒）
+TOLERANCE = 0.05
+
+
+def write_document(path, steps, params=None):
+    """
+    写入组合文档
+    """
+    document = {'version': 1, 'steps': steps}
+    if params is not None:
+        document['params'] = params
+    path.write_text(json.dumps(document), encoding='utf-8')
+    return str(path)
+
+
+def make_library(tmp_path):
+    """
+    写入一个时长 0.2 秒的二进制宏，返回其动作
+    """
+    actions = ActionBuffer()
+    for i in range(3):
+        actions.append_move(i, i, i * 0.1)
+    save_macro(str(tmp_path / 'moves.amc'), actions)
+    return actions
+
+
+def test_sequence_loop_and_delay(tmp_path):
+    make_library(tmp_path)
+    filename = write_document(tmp_path / 'main.amx', [
+        {'loop': 2, 'steps': [
+            {'macro': 'moves.amc'},
+            {'delay': 0.5}
+        ]},
+        {'macro': 'moves.amc'},
+        {'delay': 1.0}
+    ])
+    
+    with Composition(filename) as composition:
+        actions = composition.read_all()
+        assert len(composition) == 9
+        # 同一个宏文件只加载一次
+        assert len(composition.segments) == 1
+        # 每次调用在前一步结束后开始
+        starts = [actions.timestamps[i] for i in (0, 3, 6)]
+        assert starts == pytest.approx([0.0, 0.7, 1.4])
+        # 时长包括文档末尾的延时
+        assert composition.duration() == pytest.approx(2.6)
+        
+        # 从中间开始时块的内容与完整展开的结果一致
+        base, buffer = next(composition.iter_buffers(5))
+        assert buffer.to_list() == actions[base:base + len(buffer)].to_list()
+
+
+def test_type_text_and_params(tmp_path):
+    make_library(tmp_path)
+    write_document(tmp_path / 'greet.amx', [
+        {'type_text': 'hi {name}', 'interval': 0.1},
+        {'macro': 'moves.amc'}
+    ], params={'name': 'there'})
+    filename = write_document(tmp_path / 'main.amx', [
+        {'macro': 'greet.amx', 'params': {'name': '{who}'}}
+    ], params={'who': 'you'})
+    
+    actions = load_macro(filename)
+    assert actions[0] == {'type': 'type_text', 'text': 'hi you', 'interval': 0.1, 'timestamp': 0.0}
+    # 之后的宏在文字输入结束后开始
+    assert actions.timestamps[1] == pytest.approx(text_duration(6, 0.1))
+    
+    # 引用未定义的参数
+    with pytest.raises(CompositionError):
+        Composition(write_document(tmp_path / 'bad.amx', [{'type_text': '{missing}'}]))
+
+
+def test_macro_files_mapped_lazily(tmp_path):
+    make_library(tmp_path)
+    filename = write_document(tmp_path / 'main.amx', [{'macro': 'moves.amc'}])
+    
+    composition = Composition(filename)
+    source = next(iter(composition.segments.values()))
+    # 打开时只读取索引
+    assert source.macro is None
+    assert composition.duration() == pytest.approx(0.2)
+    composition.read_all()
+    assert source.macro is not None
+    composition.close()
+    assert source.macro is None
+    
+    # 打开文档后宏文件被改写
+    actions = ActionBuffer()
+    actions.append_move(0, 0, 0.0)
+    save_macro(str(tmp_path / 'moves.amc'), actions)
+    with pytest.raises(CompositionError):
+        composition.read_all()
+    composition.close()
+
+
+@pytest.mark.parametrize('steps', [
+    [{'macro': 'main.amx'}],
+    [{'loop': -1, 'steps': []}],
+    [{'delay': -1}],
+    [{'teleport': 1}],
+    [{'type_text': 'a\x01b'}],
+    [{'macro': 'missing.amc'}],
+])
+def test_invalid_document_rejected(tmp_path, steps):
+    filename = write_document(tmp_path / 'main.amx', steps)
+    with pytest.raises(CompositionError):
+        Composition(filename)
+
+
+def test_player_plays_composition(tmp_path):
+    make_library(tmp_path)
+    filename = write_document(tmp_path / 'main.amx', [{'loop': 2, 'steps': [{'macro': 'moves.amc'}]}])
+    backend = FakeBackend()
+    player = Player(backend)
+    with open_macro(filename) as composition:
+        player.set_actions(composition)
+        assert player.plan is None
+        player.start_playing()
+    assert [event[2] for event in backend.events] == [0, 1, 2, 0, 1, 2]
+
+
+def test_text_keys():
+    assert text_keys('a b\n') == ['a', 'Key.space', 'b', 'Key.enter']
+    with pytest.raises(ValueError):
+        text_keys('\x01')
+    assert rate_to_interval(20) == 0.05
+    assert rate_to_interval(0) == 0.0
+
+
+def test_collapse_text_keeps_following_gap():
+    actions = ActionBuffer()
+    for i, char in enumerate('abc'):
+        actions.append_key(TYPE_KEY_PRESS, char, i * 0.2)
+        actions.append_key(TYPE_KEY_RELEASE, char, i * 0.2 + 0.05)
+    actions.append_move(1, 1, 1.0)
+    
+    collapsed = collapse_text(actions, interval=0.01)
+    assert len(collapsed) == 2
+    assert collapsed[0]['text'] == 'abc'
+    # 原来最后一个按键释放后 0.55 秒移动鼠标，合并后仍在步骤结束后 0.55 秒
+    assert collapsed.timestamps[1] == pytest.approx(text_duration(3, 0.01) + 0.55)
+
+
+def test_collapse_text_keeps_modifiers():
+    actions = ActionBuffer()
+    actions.append_key(TYPE_KEY_PRESS, 'Key.shift', 0.0)
+    for i, char in enumerate('AB'):
+        actions.append_key(TYPE_KEY_PRESS, char, 0.1 + i * 0.1)
+        actions.append_key(TYPE_KEY_RELEASE, char, 0.15 + i * 0.1)
+    actions.append_key(TYPE_KEY_RELEASE, 'Key.shift', 0.4)
+    actions.append_key(TYPE_KEY_PRESS, 'x', 0.5)
+    actions.append_key(TYPE_KEY_RELEASE, 'x', 0.55)
+    
+    # 修饰键打断合并，字符仍在修饰键按下期间输入；单个字符不合并
+    collapsed = collapse_text(actions).to_list()
+    assert [action['type'] for action in collapsed] == [
+        'key_press', 'type_text', 'key_release', 'key_press', 'key_release'
+    ]
+    assert collapsed[1]['text'] == 'AB'
+
+
+@pytest.mark.parametrize('speed', [1.0, 2.0])
+def test_player_type_text_timing(speed):
+    actions = ActionBuffer()
+    actions.append_text('abcd', 0.05, 0.0)
+    actions.append_move(1, 1, text_duration(4, 0.05) + 0.1)
+    backend = FakeBackend()
+    player = Player(backend)
+    player.set_actions(actions)
+    player.set_speed(speed)
+    player.start_playing()
+    
+    events = backend.events
+    presses = [event for event in events if event[1] == 'press_key']
+    assert [event[2] for event in presses] == ['a', 'b', 'c', 'd']
+    for previous, event in zip(presses, presses[1:]):
+        assert (event[0] - previous[0]) / 1e9 == pytest.approx(0.05 / speed, abs=TOLERANCE)
+    # 最后一个字符输入后步骤即结束，之后的动作不多等一个间隔
+    assert events[-1][1] == 'move'
+    assert (events[-1][0] - presses[-1][0]) / 1e9 == pytest.approx(0.1 / speed, abs=TOLERANCE)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+输入后端接口测试
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app import input_backend
+from app.input_backend import (
+    BACKENDS, FakeBackend, HeldInput, InputBackend, InputBackendError,
+    create_backend, register_backend
+)
+
+
+def test_fake_backend_records_injected_events():
+    backend = FakeBackend()
+    assert backend.resolve_key('a') == 'a'
+    assert backend.resolve_key('Key.shift') == 'Key.shift'
+    assert backend.resolve_key('shift') is None
+    assert backend.resolve_button('Button.left') == 'Button.left'
+    assert backend.resolve_button('left') is None
+    
+    backend.move(3, 4)
+    backend.press_button('Button.left')
+    backend.scroll(0, -1)
+    backend.press_key('a')
+    assert [event[1:] for event in backend.events] == [
+        ('move', 3, 4), ('press_button', 'Button.left'), ('scroll', 0, -1), ('press_key', 'a')
+    ]
+    
+    # 不记录时只跟踪鼠标位置
+    backend = FakeBackend(record=False)
+    backend.move(5, 6)
+    backend.press_key('a')
+    assert backend.events == []
+    assert backend.position == (5, 6)
+
+
+def test_fake_listeners_receive_emitted_input():
+    backend = FakeBackend()
+    received = []
+    listeners = backend.create_listeners(
+        lambda *args: received.append(('move', *args)),
+        lambda *args: received.append(('click', *args)),
+        lambda *args: received.append(('scroll', *args)),
+        lambda *args: received.append(('press', *args)),
+        lambda *args: received.append(('release', *args))
+    )
+    
+    # 启动前和停止后的输入不会传给回调
+    backend.emit_move(0, 0)
+    for listener in listeners:
+        listener.start()
+    backend.emit_move(1, 2)
+    backend.emit_click(1, 2, 'Button.left', True)
+    backend.emit_press('a')
+    for listener in listeners:
+        listener.stop()
+    backend.emit_release('a')
+    assert received == [('move', 1, 2), ('click', 1, 2, 'Button.left', True), ('press', 'a')]
+
+
+def test_builtin_backends_implement_interface():
+    for factory in BACKENDS.values():
+        assert not factory.__abstractmethods__
+
+
+def test_incomplete_backend_rejected(monkeypatch):
+    class MoveOnly(InputBackend):
+        def move(self, x, y):
+            pass
+    
+    with pytest.raises(TypeError):
+        MoveOnly()
+    monkeypatch.setitem(BACKENDS, 'move-only', MoveOnly)
+    with pytest.raises(InputBackendError):
+        create_backend('move-only')
+
+
+def test_held_input_release_all():
+    backend = FakeBackend()
+    held = HeldInput()
+    held.keys['Key.shift'] = None
+    held.keys['a'] = None
+    held.buttons['Button.left'] = None
+    assert held.snapshot() == (['Key.shift', 'a'], ['Button.left'])
+    assert held.release_all(backend) == 0
+    assert not held
+    # 按下的相反顺序释放
+    assert [event[1:] for event in backend.events] == [
+        ('release_key', 'a'), ('release_key', 'Key.shift'), ('release_button', 'Button.left')
+    ]
+
+
+class FakeDisplay:
+    """
+    代替 Xlib 的 Display：小写字母和 Shift 组成的键盘映射，记录发送缓冲区和已写出的请求
+    """
+    
+    KEYCODES = {ord(char): [(10 + i, 0)] for i, char in enumerate('abcdefghijklmnopqrstuvwxyz')}
+    KEYCODES.update({ord(char): [(10 + i, 1)] for i, char in enumerate('ABCDEFGHIJKLMNOPQRSTUVWXYZ')})
+    KEYCODES.update({0xffe1: [(50, 0)], 0xffe2: [(62, 0)], 0xff1b: [(9, 0)]})
+    
+    def __init__(self, name=None):
+        self.pending = []
+        self.sent = []
+        self.closed = False
+    
+    def has_extension(self, name):
+        return name == 'XTEST'
+    
+    def keysym_to_keycodes(self, keysym):
+        return list(self.KEYCODES.get(keysym, []))
+    
+    def keysym_to_keycode(self, keysym):
+        codes = self.KEYCODES.get(keysym)
+        return codes[0][0] if codes else 0
+    
+    def flush(self):
+        self.sent.extend(self.pending)
+        self.pending = []
+    
+    def close(self):
+        self.closed = True
+
+
+def fake_input(display, event_type, detail=0, x=0, y=0):
+    if event_type == 'motion':
+        display.pending.append((event_type, x, y))
+    else:
+        display.pending.append((event_type, detail))
+
+
+@pytest.fixture
+def xtest_backend(monkeypatch):
+    """
+    使用假 Xlib 模块创建的 XTEST 后端
+    """
+    keysyms = {'Shift_L': 0xffe1, 'Shift_R': 0xffe2, 'Escape': 0xff1b}
+    monkeypatch.setattr(input_backend, 'Display', FakeDisplay)
+    monkeypatch.setattr(input_backend, 'xtest', SimpleNamespace(fake_input=fake_input))
+    monkeypatch.setattr(input_backend, 'X', SimpleNamespace(
+        MotionNotify='motion', ButtonPress='button_press', ButtonRelease='button_release',
+        KeyPress='key_press', KeyRelease='key_release'
+    ))
+    monkeypatch.setattr(input_backend, 'XK', SimpleNamespace(
+        XK_Shift_L=0xffe1, XK_Shift_R=0xffe2, load_keysym_group=lambda name: None,
+        string_to_keysym=lambda name: keysyms.get(name, 0)
+    ))
+    return create_backend('xtest')
+
+
+def test_registry(monkeypatch):
+    assert isinstance(create_backend('memory'), FakeBackend)
+    with pytest.raises(InputBackendError):
+        create_backend('bogus')
+    
+    monkeypatch.setitem(BACKENDS, 'custom', lambda: 'custom backend')
+    assert create_backend('custom') == 'custom backend'
+    # 测试结束后 monkeypatch 删除注册的后端
+    monkeypatch.setitem(BACKENDS, 'broken', None)
+    register_backend('broken', lambda: 1 / 0)
+    with pytest.raises(InputBackendError):
+        create_backend('broken')
+
+
+def test_xtest_requires_xlib(monkeypatch):
+    monkeypatch.setattr(input_backend, 'Display', None)
+    with pytest.raises(InputBackendError):
+        create_backend('xtest')
+
+
+def test_xtest_resolves_keys(xtest_backend):
+    assert xtest_backend.resolve_key('a') == (10, False)
+    assert xtest_backend.resolve_key('A') == (10, True)
+    assert xtest_backend.resolve_key('Key.esc') == (9, False)
+    assert xtest_backend.resolve_key('Key.bogus') is None
+    assert xtest_backend.resolve_key('\x01') is None
+    assert xtest_backend.resolve_button('Button.right') == 3
+    assert xtest_backend.resolve_button('Button.bogus') is None
+
+
+def test_xtest_batches_until_flush(xtest_backend):
+    display = xtest_backend.display
+    xtest_backend.move(1.6, 2)
+    xtest_backend.press_button(1)
+    xtest_backend.scroll(-1, 2)
+    assert display.sent == []
+    
+    xtest_backend.flush()
+    assert display.sent == [
+        ('motion', 1, 2), ('button_press', 1),
+        ('button_press', 4), ('button_release', 4), ('button_press', 4), ('button_release', 4),
+        ('button_press', 6), ('button_release', 6)
+    ]
+    xtest_backend.close()
+    assert display.closed
+
+
+def test_xtest_wraps_shifted_keys(xtest_backend):
+    key = xtest_backend.resolve_key('A')
+    xtest_backend.press_key(key)
+    xtest_backend.release_key(key)
+    xtest_backend.flush()
+    assert xtest_backend.display.sent == [
+        ('key_press', 50), ('key_press', 10), ('key_release', 10), ('key_release', 50)
+    ]
+
+
+def test_xtest_overlapping_shifted_keys(xtest_backend):
+    a, b = xtest_backend.resolve_key('A'), xtest_backend.resolve_key('B')
+    xtest_backend.press_key(a)
+    xtest_backend.press_key(b)
+    xtest_backend.release_key(a)
+    xtest_backend.release_key(b)
+    xtest_backend.flush()
+    # 最后一个需要 Shift 的按键释放后才松开 Shift
+    assert xtest_backend.display.sent == [
+        ('key_press', 50), ('key_press', 10), ('key_press', 11),
+        ('key_release', 10), ('key_release', 11), ('key_release', 50)
+    ]
+
+
+def test_xtest_keeps_macro_shift(xtest_backend):
+    shift, key = xtest_backend.resolve_key('Key.shift'), xtest_backend.resolve_key('A')
+    xtest_backend.press_key(shift)
+    xtest_backend.press_key(key)
+    xtest_backend.release_key(key)
+    xtest_backend.release_key(shift)
+    
+    # 宏先按下的 Shift 在需要 Shift 的按键后仍然按住
+    xtest_backend.press_key(key)
+    xtest_backend.press_key(shift)
+    xtest_backend.release_key(key)
+    xtest_backend.release_key(shift)
+    xtest_backend.flush()
+    assert xtest_backend.display.sent == [
+        ('key_press', 50), ('key_press', 10), ('key_release', 10), ('key_release', 50),
+        ('key_press', 50), ('key_press', 10), ('key_release', 10), ('key_release', 50)
+    ]
+
+
+def test_xtest_accumulates_fractional_scroll(xtest_backend):
+    for _ in range(4):
+        xtest_backend.scroll(0, 0.5)
+    xtest_backend.scroll(-0.25, 0)
+    xtest_backend.flush()
+    # 满一格时才注入
+    assert xtest_backend.display.sent == [('button_press', 4), ('button_release', 4)] * 2
+    assert xtest_backend.scroll_remainder == [-0.25, 0.0]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+任务队列测试：cron 触发条件、队列持久化和依次回放
+"""
+
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from app import jobs
+from app.action_buffer import ActionBuffer
+from app.input_backend import FakeBackend
+from app.jobs import CronTrigger, JobError, JobQueue, JobRunner
+from app.macro_format import open_macro, save_macro
+
+
+def at(*fields):
+    """
+    本地时间的时间戳
+    """
+    return datetime(*fields).timestamp()
+
+
+def test_cron_next_after():
+    trigger = CronTrigger('*/15 9-17 * * 1-5')
+    # 2026-10-16 是星期五
+    assert trigger.next_after(at(2026, 10, 16, 9, 7)) == at(2026, 10, 16, 9, 15)
+    assert trigger.next_after(at(2026, 10, 16, 9, 15)) == at(2026, 10, 16, 9, 30)
+    assert trigger.next_after(at(2026, 10, 16, 17, 45)) == at(2026, 10, 19, 9, 0)
+    
+    assert CronTrigger('7:30').next_after(at(2026, 10, 16, 8, 0)) == at(2026, 10, 17, 7, 30)
+    assert CronTrigger('@monthly').next_after(at(2026, 12, 5)) == at(2027, 1, 1)
+    assert CronTrigger('0 12 29 2 *').next_after(at(2026, 3, 1)) == at(2028, 2, 29, 12, 0)
+
+
+def test_cron_day_or_weekday():
+    # 日和星期都指定时满足其一即可，7 也表示星期日
+    trigger = CronTrigger('0 0 1 * 7')
+    assert trigger.next_after(at(2026, 10, 16)) == at(2026, 10, 18)
+    assert trigger.next_after(at(2026, 10, 26)) == at(2026, 11, 1)
+
+
+@pytest.mark.parametrize('expression', [
+    '* * * *', '60 * * * *', '*/0 * * * *', '5-1 * * * *', 'a * * * *', '25:00', '0 0 31 2 *'
+])
+def test_cron_invalid(expression):
+    with pytest.raises(JobError):
+        CronTrigger(expression).next_after(at(2026, 1, 1))
+
+
+def test_queue_persists_and_requeues_running(tmp_path):
+    path = str(tmp_path / 'jobs.json')
+    queue = JobQueue(path)
+    low = queue.add('a.amc', now=0)
+    high = queue.add('b.amc', priority=5, now=0)
+    timed = queue.add('c.amc', trigger='@hourly', now=at(2026, 10, 16, 9, 30))
+    with pytest.raises(JobError):
+        queue.add('d.amc', speed=0)
+    
+    # 同时到期时优先级高的先执行，有触发条件的任务到时间才到期
+    assert queue.next_due(at(2026, 10, 16, 9, 31)).id == high.id
+    assert queue.next_due(at(2026, 10, 16, 9, 31), exclude=high.id).id == low.id
+    queue.start(high)
+    
+    # 重启后正在运行的任务重新排队
+    reloaded = JobQueue(path)
+    assert [job.id for job in reloaded.list()] == [high.id, low.id, timed.id]
+    assert reloaded.get(high.id).state == 'pending'
+    assert reloaded.get(timed.id).next_run == at(2026, 10, 16, 10, 0)
+    assert reloaded.add('e.amc').id == 4
+    
+    # 有触发条件的任务执行后计算下一次到期时间，其他任务标记为完成或失败
+    job = reloaded.finish(reloaded.get(timed.id), now=at(2026, 10, 16, 10, 0))
+    assert (job.state, job.runs, job.next_run) == ('pending', 1, at(2026, 10, 16, 11, 0))
+    reloaded.finish(reloaded.get(low.id), error='boom')
+    reloaded.finish(reloaded.get(high.id))
+    assert reloaded.clear_finished() == 2
+    assert len(JobQueue(path)) == 2
+
+
+def test_queue_reads_external_changes(tmp_path):
+    path = tmp_path / 'jobs.json'
+    queue = JobQueue(str(path))
+    queue.add('a.amc')
+    
+    # 其他进程（如命令行）加入的任务
+    other = JobQueue(str(path))
+    other.add('b.amc')
+    # 文件系统的时间精度较低时两次写入的修改时间可能相同
+    os.utime(path, ns=(queue.file_mtime + 10**9, queue.file_mtime + 10**9))
+    assert queue.refresh()
+    assert len(queue) == 2
+    assert not queue.refresh()
+    
+    data = json.loads(path.read_text(encoding='utf-8'))
+    data['version'] = 99
+    path.write_text(json.dumps(data), encoding='utf-8')
+    with pytest.raises(JobError):
+        JobQueue(str(path))
+
+
+def test_runner_plays_due_jobs(tmp_path):
+    actions = ActionBuffer()
+    actions.append_move(1, 1, 0.0)
+    actions.append_move(2, 2, 0.01)
+    save_macro(str(tmp_path / 'a.amc'), actions)
+    save_macro(str(tmp_path / 'b.json'), actions)
+    
+    queue = JobQueue(str(tmp_path / 'jobs.json'))
+    first = queue.add(str(tmp_path / 'a.amc'), repeat=2)
+    second = queue.add(str(tmp_path / 'b.json'), priority=1)
+    missing = queue.add(str(tmp_path / 'missing.amc'))
+    
+    backend = FakeBackend()
+    runner = JobRunner(queue, backend)
+    finished = []
+    runner.job_finished.connect(lambda job: finished.append((job.id, job.state)))
+    runner.run(until_idle=True)
+    runner.close()
+    
+    assert finished == [(second.id, 'done'), (first.id, 'done'), (missing.id, 'failed')]
+    assert [event[2] for event in backend.events] == [1, 2, 1, 2, 1, 2]
+    assert queue.get(missing.id).last_error
+    # 无法打开的任务不计加载时间
+    assert len(runner.load_seconds) == 2
+
+
+def test_runner_closes_opened_macros(tmp_path, monkeypatch):
+    actions = ActionBuffer()
+    actions.append_move(1, 1, 0.0)
+    for name in ('a.amc', 'b.amc', 'c.amc'):
+        save_macro(str(tmp_path / name), actions)
+    opened = []
+    
+    def record_open(path):
+        opened.append(open_macro(path))
+        return opened[-1]
+    
+    monkeypatch.setattr(jobs, 'open_macro', record_open)
+    queue = JobQueue(str(tmp_path / 'jobs.json'))
+    first = queue.add(str(tmp_path / 'a.amc'))
+    queue.add(str(tmp_path / 'b.amc'), priority=1)
+    later = queue.add(str(tmp_path / 'c.amc'), trigger='0 0 1 1 *', now=at(2026, 1, 2))
+    
+    runner = JobRunner(queue, FakeBackend())
+    runner.run(until_idle=True)
+    # 被新的预加载替换和关闭时未使用的预加载同样关闭
+    runner.preload(first)
+    runner.preload(later)
+    runner.close()
+    assert len(opened) >= 4
+    assert all(macro.map is None for macro in opened)
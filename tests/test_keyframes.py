@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+关键帧索引测试：输入状态和分块定位
+"""
+
+import pytest
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+from app.keyframes import InputState, KeyframeIndex
+from app.timeline import TimelineTransform
+
+
+def make_actions():
+    """
+    按住 Shift 拖动，中间有一段长时间空闲
+    """
+    actions = ActionBuffer()
+    actions.append_key(TYPE_KEY_PRESS, 'Key.shift', 0.0)
+    actions.append_click(1, 1, 'Button.left', True, 0.1)
+    actions.append_move(2, 2, 0.2)
+    actions.append_move(3, 3, 10.2)
+    actions.append_click(3, 3, 'Button.left', False, 10.3)
+    actions.append_key(TYPE_KEY_RELEASE, 'Key.shift', 10.4)
+    actions.append_scroll(7, 8, 0, -1, 10.5)
+    return actions
+
+
+def chunks(actions, size):
+    for base in range(0, len(actions), size):
+        yield base, actions[base:base + size]
+
+
+def test_input_state_tracks_held_input():
+    actions = make_actions()
+    state = InputState().advance(actions, 0, 3)
+    assert state == InputState(['Key.shift'], ['Button.left'], 2, 2)
+    assert state.to_dict() == {'keys': ['Key.shift'], 'buttons': ['Button.left'], 'position': (2, 2)}
+    
+    copied = state.copy()
+    state.advance(actions, 3)
+    assert state == InputState(x=7, y=8)
+    assert copied.keys == {'Key.shift': None}
+
+
+def test_index_locates_chunks():
+    actions = make_actions()
+    transform = TimelineTransform(max_gap=1.0)
+    index = KeyframeIndex.build(chunks(actions, 3), transform)
+    assert len(index) == 3
+    assert index.count == len(actions)
+    assert index.duration == pytest.approx(1.5)
+    
+    # 关键帧保存块开始前的状态和变换后的时间
+    keyframe = index.find_index(4)
+    assert keyframe.index == 3
+    assert keyframe.time == pytest.approx(1.2)
+    assert keyframe.state == InputState(['Key.shift'], ['Button.left'], 2, 2)
+    assert index.find_time(1.1).index == 0
+    assert index.find_time(1.45).index == 3
+    assert index.find_time(2.0).index == 6
+    
+    # 从关键帧的游标继续变换，得到与整体变换相同的时间戳
+    cursor = keyframe.cursor
+    assert list(cursor.advance(actions[3:])) == pytest.approx(list(transform.apply(actions))[3:])
+
+
+def test_index_rejects_gaps():
+    index = KeyframeIndex(TimelineTransform())
+    with pytest.raises(IndexError):
+        index.find_time(0.0)
+    actions = make_actions()
+    index.add(0, actions[:2])
+    with pytest.raises(ValueError):
+        index.add(3, actions[3:])
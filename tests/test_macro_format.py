@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+宏文件格式（.amc/.json）的读写测试
+"""
+
+import io
+import struct
+
+import pytest
+
+from app import macro_format
+from app.macro_format import (
+    DEFAULT_BATCH_SIZE, FLAG_JOURNAL, FORMAT_VERSION, MAGIC, MacroFormatError,
+    MacroReader, MacroWriter, MappedMacro, load_macro, open_macro, save_macro
+)
+
+
+def make_actions(count=0):
+    """
+    生成包含所有动作类型的动作列表，count 为之后追加的鼠标移动数
+    """
+    actions = [
+        {'type': 'mouse_move', 'x': 10, 'y': 20, 'timestamp': 0.0},
+        {'type': 'mouse_click', 'x': 10, 'y': 20, 'button': 'Button.left', 'pressed': True, 'timestamp': 0.1},
+        {'type': 'mouse_click', 'x': 10, 'y': 20, 'button': 'Button.left', 'pressed': False, 'timestamp': 0.15},
+        {'type': 'mouse_scroll', 'x': 10, 'y': 20, 'dx': 0, 'dy': -3, 'timestamp': 0.2},
+        {'type': 'key_press', 'key': 'Key.shift', 'timestamp': 0.3},
+        {'type': 'key_press', 'key': '中', 'timestamp': 0.35},
+        {'type': 'key_release', 'key': '中', 'timestamp': 0.4},
+        {'type': 'key_release', 'key': 'Key.shift', 'timestamp': 0.45},
+        {'type': 'anchor', 'x': 10, 'y': 20, 'template': 'dGVtcGxhdGU=',
+         'template_x': 24, 'template_y': 24, 'timestamp': 0.5},
+        {'type': 'wait', 'condition': 'region_changed', 'x': 0, 'y': 0, 'width': 400, 'height': 300,
+         'timeout': 5.0, 'on_timeout': 'continue', 'timestamp': 0.6},
+    ]
+    for i in range(count):
+        actions.append({'type': 'mouse_move', 'x': i % 1000, 'y': i // 1000, 'timestamp': 1.0 + i * 0.001})
+    return actions
+
+
+def write_bytes(actions, batch_size, flags=0):
+    """
+    把动作写入内存中的二进制宏文件
+    """
+    buffer = io.BytesIO()
+    with MacroWriter(buffer, batch_size=batch_size, flags=flags) as writer:
+        writer.write_many(actions)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('extension', ['.amc', '.json'])
+def test_round_trip(tmp_path, extension):
+    actions = make_actions()
+    actions.append({'type': 'type_text', 'text': 'hello 中文', 'interval': 0.05, 'timestamp': 0.7})
+    actions.append({'type': 'mouse_scroll', 'x': 10, 'y': 20, 'dx': 0.5, 'dy': -1.25, 'timestamp': 0.8})
+    filename = str(tmp_path / ('macro' + extension))
+    save_macro(filename, actions)
+    assert list(load_macro(filename)) == actions
+
+
+def test_streaming_batches():
+    # 批次很小时记录和字符串分布在多个块中，逐块读取的结果不变
+    actions = make_actions(50)
+    data = write_bytes(actions, batch_size=3)
+    assert list(MacroReader(io.BytesIO(data))) == actions
+    assert len(data) < len(write_bytes(actions, batch_size=1))
+
+
+def test_newer_version_rejected():
+    data = bytearray(write_bytes(make_actions(), batch_size=4))
+    assert struct.unpack_from('<H', data, len(MAGIC))[0] == FORMAT_VERSION == 4
+    struct.pack_into('<H', data, len(MAGIC), FORMAT_VERSION + 1)
+    with pytest.raises(MacroFormatError, match='更新版本'):
+        list(MacroReader(io.BytesIO(bytes(data))))
+
+
+def test_older_versions_accepted():
+    # 旧版本写入的文件仍可读取
+    actions = make_actions()[:8]
+    data = bytearray(write_bytes(actions, batch_size=4))
+    for version in range(1, FORMAT_VERSION):
+        struct.pack_into('<H', data, len(MAGIC), version)
+        assert list(MacroReader(io.BytesIO(bytes(data)))) == actions
+
+
+def test_damaged_file_rejected():
+    data = bytearray(write_bytes(make_actions(), batch_size=4))
+    data[-1] ^= 0xFF  # 破坏最后一个块的负载，校验失败
+    with pytest.raises(MacroFormatError):
+        list(MacroReader(io.BytesIO(bytes(data))))
+    with pytest.raises(MacroFormatError):
+        list(MacroReader(io.BytesIO(b'JSON' + bytes(data[4:]))))
+
+
+@pytest.mark.parametrize('cut', [1, 10, 100])
+def test_truncated_journal_recovers(tmp_path, cut):
+    # 日志末尾的块写到一半时崩溃：读到最后一个完整的块为止
+    actions = make_actions(20)
+    data = write_bytes(actions, batch_size=10, flags=FLAG_JOURNAL)
+    reader = MacroReader(io.BytesIO(data[:-cut]))
+    recovered = list(reader)
+    assert reader.truncated
+    assert recovered == actions[:len(recovered)]
+    assert len(recovered) == 20
+    
+    filename = tmp_path / 'journal.amc'
+    filename.write_bytes(data[:-cut])
+    assert list(load_macro(str(filename))) == recovered
+    
+    # 普通文件同样的损坏仍然报错，也可以显式要求恢复
+    data = write_bytes(actions, batch_size=10)
+    with pytest.raises(MacroFormatError):
+        list(MacroReader(io.BytesIO(data[:-cut])))
+    assert len(list(MacroReader(io.BytesIO(data[:-cut]), recover=True))) == 20
+
+
+def test_mapped_macro_chunks(tmp_path):
+    actions = make_actions(DEFAULT_BATCH_SIZE * 2 + 100)
+    filename = str(tmp_path / 'macro.amc')
+    save_macro(filename, actions)
+    
+    with open_macro(filename) as macro:
+        assert isinstance(macro, MappedMacro)
+        assert len(macro) == len(actions)
+        assert macro.duration() == actions[-1]['timestamp']
+        assert macro.read_all().to_list() == actions
+        
+        # 从中间开始读取时第一块从包含 start 的块开始
+        start = DEFAULT_BATCH_SIZE + 7
+        chunks = list(macro.iter_buffers(start))
+        base, buffer = chunks[0]
+        assert base <= start < base + len(buffer)
+        assert buffer.to_list() == actions[base:base + len(buffer)]
+        assert base + sum(len(chunk) for _, chunk in chunks) == len(actions)
+    
+    # JSON 文件整体读入内存
+    filename = str(tmp_path / 'macro.json')
+    save_macro(filename, actions[:10])
+    assert open_macro(filename).to_list() == actions[:10]
+
+
+def test_mapped_journal_recovers(tmp_path):
+    filename = tmp_path / 'journal.amc'
+    actions = make_actions(20)
+    filename.write_bytes(write_bytes(actions, batch_size=10, flags=FLAG_JOURNAL)[:-5])
+    with MappedMacro(str(filename)) as macro:
+        assert macro.truncated
+        assert macro.read_all().to_list() == actions[:20]
+
+
+def test_failed_save_keeps_original(tmp_path):
+    filename = str(tmp_path / 'macro.amc')
+    save_macro(filename, make_actions())
+    with pytest.raises(Exception):
+        save_macro(filename, [{'type': 'teleport', 'timestamp': 0.0}])
+    assert list(load_macro(filename)) == make_actions()
+    assert not (tmp_path / 'macro.amc.tmp').exists()
+
+
+@pytest.mark.parametrize('release', [False, True])
+def test_save_over_mapped_file(tmp_path, monkeypatch, release):
+    monkeypatch.setattr(macro_format, '_RELEASE_BEFORE_REPLACE', release)
+    filename = str(tmp_path / 'macro.amc')
+    actions = make_actions(DEFAULT_BATCH_SIZE + 10)
+    save_macro(filename, actions)
+    
+    with MappedMacro(filename) as macro:
+        save_macro(filename, make_actions())
+        # 无论是否解除映射，已打开的对象仍读到旧的内容
+        assert isinstance(macro.map, bytes) == release
+        assert macro.read_all().to_list() == actions
+    assert list(load_macro(filename)) == make_actions()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+回放指标采样测试
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS
+from app.input_backend import FakeBackend
+from app.metrics import PlaybackMetrics, format_metrics
+from app.player import Player
+
+
+def make_player(count, interval):
+    """
+    创建回放 count 个间隔为 interval 的鼠标移动的播放器
+    """
+    actions = ActionBuffer()
+    for i in range(count):
+        actions.append_move(i, i, i * interval)
+    player = Player(FakeBackend())
+    player.set_actions(actions)
+    return player
+
+
+def test_idle_sample():
+    metrics = PlaybackMetrics(make_player(5, 0.1))
+    sample = metrics.sample()
+    assert not sample['playing']
+    assert (sample['events'], sample['position'], sample['percent']) == (0, 0.0, 0.0)
+    assert sample['duration'] == pytest.approx(0.4)
+    assert sample['eta'] is None
+    assert sample['lateness_ms'] is None
+
+
+def test_samples_during_playback():
+    player = make_player(20, 0.01)
+    player.set_repeat_count(2)
+    metrics = PlaybackMetrics(player)
+    thread = threading.Thread(target=player.start_playing, daemon=True)
+    thread.start()
+    while not player.is_playing and thread.is_alive():
+        time.sleep(0.001)
+    time.sleep(0.05)
+    
+    sample = metrics.sample()
+    assert sample['playing']
+    assert 0 < sample['events'] < 40
+    assert 0 <= sample['percent'] <= 100
+    # 剩余时间包括还没开始的重复
+    assert sample['eta'] > 0.19 - sample['position']
+    
+    thread.join(5)
+    sample = metrics.sample()
+    # 跨重复累计，不漏算上一次重复中没读取的样本
+    assert sample['events'] == 40
+    assert sample['repeat'] == 2
+    assert sample['max_lateness_ms'] is not None
+    assert sample['position'] <= sample['duration']
+
+
+def test_format_metrics():
+    player = make_player(3, 0.01)
+    player.actions.append_key(TYPE_KEY_PRESS, 'bogus', 0.03)
+    player.set_actions(player.actions)
+    metrics = PlaybackMetrics(player)
+    player.start_playing()
+    sample = metrics.sample()
+    assert sample['skipped'] == 1
+    lines = format_metrics(sample)
+    assert lines[0].startswith('进度')
+    # 跳过的动作同样计入已执行的事件
+    assert sample['events'] == 4
+    assert '共 4 个事件' in lines[1]
+    assert lines[2] == '注入失败 0 次，无法解析而跳过 1 个动作'
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+使用内存输入后端的回放测试：回放计划、速度、暂停、停止、跳转和按住的输入的释放
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+from app.macro_format import DEFAULT_BATCH_SIZE, open_macro, save_macro
+from app.input_backend import FakeBackend
+from app.player import Player
+from app.timeline import TimelineTransform
+
+
+# 时间相关断言的容差（秒）
+TOLERANCE = 0.05
+
+
+def make_player(actions):
+    """
+    创建使用内存输入后端的播放器，鼠标和键盘事件记录在同一个列表中
+    """
+    backend = FakeBackend()
+    player = Player(backend)
+    player.set_actions(actions)
+    return player, backend.events
+
+
+def moves(count, interval, start=0.0):
+    """
+    生成 count 个间隔为 interval 的鼠标移动
+    """
+    actions = ActionBuffer()
+    for i in range(count):
+        actions.append_move(i, i, start + i * interval)
+    return actions
+
+
+def seconds(events, first, last):
+    """
+    两个事件之间的时间（秒）
+    """
+    return (events[last][0] - events[first][0]) / 1e9
+
+
+def test_plan_resolves_strings_once():
+    actions = ActionBuffer()
+    actions.append_click(5, 6, 'Button.left', True, 0.0)
+    actions.append_click(5, 6, 'middle', True, 0.0)
+    actions.append_key(TYPE_KEY_PRESS, 'Key.shift', 0.0)
+    actions.append_key(TYPE_KEY_PRESS, 'shift', 0.0)
+    actions.append_key(TYPE_KEY_RELEASE, 'a', 0.0)
+    player, _ = make_player(actions)
+    
+    plan = player.plan
+    assert len(plan) == len(actions)
+    assert plan[0] == (player._click_press, (5, 6, 'Button.left'))
+    assert plan[2] == (player._press, ('Key.shift',))
+    assert plan[4] == (player._release, ('a',))
+    # 无法解析的按键和按钮编译为跳过
+    assert plan[1] == (player._skip, ())
+    assert plan[3] == (player._skip, ())
+
+
+def test_plan_executed_in_order():
+    actions = moves(2, 0.01)
+    actions.append_scroll(1, 1, 0, -2, 0.02)
+    actions.append_scroll(1, 1, 0, 0.5, 0.025)
+    actions.append_key(TYPE_KEY_PRESS, 'bogus', 0.03)
+    actions.append_key(TYPE_KEY_PRESS, 'x', 0.04)
+    player, events = make_player(actions)
+    player.start_playing()
+    # 结束时仍按住的按键被释放
+    assert [event[1:] for event in events] == [
+        ('move', 0, 0), ('move', 1, 1), ('scroll', 0, -2), ('scroll', 0, 0.5),
+        ('press_key', 'x'), ('release_key', 'x')
+    ]
+    assert player.skipped_actions == 1
+
+
+@pytest.mark.parametrize('speed', [0.5, 1.0, 2.0])
+def test_speed(speed):
+    player, events = make_player(moves(5, 0.05))
+    player.set_speed(speed)
+    player.start_playing()
+    
+    assert [event[2] for event in events] == [0, 1, 2, 3, 4]
+    assert seconds(events, 0, -1) == pytest.approx(0.2 / speed, abs=TOLERANCE)
+
+
+def test_progress_reports_position():
+    player, _ = make_player(moves(5, 0.02))
+    positions = []
+    player.progress.connect(positions.append)
+    player.start_playing()
+    assert positions == sorted(positions)
+    assert positions[-1] == pytest.approx(0.08, abs=TOLERANCE)
+
+
+def test_timing_stats_per_repeat():
+    player, events = make_player(moves(10, 0.005))
+    player.set_repeat_count(2)
+    player.start_playing()
+    
+    assert len(events) == 20
+    assert [stats['count'] for stats in player.timing_history] == [10, 10]
+    assert player.get_timing_stats()['max_ms'] < 20
+
+
+def start_thread(player):
+    """
+    在后台线程中回放，返回线程
+    """
+    thread = threading.Thread(target=player.start_playing, daemon=True)
+    thread.start()
+    while not player.is_playing and thread.is_alive():
+        time.sleep(0.001)
+    return thread
+
+
+def test_pause_keeps_timeline_position():
+    player, events = make_player(moves(4, 0.1))
+    thread = start_thread(player)
+    time.sleep(0.15)
+    player.pause_playing()
+    time.sleep(0.3)
+    
+    # 暂停期间不执行动作
+    assert [event[2] for event in events] == [0, 1]
+    
+    player.resume_playing()
+    thread.join(5)
+    # 恢复时先把光标移回暂停前的位置
+    assert [event[2] for event in events] == [0, 1, 1, 2, 3]
+    # 恢复后保持原来的间隔，暂停的时长从时间轴中扣除，不会集中补发
+    assert seconds(events, 3, 4) == pytest.approx(0.1, abs=TOLERANCE)
+    assert seconds(events, 0, -1) == pytest.approx(0.6, abs=TOLERANCE * 2)
+
+
+def test_pause_releases_and_restores_held_keys():
+    actions = ActionBuffer()
+    actions.append_key(TYPE_KEY_PRESS, 'a', 0.0)
+    actions.append_move(1, 1, 0.1)
+    actions.append_move(2, 2, 0.4)
+    actions.append_key(TYPE_KEY_RELEASE, 'a', 0.5)
+    player, events = make_player(actions)
+    
+    thread = start_thread(player)
+    time.sleep(0.2)
+    player.pause_playing()
+    time.sleep(0.3)
+    
+    # 暂停期间按住的按键已释放，之后的动作没有执行
+    assert [event[1:] for event in events] == [
+        ('press_key', 'a'), ('move', 1, 1), ('release_key', 'a')
+    ]
+    
+    player.resume_playing()
+    thread.join(5)
+    assert not thread.is_alive()
+    
+    # 恢复时先把光标移回原处并重新按下按键
+    assert [event[1:] for event in events[3:]] == [
+        ('move', 1, 1), ('press_key', 'a'), ('move', 2, 2), ('release_key', 'a')
+    ]
+    # 暂停的时长从时间轴中扣除
+    assert seconds(events, 0, -1) == pytest.approx(0.8, abs=TOLERANCE * 2)
+    assert not player.held
+
+
+def test_stop_releases_held_input():
+    actions = ActionBuffer()
+    actions.append_click(5, 5, 'Button.left', True, 0.0)
+    actions.append_key(TYPE_KEY_PRESS, 'x', 0.01)
+    actions.append_key(TYPE_KEY_RELEASE, 'x', 2.0)
+    actions.append_click(5, 5, 'Button.left', False, 2.0)
+    player, events = make_player(actions)
+    
+    thread = start_thread(player)
+    time.sleep(0.1)
+    player.stop_playing()
+    thread.join(5)
+    
+    # 按与按下相反的顺序释放
+    assert [event[1:] for event in events[-2:]] == [('release_key', 'x'), ('release_button', 'Button.left')]
+    assert not player.held
+    assert player.last_error is None
+
+
+def test_stop_wakes_waiting_playback():
+    player, events = make_player(moves(2, 5.0))
+    thread = start_thread(player)
+    time.sleep(0.05)
+    started = time.perf_counter()
+    player.stop_playing()
+    thread.join(5)
+    assert time.perf_counter() - started < 0.5
+    assert not player.get_is_playing()
+    assert [event[2] for event in events] == [0]
+
+
+def test_seek_restores_state():
+    actions = ActionBuffer()
+    actions.append_key(TYPE_KEY_PRESS, 'Key.shift', 0.0)
+    actions.extend(moves(5, 0.05, start=0.05))
+    actions.append_key(TYPE_KEY_RELEASE, 'Key.shift', 0.35)
+    player, events = make_player(actions)
+    
+    player.seek(4)
+    assert player.get_position() == pytest.approx(0.2)
+    player.start_playing()
+    
+    # 先恢复第 4 个动作之前的状态：光标位置和按住的 Shift，再从第 4 个动作继续
+    assert [event[1:] for event in events] == [
+        ('move', 2, 2), ('press_key', 'Key.shift'),
+        ('move', 3, 3), ('move', 4, 4), ('release_key', 'Key.shift')
+    ]
+    assert seconds(events, 0, -1) == pytest.approx(0.15, abs=TOLERANCE)
+
+
+def test_seek_while_playing():
+    player, events = make_player(moves(20, 0.05))
+    thread = start_thread(player)
+    time.sleep(0.1)
+    player.seek(15)
+    thread.join(5)
+    
+    positions = [event[2] for event in events]
+    assert positions[-5:] == [15, 16, 17, 18, 19]
+    assert 10 not in positions
+
+
+def test_mapped_macro_plays_like_memory(tmp_path):
+    actions = ActionBuffer()
+    for i in range(DEFAULT_BATCH_SIZE * 2 + 10):
+        actions.append_move(i, i, i * 1e-6)
+    actions.append_key(TYPE_KEY_PRESS, 'Key.shift', 0.01)
+    actions.append_key(TYPE_KEY_RELEASE, 'Key.shift', 0.02)
+    filename = str(tmp_path / 'macro.amc')
+    save_macro(filename, actions)
+    
+    player, expected = make_player(actions)
+    player.start_playing()
+    with open_macro(filename) as macro:
+        player, events = make_player(macro)
+        assert player.plan is None
+        player.start_playing()
+    assert [event[1:] for event in events] == [event[1:] for event in expected]
+
+
+def test_timeline_transform_applied(tmp_path):
+    actions = moves(3, 0.5)
+    actions.append_move(9, 9, 30.0)
+    transform = TimelineTransform(max_gap=0.05)
+    
+    player, events = make_player(actions)
+    player.set_speed(2.0)
+    player.set_timeline(transform)
+    assert player.get_projected_duration() == pytest.approx(0.075)
+    player.start_playing()
+    assert seconds(events, 0, -1) == pytest.approx(0.075, abs=TOLERANCE)
+    
+    # 内存映射的宏文件逐块变换，结果相同
+    filename = str(tmp_path / 'macro.amc')
+    save_macro(filename, actions)
+    with open_macro(filename) as macro:
+        player, _ = make_player(macro)
+        player.set_timeline(transform)
+        assert player.get_projected_duration() == pytest.approx(0.15)
+        player.set_timeline(None)
+        assert player.get_projected_duration() == pytest.approx(30.0)
+
+
+def test_anchor_offsets_following_clicks():
+    np = pytest.importorskip('numpy')
+    pytest.importorskip('cv2')
+    from app.anchor import AnchorTracker, capture_template
+    from app.capture import FakeFramebuffer, ScreenCapture
+    
+    rng = np.random.default_rng(3)
+    image = np.full((300, 400), 128, dtype=np.uint8)
+    button = rng.integers(0, 256, (30, 60), dtype=np.uint8)
+    image[100:130, 100:160] = button
+    framebuffer = FakeFramebuffer(image)
+    source = ScreenCapture(framebuffer, ttl=0)
+    template, template_x, template_y = capture_template(source, 130, 115)
+    
+    # 回放时窗口向右下移动了 (20, 10)
+    framebuffer.draw(0, 0, np.full((300, 400), 128, dtype=np.uint8))
+    framebuffer.draw(120, 110, button)
+    
+    actions = ActionBuffer()
+    actions.append_anchor(130, 115, template, template_x, template_y, 0.0)
+    actions.append_click(130, 115, 'Button.left', True, 0.0)
+    actions.append_click(130, 115, 'Button.left', False, 0.01)
+    
+    player, events = make_player(actions)
+    player.set_anchor_tracker(AnchorTracker(source))
+    player.set_actions(actions)
+    player.start_playing()
+    assert [event[1:] for event in events] == [
+        ('move', 150, 125), ('press_button', 'Button.left'),
+        ('move', 150, 125), ('release_button', 'Button.left')
+    ]
+    
+    # 关闭锚点时按录制的坐标回放
+    player, events = make_player(actions)
+    player.anchors_enabled = False
+    player.start_playing()
+    assert events[0][1:] == ('move', 130, 115)
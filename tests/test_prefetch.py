@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+后台预取测试
+"""
+
+import pytest
+
+from app.prefetch import Prefetcher
+
+
+def test_order_and_transform():
+    with Prefetcher(range(100), lambda item: item * 2, depth=2) as prefetcher:
+        assert list(prefetcher) == [item * 2 for item in range(100)]
+
+
+def test_error_raised_in_consumer():
+    def source():
+        yield 1
+        raise ValueError("坏块")
+    
+    with Prefetcher(source()) as prefetcher:
+        items = iter(prefetcher)
+        assert next(items) == 1
+        with pytest.raises(ValueError):
+            next(items)
+
+
+def test_close_stops_producer():
+    produced = []
+    
+    def source():
+        for item in range(1000):
+            produced.append(item)
+            yield item
+    
+    prefetcher = Prefetcher(source(), depth=2)
+    assert next(iter(prefetcher)) == 0
+    prefetcher.close()
+    assert not prefetcher.thread.is_alive()
+    # 队列有界，提前停止时不会读完整个来源
+    assert len(produced) < 10
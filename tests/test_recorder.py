@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+录制测试：回调只入队，消费线程负责转换和存储
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.action_buffer import ActionBuffer
+from app.input_backend import FakeBackend
+from app.macro_format import load_macro, save_macro
+from app.recorder import JOURNAL_BATCH_SIZE, Recorder
+from app.simplify import MoveFilter
+
+
+class CharKey:
+    """
+    代替 pynput 的字符按键
+    """
+    
+    def __init__(self, char):
+        self.char = char
+
+
+def make_recorder(**options):
+    """
+    创建不启动监听器的录制器，回调直接由测试调用
+    """
+    recorder = Recorder(backend=FakeBackend(), **options)
+    recorder.start_ns = time.perf_counter_ns()
+    recorder.is_recording = True
+    return recorder
+
+
+def drain(recorder):
+    """
+    在当前线程中处理队列中的全部事件
+    """
+    recorder.consumer_stop.set()
+    recorder._consume_events()
+    recorder.consumer_stop.clear()
+
+
+def test_callbacks_only_enqueue():
+    recorder = make_recorder()
+    recorder.on_mouse_move(1, 2)
+    recorder.on_mouse_click(1, 2, 'Button.left', True)
+    recorder.on_mouse_scroll(1, 2, 0, -1)
+    recorder.on_key_press(CharKey('a'))
+    recorder.on_key_release('Key.esc')
+    assert recorder.get_queue_depth() == 5
+    assert len(recorder.actions) == 0
+    
+    drain(recorder)
+    assert recorder.get_queue_depth() == 0
+    assert recorder.max_queue_depth == 5
+    actions = recorder.get_actions().to_list()
+    assert [action['type'] for action in actions] == [
+        'mouse_move', 'mouse_click', 'mouse_scroll', 'key_press', 'key_release'
+    ]
+    assert actions[1]['button'] == 'Button.left'
+    assert actions[3]['key'] == 'a'
+    assert actions[4]['key'] == 'Key.esc'
+    timestamps = [action['timestamp'] for action in actions]
+    assert timestamps == sorted(timestamps)
+    assert 0 <= timestamps[0] < 1
+
+
+def test_full_queue_drops_and_counts():
+    recorder = make_recorder(queue_capacity=3)
+    for i in range(5):
+        recorder.on_mouse_move(i, i)
+    assert recorder.get_queue_depth() == 3
+    assert recorder.dropped_events == 2
+    
+    drain(recorder)
+    assert [action['x'] for action in recorder.actions] == [0, 1, 2]
+
+
+def test_concurrent_drops_all_counted():
+    recorder = make_recorder(queue_capacity=1000)
+    barrier = threading.Barrier(4)
+    
+    def produce():
+        barrier.wait()
+        for i in range(5000):
+            recorder.on_mouse_move(i, i)
+    
+    threads = [threading.Thread(target=produce) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 每个事件要么入队要么计入丢弃；队列最多超出容量“线程数 - 1”个事件
+    depth = recorder.get_queue_depth()
+    assert depth + recorder.dropped_events == 20000
+    assert 1000 <= depth <= 1003
+
+
+def test_not_recording_ignored():
+    recorder = make_recorder()
+    recorder.is_recording = False
+    recorder.on_mouse_move(1, 1)
+    recorder.on_key_press(CharKey('a'))
+    assert recorder.get_queue_depth() == 0
+
+
+def test_move_filter_keeps_position_before_click():
+    recorder = make_recorder()
+    recorder.set_move_filter(MoveFilter(min_distance=10))
+    for x in range(6):
+        recorder.on_mouse_move(x, 0)
+    recorder.on_mouse_click(5, 0, 'Button.left', True)
+    drain(recorder)
+    
+    # 被过滤的最后一个点在点击之前补回
+    assert [(action['type'], action['x']) for action in recorder.actions] == [
+        ('mouse_move', 0), ('mouse_move', 5), ('mouse_click', 5)
+    ]
+    assert recorder.filtered_moves == 4
+
+
+def wait_for_queue(recorder):
+    """
+    等待消费线程处理完队列
+    """
+    deadline = time.monotonic() + 5
+    while recorder.get_queue_depth() and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_journal_streams_batches_to_disk(tmp_path):
+    journal = str(tmp_path / 'journal.amc')
+    backend = FakeBackend()
+    recorder = Recorder(backend=backend)
+    recorder.start_recording(journal)
+    count = JOURNAL_BATCH_SIZE * 2 + 10
+    for i in range(count):
+        backend.emit_move(i, 0)
+    wait_for_queue(recorder)
+    time.sleep(0.05)
+    
+    # 攒够一批就写入日志并清空内存，录制中的文件可以直接读取
+    assert len(recorder.get_actions()) < JOURNAL_BATCH_SIZE
+    assert len(load_macro(journal)) >= JOURNAL_BATCH_SIZE * 2
+    
+    recorder.stop_recording()
+    assert [action['x'] for action in recorder.get_actions()] == list(range(count))
+
+
+def test_journal_recovers_after_crash(tmp_path):
+    journal = tmp_path / 'journal.amc'
+    backend = FakeBackend()
+    recorder = Recorder(backend=backend)
+    recorder.start_recording(str(journal))
+    for i in range(JOURNAL_BATCH_SIZE + 5):
+        backend.emit_move(i, 0)
+    wait_for_queue(recorder)
+    recorder.stop_recording()
+    
+    # 模拟最后一批写到一半时崩溃
+    data = journal.read_bytes()
+    journal.write_bytes(data[:-7])
+    assert Recorder(backend=FakeBackend()).load_actions(str(journal))
+    recovered = load_macro(str(journal))
+    assert len(recovered) == JOURNAL_BATCH_SIZE
+    assert [action['x'] for action in recovered] == list(range(JOURNAL_BATCH_SIZE))
+
+
+def test_lazy_load_closes_previous_mapping(tmp_path):
+    first, second = str(tmp_path / 'first.amc'), str(tmp_path / 'second.amc')
+    for filename, x in ((first, 1), (second, 2)):
+        actions = ActionBuffer()
+        actions.append_move(x, x, 0.0)
+        save_macro(filename, actions)
+    
+    recorder = Recorder(backend=FakeBackend())
+    assert recorder.load_actions(first, lazy=True)
+    previous = recorder.get_actions()
+    assert recorder.load_actions(second, lazy=True)
+    assert previous.map is None
+    assert recorder.get_actions().read_all()[0]['x'] == 2
+    
+    # 加载失败时保留当前的映射
+    current = recorder.get_actions()
+    assert not recorder.load_actions(str(tmp_path / 'missing.amc'), lazy=True)
+    assert recorder.get_actions() is current
+    assert current.map is not None
+
+
+def test_anchor_stored_before_press():
+    np = pytest.importorskip('numpy')
+    pytest.importorskip('cv2')
+    from app.anchor import decode_template
+    from app.capture import FakeFramebuffer, ScreenCapture
+    
+    image = np.random.default_rng(4).integers(0, 256, (200, 200), dtype=np.uint8)
+    backend = FakeBackend()
+    recorder = Recorder(backend=backend)
+    recorder.set_anchor_source(ScreenCapture(FakeFramebuffer(image)), size=32)
+    recorder.start_recording()
+    # 没有预截区域时由截图线程截取模板
+    backend.emit_click(100, 80, 'Button.left', True)
+    backend.emit_click(100, 80, 'Button.left', False)
+    recorder.stop_recording()
+    
+    actions = recorder.get_actions().to_list()
+    assert [action['type'] for action in actions] == ['anchor', 'mouse_click', 'mouse_click']
+    anchor = actions[0]
+    assert (anchor['x'], anchor['y'], anchor['template_x'], anchor['template_y']) == (100, 80, 16, 16)
+    assert np.array_equal(decode_template(anchor['template']), image[64:96, 84:116])
+    assert recorder.anchor_count == 1
+    assert recorder.anchor_grabber is None
+
+
+def test_anchor_copied_from_prefetched_region():
+    np = pytest.importorskip('numpy')
+    pytest.importorskip('cv2')
+    from app.anchor import decode_template
+    from app.capture import FakeFramebuffer, ScreenCapture
+    
+    image = np.random.default_rng(5).integers(0, 256, (200, 200), dtype=np.uint8)
+    framebuffer = FakeFramebuffer(image)
+    backend = FakeBackend()
+    recorder = Recorder(backend=backend)
+    recorder.set_anchor_source(ScreenCapture(framebuffer, ttl=0), size=32)
+    recorder.start_recording()
+    grabber = recorder.anchor_grabber
+    backend.emit_move(100, 80)
+    deadline = time.monotonic() + 2.0
+    while grabber.snapshot is None and time.monotonic() < deadline:
+        time.sleep(0.005)
+    
+    backend.emit_click(100, 80, 'Button.left', True)
+    # 点击后应用立即重绘，模板仍是点击时的画面
+    framebuffer.draw(60, 40, np.zeros((80, 80), dtype=np.uint8))
+    backend.emit_click(100, 80, 'Button.left', False)
+    recorder.stop_recording()
+    
+    assert grabber.prefetch_hits == 1
+    anchor = recorder.get_actions()[1]
+    assert np.array_equal(decode_template(anchor['template']), image[64:96, 84:116])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+回放调度器和延迟统计测试
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.scheduler import LATENESS_SUB_BUCKETS, LatenessStats, PlaybackScheduler
+
+
+def test_empty_summary():
+    summary = LatenessStats().summary()
+    assert summary['count'] == 0
+    assert summary['max_ms'] == 0.0
+
+
+def test_summary_percentiles():
+    stats = LatenessStats()
+    for lateness_us in range(1, 101):
+        stats.record(lateness_us * 1000)
+    stats.record(0)
+    
+    summary = stats.summary()
+    assert summary['count'] == 101
+    # 百分位数取分桶的上界，相对误差不超过 1/LATENESS_SUB_BUCKETS
+    assert 0.050 <= summary['p50_ms'] <= 0.050 * (1 + 1 / LATENESS_SUB_BUCKETS)
+    assert 0.099 <= summary['p99_ms'] <= 0.1
+    assert summary['max_ms'] == pytest.approx(0.1)
+    assert summary['mean_ms'] == pytest.approx(5050 / 101 / 1000)
+    # 漂移为最后一个事件的延迟
+    assert summary['drift_ms'] == 0.0
+
+
+def test_histogram_memory_is_fixed():
+    stats = LatenessStats()
+    size = len(stats.buckets)
+    for lateness in range(0, 10**9, 9973):
+        stats.record(lateness)
+    stats.record(-5)
+    assert len(stats.buckets) == size
+    assert stats.count == len(range(0, 10**9, 9973)) + 1
+    assert stats.last == -5
+    
+    # 两次快照之间新增样本的最大值
+    _, snapshot = stats.max_since(None)
+    assert stats.max_since(snapshot)[0] is None
+    stats.record(1000)
+    maximum, _ = stats.max_since(snapshot)
+    assert 1000 <= maximum <= 1000 * (1 + 1 / LATENESS_SUB_BUCKETS)
+
+
+def test_wait_until_reaches_target():
+    scheduler = PlaybackScheduler()
+    scheduler.start()
+    for target_ms in (5, 10, 30):
+        now = scheduler.wait_until(target_ms * 1_000_000)
+        assert now >= target_ms * 1_000_000
+        assert now - target_ms * 1_000_000 < 20_000_000
+    
+    # 已经过去的时间不等待
+    started = time.perf_counter()
+    scheduler.wait_until(0)
+    assert time.perf_counter() - started < 0.01
+
+
+def test_interrupt_and_shift():
+    scheduler = PlaybackScheduler()
+    scheduler.start()
+    timer = threading.Timer(0.05, scheduler.interrupt)
+    timer.start()
+    started = time.perf_counter()
+    assert scheduler.wait_until(5_000_000_000) is None
+    assert time.perf_counter() - started < 1.0
+    
+    # 清除唤醒标志前的等待立即返回 None
+    assert scheduler.wait_until(5_000_000_000) is None
+    scheduler.clear_interrupt()
+    
+    # 推移时间零点后，当前时间相应减少
+    before = scheduler.now()
+    scheduler.shift(1_000_000_000)
+    assert scheduler.now() < before
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+轻量信号测试
+"""
+
+import threading
+import time
+
+from app.signals import Signal, ThrottledSignal
+
+
+def test_connect_emit_disconnect():
+    signal = Signal()
+    received = []
+    slot = received.append
+    signal.connect(slot)
+    signal.connect(lambda value: received.append(value * 10))
+    signal.emit(1)
+    assert received == [1, 10]
+    
+    signal.disconnect(slot)
+    signal.emit(2)
+    assert received == [1, 10, 20]
+    
+    signal.disconnect()
+    signal.emit(3)
+    assert received == [1, 10, 20]
+
+
+def test_disconnect_during_emit():
+    # emit 遍历的是连接时的列表副本，回调中断开连接不影响本次通知
+    signal = Signal()
+    received = []
+    
+    def once(value):
+        received.append(value)
+        signal.disconnect(once)
+    
+    signal.connect(once)
+    signal.connect(received.append)
+    signal.emit('x')
+    signal.emit('y')
+    assert received == ['x', 'x', 'y']
+
+
+def test_throttled_signal_coalesces():
+    signal = ThrottledSignal(0.05)
+    received = []
+    delivered = threading.Event()
+    
+    def slot(value):
+        received.append(value)
+        if len(received) == 2:
+            delivered.set()
+    
+    signal.connect(slot)
+    for value in range(5):
+        signal.emit(value)
+    # 第一次立即回调，间隔内的其余通知合并为最后一次，由定时器补发
+    assert received == [0]
+    assert delivered.wait(1)
+    assert received == [0, 4]
+    assert signal.timer is None
+
+
+def test_throttled_signal_flush_and_cancel():
+    signal = ThrottledSignal(10)
+    received = []
+    signal.connect(received.append)
+    signal.emit('a')
+    signal.emit('b')
+    signal.emit('c')
+    signal.flush()
+    assert received == ['a', 'c']
+    signal.flush()
+    assert received == ['a', 'c']
+    
+    # 取消时丢弃等待补发的通知，之后的 emit 立即回调
+    signal.emit('d')
+    signal.cancel()
+    time.sleep(0.01)
+    signal.emit('e')
+    assert received == ['a', 'c', 'e']
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+鼠标轨迹简化测试
+"""
+
+from app.action_buffer import ActionBuffer, TYPE_MOUSE_MOVE
+from app.simplify import MoveFilter, simplify_actions
+
+
+def track(points, interval=0.01, start=0.0, actions=None):
+    """
+    把 (x, y) 点列追加为等间隔的鼠标移动
+    """
+    if actions is None:
+        actions = ActionBuffer()
+    for i, (x, y) in enumerate(points):
+        actions.append_move(x, y, start + i * interval)
+    return actions
+
+
+def positions(actions):
+    """
+    所有鼠标移动的坐标
+    """
+    return [(action['x'], action['y']) for action in actions if action['type'] == 'mouse_move']
+
+
+def test_rdp_straight_line_keeps_endpoints():
+    actions = track([(i * 10, i * 5) for i in range(50)])
+    result = simplify_actions(actions, min_distance=0)
+    assert positions(result) == [(0, 0), (490, 245)]
+
+
+def test_rdp_keeps_corner():
+    points = [(i * 10, 0) for i in range(20)] + [(190, i * 10) for i in range(1, 20)]
+    result = simplify_actions(track(points), min_distance=0)
+    assert positions(result) == [(0, 0), (190, 0), (190, 190)]
+
+
+def test_rdp_keeps_pause_in_time():
+    # 同一条直线上先快后慢：时间维度上的拐点被保留
+    points = [(i * 10, 0) for i in range(10)]
+    actions = track(points, interval=0.001)
+    track([(100 + i * 10, 0) for i in range(10)], interval=0.5, start=0.5, actions=actions)
+    result = simplify_actions(actions, min_distance=0)
+    assert positions(result) == [(0, 0), (90, 0), (190, 0)]
+
+
+def test_other_events_split_runs():
+    actions = track([(i, 0) for i in range(0, 100, 10)])
+    actions.append_click(90, 0, 'Button.left', True, 0.2)
+    actions.append_click(90, 0, 'Button.left', False, 0.25)
+    track([(90, i) for i in range(0, 100, 10)], start=0.3, actions=actions)
+    
+    result = simplify_actions(actions, min_distance=0)
+    assert [action['type'] for action in result] == [
+        'mouse_move', 'mouse_move', 'mouse_click', 'mouse_click', 'mouse_move', 'mouse_move'
+    ]
+    assert positions(result) == [(0, 0), (90, 0), (90, 0), (90, 90)]
+    # 字符串表与原缓冲区共享
+    assert result.strings is actions.strings
+
+
+def test_threshold_drops_close_points():
+    points = [(0, 0), (1, 0), (1, 1), (5, 0), (6, 0), (20, 0), (21, 0)]
+    result = simplify_actions(track(points), min_distance=3, epsilon=None)
+    # 每段轨迹的最后一个点总是保留
+    assert positions(result) == [(0, 0), (5, 0), (20, 0), (21, 0)]
+
+
+def test_move_filter_pending_point():
+    move_filter = MoveFilter(min_distance=5)
+    assert move_filter.accept(0, 0, 0.0)
+    assert not move_filter.accept(1, 1, 0.01)
+    assert not move_filter.accept(2, 2, 0.02)
+    assert move_filter.take_pending() == (2, 2, 0.02)
+    # take_pending 之后开始新的一段，第一个点总是接受
+    assert move_filter.take_pending() is None
+    assert move_filter.accept(2, 3, 0.03)
+    
+    move_filter = MoveFilter(min_distance=0, min_interval=0.1)
+    assert move_filter.accept(0, 0, 0.0)
+    assert not move_filter.accept(50, 50, 0.05)
+    assert move_filter.accept(60, 60, 0.15)
+
+
+def test_empty_and_single_point():
+    assert len(simplify_actions(ActionBuffer())) == 0
+    assert positions(simplify_actions(track([(3, 4)]))) == [(3, 4)]
+    assert all(t == TYPE_MOUSE_MOVE for t in simplify_actions(track([(0, 0), (9, 9)])).types)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+时间轴变换测试：空闲压缩、快速移动、变速区间和逐块变换
+"""
+
+import pytest
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS
+from app.timeline import TimelineTransform
+
+
+def make_actions():
+    """
+    移动、拖动、停顿和按键组成的动作序列
+    """
+    actions = ActionBuffer()
+    actions.append_move(0, 0, 0.0)
+    actions.append_move(1, 1, 0.5)
+    actions.append_click(1, 1, 'Button.left', True, 1.0)
+    actions.append_move(2, 2, 1.5)  # 拖动
+    actions.append_click(2, 2, 'Button.left', False, 2.0)
+    actions.append_move(3, 3, 2.5)
+    actions.append_key(TYPE_KEY_PRESS, 'a', 12.5)  # 长时间空闲后按键
+    return actions
+
+
+def test_identity_keeps_timestamps():
+    actions = make_actions()
+    transform = TimelineTransform()
+    assert transform.is_identity()
+    assert transform.apply(actions) is actions.timestamps
+
+
+def test_max_gap_caps_idle():
+    timestamps = TimelineTransform(max_gap=1.0).apply(make_actions())
+    assert list(timestamps) == [0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.5]
+
+
+def test_fast_moves_keep_drags_and_clicks():
+    transform = TimelineTransform(fast_moves=True, move_interval=0.1)
+    timestamps = transform.apply(make_actions())
+    # 纯移动压缩为 0.1 秒，拖动、点击和按键前的间隔不变
+    assert list(timestamps) == pytest.approx([0.0, 0.1, 0.6, 1.1, 1.6, 1.7, 11.7])
+
+
+def test_rates_scale_ranges():
+    transform = TimelineTransform(rates=[(1.0, 2.0, 2.0), (2.5, 12.5, 10.0)])
+    timestamps = transform.apply(make_actions())
+    assert list(timestamps) == pytest.approx([0.0, 0.5, 1.0, 1.25, 1.5, 2.0, 3.0])
+
+
+def test_chunked_matches_whole():
+    actions = make_actions()
+    transform = TimelineTransform(max_gap=1.0, fast_moves=True, move_interval=0.1,
+                                  rates=[(0.25, 1.75, 0.5)])
+    whole = list(transform.apply(actions))
+    
+    # 块边界落在拖动中间时，按住的按钮数由游标带到下一块
+    cursor = transform.cursor()
+    chunked = []
+    for start, end in ((0, 3), (3, 5), (5, 7)):
+        chunked.extend(cursor.advance(actions[start:end]))
+    assert chunked == pytest.approx(whole)
+    assert transform.projected_duration([actions[0:3], actions[3:7]]) == pytest.approx(whole[-1])
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'max_gap': -1},
+    {'move_interval': -0.1},
+    {'rates': [(2.0, 1.0, 2.0)]},
+    {'rates': [(0.0, 1.0, 0.0)]},
+    {'rates': [(0.0, 2.0, 2.0), (1.0, 3.0, 2.0)]},
+])
+def test_invalid_parameters(kwargs):
+    with pytest.raises(ValueError):
+        TimelineTransform(**kwargs)
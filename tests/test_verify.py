@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+回放核对测试：事件流对齐、误差统计和内存后端上的核对
+"""
+
+from app.action_buffer import ActionBuffer, TYPE_KEY_PRESS, TYPE_KEY_RELEASE
+from app.verify import (
+    _percentile, align, compare_streams, expected_stream, is_faithful, observed_stream, verify_playback
+)
+
+
+def make_actions():
+    """
+    移动、点击和按键组成的短宏
+    """
+    actions = ActionBuffer()
+    for i in range(5):
+        actions.append_move(i * 10, 0, i * 0.01)
+    actions.append_click(40, 0, 'Button.left', True, 0.05)
+    actions.append_click(40, 0, 'Button.left', False, 0.06)
+    actions.append_key(TYPE_KEY_PRESS, 'a', 0.07)
+    actions.append_key(TYPE_KEY_RELEASE, 'a', 0.08)
+    return actions
+
+
+def test_align_identical_streams():
+    actions = make_actions()
+    expected = expected_stream(actions, actions.timestamps)
+    observed = observed_stream(actions)
+    pairs, missing, extra = align(expected, observed)
+    # 点击前的移动是可选的，实际流中没有时不计为缺失
+    assert len(expected) == len(observed) + 2
+    assert len(pairs) == len(observed)
+    assert (missing, extra) == ([], [])
+
+
+def test_align_reports_missing_and_extra():
+    actions = make_actions()
+    expected = expected_stream(actions, actions.timestamps)
+    observed = observed_stream(actions)
+    del observed[2]
+    scroll = ActionBuffer()
+    scroll.append_scroll(0, 0, 0, -1, 0.005)
+    observed[1:1] = observed_stream(scroll)
+    
+    report = compare_streams(expected, observed)
+    assert (report['missing'], report['extra']) == (1, 1)
+    assert report['missing_types'] == {'mouse_move': 1}
+    assert report['missing_examples'][0]['x'] == 20
+    assert report['extra_types'] == {'mouse_scroll': 1}
+
+
+def test_position_and_timing_errors():
+    actions = make_actions()
+    expected = expected_stream(actions, actions.timestamps)
+    shifted = ActionBuffer()
+    for action in actions:
+        if action['type'] == 'mouse_click':
+            action['x'] += 3
+            action['y'] += 4
+        action['timestamp'] += 0.5
+        shifted.append(action)
+    
+    report = compare_streams(expected, observed_stream(shifted), position_tolerance=2)
+    assert (report['missing'], report['extra']) == (0, 0)
+    assert report['position_px']['max'] == 5.0
+    assert report['position_px']['exceeded'] == 2
+    # 整体的起始偏移不计入时间误差
+    assert abs(report['start_offset_ms'] - 500) < 1e-6
+    assert report['timing_ms']['max'] < 1e-6
+
+
+def test_verify_playback_memory():
+    actions = make_actions()
+    report = verify_playback(actions, speed=4.0)
+    assert is_faithful(report)
+    # 点击前的移动也被注入
+    assert report['matched'] == len(actions) + 2
+    
+    # 无法解析的按键不会注入，记为缺失
+    actions.append_key(TYPE_KEY_PRESS, 'bogus', 0.09)
+    report = verify_playback(actions, speed=4.0)
+    assert not is_faithful(report)
+    assert report['missing_types'] == {'key_press': 1}
+
+
+def test_verify_playback_through_listener():
+    report = verify_playback(make_actions(), speed=4.0, mode='listener', backend='memory')
+    assert report['backend'] == 'memory'
+    assert is_faithful(report)
+
+
+def test_verify_type_text():
+    actions = make_actions()
+    actions.append_text('hi', 0.01, 0.1)
+    report = verify_playback(actions, speed=4.0)
+    assert is_faithful(report)
+    # 9 个动作、点击前的 2 个移动，文字步骤展开为 2 次按下和释放
+    assert report['matched'] == 9 + 2 + 4
+
+
+def test_percentile_nearest_rank():
+    ordered = list(range(1, 101))
+    assert [_percentile(ordered, fraction) for fraction in (0.0, 0.5, 0.95, 1.0)] == [1, 50, 95, 100]
+    assert _percentile([7], 0.99) == 7
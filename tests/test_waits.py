@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+在内存帧缓冲上测试等待条件和轮询
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from app.anchor import encode_template
+from app.capture import FakeFramebuffer, ScreenCapture
+from app.waits import (
+    WaitError, create_condition, wait_for, MIN_POLL_INTERVAL, MAX_POLL_INTERVAL
+)
+
+
+class FakeSleep:
+    """
+    记录轮询间隔的 sleep，第 changes 中指定的次数被调用时修改画面
+    """
+    
+    def __init__(self, framebuffer, changes=None):
+        self.framebuffer = framebuffer
+        self.changes = changes or {}
+        self.intervals = []
+    
+    def __call__(self, seconds):
+        self.intervals.append(seconds)
+        change = self.changes.get(len(self.intervals))
+        if change is not None:
+            self.framebuffer.draw(*change)
+
+
+def make_screen():
+    """
+    生成 200x100 的灰色屏幕，返回 (帧缓冲, 截图对象)
+    """
+    framebuffer = FakeFramebuffer(np.full((100, 200), 128, dtype=np.uint8))
+    return framebuffer, ScreenCapture(framebuffer)
+
+
+def test_region_changed_after_update():
+    framebuffer, capture = make_screen()
+    sleep = FakeSleep(framebuffer, {3: (10, 10, np.zeros((5, 5), dtype=np.uint8))})
+    condition = create_condition('region_changed', 0, 0, 50, 50, {})
+    assert wait_for(condition, capture, 10, sleep) is True
+    assert len(sleep.intervals) == 3
+
+
+def test_unchanged_screen_backs_off():
+    framebuffer, capture = make_screen()
+    sleep = FakeSleep(framebuffer, {12: (10, 10, np.zeros((5, 5), dtype=np.uint8))})
+    condition = create_condition('region_changed', 0, 0, 50, 50, {})
+    assert wait_for(condition, capture, 10, sleep) is True
+    
+    # 第一次轮询算作画面有变化，之后画面不变时间隔逐步拉长，不超过上限
+    intervals = sleep.intervals
+    assert intervals[0] == MIN_POLL_INTERVAL
+    assert intervals[1] > MIN_POLL_INTERVAL
+    assert all(b >= a for a, b in zip(intervals, intervals[1:]))
+    assert intervals[-1] == MAX_POLL_INTERVAL
+
+
+def test_pixel_color_with_tolerance():
+    framebuffer, capture = make_screen()
+    white = np.full((1, 1, 3), 250, dtype=np.uint8)
+    sleep = FakeSleep(framebuffer, {2: (30, 40, white)})
+    condition = create_condition('pixel_color', 30, 40, 1, 1, {'color': [255, 255, 255]})
+    assert wait_for(condition, capture, 10, sleep) is True
+    assert len(sleep.intervals) == 2
+    
+    strict = create_condition('pixel_color', 30, 40, 1, 1, {'color': [255, 255, 255], 'tolerance': 2})
+    assert wait_for(strict, capture, 0, FakeSleep(framebuffer)) is False
+
+
+def test_template_appears():
+    framebuffer, capture = make_screen()
+    rng = np.random.default_rng(4)
+    button = rng.integers(0, 256, (20, 30), dtype=np.uint8)
+    params = {'template': encode_template(button)}
+    condition = create_condition('template_appears', 0, 0, 200, 100, params)
+    sleep = FakeSleep(framebuffer, {5: (120, 60, button)})
+    assert wait_for(condition, capture, 10, sleep) is True
+    assert condition.found_at == (120, 60)
+
+
+def test_timeout_and_cancel():
+    framebuffer, capture = make_screen()
+    condition = create_condition('region_changed', 0, 0, 50, 50, {})
+    assert wait_for(condition, capture, 0, FakeSleep(framebuffer)) is False
+    
+    sleep = FakeSleep(framebuffer)
+    assert wait_for(condition, capture, 10, sleep, lambda: len(sleep.intervals) >= 4) is None
+    assert len(sleep.intervals) == 4
+
+
+def test_invalid_parameters():
+    with pytest.raises(WaitError):
+        create_condition('pixel_color', 0, 0, 1, 1, {})
+    with pytest.raises(WaitError):
+        create_condition('window_title', 0, 0, 1, 1, {})